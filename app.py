@@ -10,11 +10,22 @@ try:
     import warnings
     warnings.filterwarnings('ignore')
     import io
+    import os
+    import tempfile
+    from periods import period_label, recent_periods, resolve_periods
+    from dedup import DEFAULT_DEDUP_GAP_MINUTES
+    from frames import enable_copy_on_write
+    from pdf_pages import APPROXIMATE_ROUTES_NOTE, DEFAULT_REPORT_SPEC, REPORT_SPECS, approximate_routes
+    from sampling import DEFAULT_SAMPLE_FRACTION
+    from concurrent.futures import ThreadPoolExecutor
 except Exception as e:
     import streamlit as st
     st.error(f"Import error: {str(e)}")
     st.stop()
 
+# Frames are never modified in place, so the app runs pandas with copy-on-write
+enable_copy_on_write()
+
 # ============================================================================
 # PAGE CONFIGURATION
 # ============================================================================
@@ -143,14 +154,82 @@ selected_carrier = st.sidebar.selectbox(
     index=carriers.index('ILLYRIAN TRANSPORT LLC') if 'ILLYRIAN TRANSPORT LLC' in carriers else 0
 )
 
-# Week selection
-current_week = datetime.datetime.now().isocalendar()[1]
-available_weeks = list(range(current_week - 10, current_week + 1))
+# Period selection: year-aware ISO weeks, or an explicit date range
+current_period = recent_periods(1)[0]
+period_mode = st.sidebar.radio("Report Period", ["Weeks", "Date Range"], horizontal=True)
+
+if period_mode == "Weeks":
+    available_weeks = recent_periods(11)
+    selected_weeks = st.sidebar.multiselect(
+        "Select Weeks to Analyze",
+        available_weeks,
+        default=available_weeks[-2:],
+        format_func=period_label
+    )
+    week_filter, start_date, end_date = selected_weeks, None, None
+else:
+    today = datetime.date.today()
+    date_range = st.sidebar.date_input(
+        "Select Date Range",
+        value=(today - datetime.timedelta(days=13), today),
+        max_value=today
+    )
+    if len(date_range) == 2:
+        start_date, end_date = date_range
+        selected_weeks = resolve_periods(start_date=start_date, end_date=end_date)
+    else:
+        start_date = end_date = None
+        selected_weeks = []
+    week_filter = None
+
+period_slug = '-'.join(period_label(p) for p in selected_weeks)
+
+# Deduplication: same calendar date, or arrivals close together in time
+dedup_strategy = st.sidebar.radio(
+    "Deduplicate Stops By",
+    ["date", "gap"],
+    format_func=lambda s: "Same date" if s == "date" else "Within a time gap",
+    help="Orders on the same load, carrier and location count as one pickup/delivery"
+)
+dedup_gap_minutes = st.sidebar.number_input(
+    "Time Gap (minutes)",
+    min_value=1,
+    max_value=24 * 60,
+    value=DEFAULT_DEDUP_GAP_MINUTES,
+    step=5,
+    disabled=dedup_strategy != "gap",
+    help="Arrivals at most this far apart count as one stop"
+)
+
+# Fast preview: estimates from a sample of loads while the full report is computed
+fast_preview = st.sidebar.checkbox(
+    "Fast preview",
+    value=True,
+    help=f"Show estimates from a {DEFAULT_SAMPLE_FRACTION:.0%} sample of loads (with 95% confidence intervals) "
+         "while all rows are processed"
+)
+
+# Report contents: one of the named reports (pdf_pages.REPORT_SPECS)
+REPORT_SPEC_LABELS = {
+    'full': 'Full report',
+    'summary': 'Summary (no detail tables)',
+    'pickup': 'Pickups only',
+    'delivery': 'Deliveries only',
+    'executive': 'Executive (2 pages)',
+}
+report_spec = st.sidebar.selectbox(
+    "Report Contents",
+    list(REPORT_SPECS),
+    index=list(REPORT_SPECS).index(DEFAULT_REPORT_SPEC),
+    format_func=lambda name: REPORT_SPEC_LABELS.get(name, name),
+    help="Sections of the PDF report; leaving sections out also skips their work"
+)
 
-selected_weeks = st.sidebar.multiselect(
-    "Select Weeks to Analyze",
-    available_weeks,
-    default=[current_week - 1, current_week]
+# Compact PDF: a smaller file for sharing by email
+compact_pdf = st.sidebar.checkbox(
+    "Compact PDF",
+    value=False,
+    help="Draw tables with fewer PDF objects and compress harder for a smaller file (e.g. to email)"
 )
 
 # Generate button
@@ -167,7 +246,7 @@ if not generate_button:
     with col1:
         st.metric("Available Carriers", len(carriers))
     with col2:
-        st.metric("Current Week", current_week)
+        st.metric("Current Week", period_label(current_period))
     with col3:
         st.metric("Weeks Selected", len(selected_weeks))
 
@@ -186,41 +265,108 @@ if generate_button:
     # Import the report generation functions
     # We'll create these next
     from report_generator import (
-        load_and_process_data,
+        load_carrier_rows,
+        process_carrier_rows,
         calculate_performance_metrics,
         analyze_delay_codes,
         generate_pdf_report,
         generate_pickup_details_csv,
-        generate_delivery_details_csv
+        generate_delivery_details_csv,
+        load_carrier_trends,
+        load_facility_rollups,
+        load_rollup_lateness,
+        load_rollup_metrics
     )
-    
+    from events import build_event_tables
+
+    # Per-run temporary PDF (removed once the download button has read it)
+    pdf_path = None
+
     try:
         # Step 1: Load data
         status_text.text("📥 Loading data from database...")
-        progress_bar.progress(20)
-        df = load_and_process_data(selected_carrier, selected_weeks)
+        progress_bar.progress(10)
+        rows = load_carrier_rows(selected_carrier)
+
+        # Process all rows in the background; meanwhile show estimates from a sample
+        preview_box = st.empty()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            processing = executor.submit(process_carrier_rows, rows, week_filter, start_date, end_date,
+                                         dedup_strategy, dedup_gap_minutes)
+
+            if fast_preview:
+                from sampling import estimate_delay_codes, estimate_performance_metrics, format_estimates, \
+                    stratified_sample
+
+                status_text.text("⚡ Estimating from a sample...")
+                sample = stratified_sample(rows, periods=selected_weeks)
+                sample_events = build_event_tables(
+                    process_carrier_rows(sample['rows'], week_filter, start_date, end_date, dedup_strategy,
+                                         dedup_gap_minutes))
+                estimates, margins = estimate_performance_metrics(
+                    sample_events, sample['strata'], selected_carrier, week_filter, start_date, end_date)
+                delay_estimates = estimate_delay_codes(sample_events, sample['strata'])
+
+                with preview_box.container():
+                    st.subheader("⚡ Preview (estimated)")
+                    st.caption(f"Estimated from {sample['strata']['sampled_loads'].sum():,} of "
+                               f"{sample['strata']['loads'].sum():,} loads, ± 95% confidence interval. "
+                               "Exact figures replace this when processing finishes.")
+                    st.dataframe(format_estimates(estimates, margins), use_container_width=True)
+                    st.dataframe(delay_estimates['delivery_delay_counts'].head(10).round(1),
+                                 use_container_width=True, hide_index=True)
+
+            status_text.text("⚙️ Processing all rows...")
+            progress_bar.progress(20)
+            df = processing.result()
+        preview_box.empty()
+        events = build_event_tables(df)
         
-        # Step 2: Calculate metrics
+        # Step 2: Calculate metrics (summed from the daily rollups when they
+        # are current with the loaded rows, otherwise from the event tables)
         status_text.text("📊 Calculating performance metrics...")
         progress_bar.progress(40)
-        metrics_df = calculate_performance_metrics(df, selected_carrier, selected_weeks)
+        metrics_df = load_rollup_metrics(selected_carrier, df, week_filter, start_date, end_date, dedup_strategy)
+        if metrics_df is None:
+            metrics_df = calculate_performance_metrics(events, selected_carrier, week_filter, start_date, end_date)
         
         # Step 3: Analyze delays
         status_text.text("🔍 Analyzing delay codes...")
         progress_bar.progress(60)
-        delay_data = analyze_delay_codes(df, selected_carrier, selected_weeks)
+        delay_data = analyze_delay_codes(events, selected_carrier, selected_weeks)
+
+        # Lateness quantiles merged from the stored per-day sketches when
+        # the rollups are current with the loaded rows (the PDF shows the
+        # same figures); otherwise the quantiles of the rows themselves
+        lateness = load_rollup_lateness(selected_carrier, df, week_filter, start_date, end_date, dedup_strategy)
+        if lateness is not None:
+            delay_data = {**delay_data, 'pickup_lateness': lateness['pickup'],
+                          'delivery_lateness': lateness['delivery']}
         
+        # Rolling trends (only available once rollups have been built)
+        trend_data = load_carrier_trends(selected_carrier)
+
         # Step 4: Generate PDF
         status_text.text("📄 Generating PDF report...")
         progress_bar.progress(80)
-        pdf_bytes = generate_pdf_report(df, selected_carrier, selected_weeks, metrics_df, delay_data)
+        # Written straight to a file of its own (other sessions may be
+        # generating the same carrier); the download button reads it back
+        pdf_name = f"carrier_report_{selected_carrier.replace(' ', '_')}.pdf"
+        fd, pdf_path = tempfile.mkstemp(prefix='carrier_report_', suffix='.pdf')
+        os.close(fd)
+        # Over the render budget, long delay details are summarized in the
+        # PDF and listed in full in this CSV appendix instead
+        appendix = io.StringIO()
+        generate_pdf_report(df, selected_carrier, selected_weeks, metrics_df, delay_data,
+                            trend_data=trend_data, output=pdf_path,
+                            appendix=appendix, compact=compact_pdf, sections=report_spec)
         
         # Complete
         progress_bar.progress(100)
         status_text.text("✅ Report generated successfully!")
         
         # Display results
-        st.success(f"✅ Report generated for **{selected_carrier}** - Weeks {selected_weeks}")
+        st.success(f"✅ Report generated for **{selected_carrier}** - Weeks {', '.join(period_label(p) for p in selected_weeks)}")
 
         # Debug: Show data info
         st.info(f"📊 Loaded {len(df)} rows of data")
@@ -228,6 +374,54 @@ if generate_button:
         # Show metrics preview
         st.subheader("📊 Performance Metrics Preview")
         st.dataframe(metrics_df, use_container_width=True)
+        if approximate_routes(metrics_df):
+            st.caption(f"{APPROXIMATE_ROUTES_NOTE} ({', '.join(approximate_routes(metrics_df))}; "
+                       "summed from the daily rollups)")
+
+        # Show lateness distribution for late pickups/deliveries
+        from lateness import lateness_summary
+
+        st.subheader("⏱️ Lateness (minutes past window)")
+        st.dataframe(lateness_summary({
+            'Late Pickups': delay_data['pickup_lateness'],
+            'Late Deliveries': delay_data['delivery_lateness']
+        }).round(1), use_container_width=True)
+
+        # Show lane performance
+        from lanes import lane_metrics
+
+        st.subheader("🛣️ Lane Performance")
+        lanes_df = lane_metrics(df)
+        st.dataframe(lanes_df.head(20).round(1), use_container_width=True, hide_index=True)
+        if len(lanes_df) > 20:
+            st.caption(f"Showing the 20 busiest of {len(lanes_df)} lanes.")
+
+        # Show facility performance (fleet-wide once rollups have been built,
+        # otherwise this carrier's facilities only)
+        from facilities import build_facility_rollups, facility_metrics
+
+        st.subheader("🏭 Facility Performance")
+        facilities = load_facility_rollups()
+        if facilities is None:
+            facilities = build_facility_rollups(df)
+            st.caption(f"Facilities visited by {selected_carrier} (run `python rollups.py backfill` for all carriers).")
+        facility_tabs = st.tabs(["Pickup Facilities", "Delivery Facilities"])
+        for tab, kind in zip(facility_tabs, ["pickup", "delivery"]):
+            with tab:
+                facilities_df = facility_metrics(facilities, kind, selected_weeks)
+                st.dataframe(facilities_df.head(20).round(1), use_container_width=True, hide_index=True)
+                if len(facilities_df) > 20:
+                    st.caption(f"Showing the 20 busiest of {len(facilities_df)} facility weeks.")
+
+        # Show rolling trends
+        if trend_data is not None:
+            from trends import chart_data
+
+            st.subheader("📈 Rolling Trends")
+            trend_tabs = st.tabs(["OTP %", "OTD %", "Tracking %"])
+            for tab, metric in zip(trend_tabs, ["OTP %", "OTD %", "Tracking %"]):
+                with tab:
+                    st.line_chart(chart_data(trend_data, metric))
 
         # Download buttons section
         st.subheader("📥 Download Options")
@@ -235,23 +429,23 @@ if generate_button:
         # PDF Download
         col1, col2, col3 = st.columns(3)
 
-        with col1:
+        with col1, open(pdf_path, 'rb') as pdf_file:
             st.download_button(
                 label="📄 Download PDF Report",
-                data=pdf_bytes,
-                file_name=f"carrier_report_{selected_carrier.replace(' ', '_')}.pdf",
+                data=pdf_file,
+                file_name=pdf_name,
                 mime="application/pdf",
                 use_container_width=True
             )
 
         # CSV Downloads
         with col2:
-            pickup_csv = generate_pickup_details_csv(df)
+            pickup_csv = generate_pickup_details_csv(events)
             if pickup_csv:
                 st.download_button(
                     label="📊 Pickup Details CSV",
                     data=pickup_csv,
-                    file_name=f"pickup_details_{selected_carrier.replace(' ', '_')}_weeks_{'-'.join(map(str, selected_weeks))}.csv",
+                    file_name=f"pickup_details_{selected_carrier.replace(' ', '_')}_weeks_{period_slug}.csv",
                     mime="text/csv",
                     use_container_width=True,
                     help="Includes both delayed and on-time pickups"
@@ -260,12 +454,12 @@ if generate_button:
                 st.info("No pickup data available")
 
         with col3:
-            delivery_csv = generate_delivery_details_csv(df)
+            delivery_csv = generate_delivery_details_csv(events)
             if delivery_csv:
                 st.download_button(
                     label="📊 Delivery Details CSV",
                     data=delivery_csv,
-                    file_name=f"delivery_details_{selected_carrier.replace(' ', '_')}_weeks_{'-'.join(map(str, selected_weeks))}.csv",
+                    file_name=f"delivery_details_{selected_carrier.replace(' ', '_')}_weeks_{period_slug}.csv",
                     mime="text/csv",
                     use_container_width=True,
                     help="Includes both delayed and on-time deliveries"
@@ -273,6 +467,18 @@ if generate_button:
             else:
                 st.info("No delivery data available")
 
+        # Delay details too long for the PDF
+        if appendix.getvalue():
+            st.info("📎 This carrier has too many late events to list in the PDF, which shows the top lanes "
+                    "and delay codes instead. Every late event is in the appendix below.")
+            st.download_button(
+                label="📎 Delay Details Appendix CSV",
+                data=appendix.getvalue(),
+                file_name=f"delay_details_{selected_carrier.replace(' ', '_')}_weeks_{period_slug}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+
         # Show CSV preview
         st.subheader("📋 CSV Export Preview")
 
@@ -303,4 +509,7 @@ if generate_button:
     except Exception as e:
         st.error(f"❌ Error generating report: {str(e)}")
         st.exception(e)
+    finally:
+        if pdf_path is not None and os.path.exists(pdf_path):
+            os.remove(pdf_path)
 
@@ -0,0 +1,107 @@
+"""
+Deduplication of pickup and delivery events
+
+Orders on the same loadId + carrierName + location are one stop, so their
+pickup (or delivery) must be counted once. Each row gets a dedup key and a
+keep flag (keep_for_pickup/keep_for_delivery) marking the earliest arrival
+of each stop; metrics, delay analysis and exports only count kept rows.
+
+Strategies:
+    'date' - one stop per location per calendar date of arrival (default)
+    'gap'  - arrivals within gap_minutes of the previous arrival at the
+             location are one stop, even across midnight
+"""
+
+import numpy as np
+import pandas as pd
+
+DEDUP_STRATEGIES = ('date', 'gap')
+DEFAULT_DEDUP_STRATEGY = 'date'
+
+# Maximum gap between arrivals of one stop for the 'gap' strategy
+DEFAULT_DEDUP_GAP_MINUTES = 30
+
+def deduplication_columns(df, strategy=DEFAULT_DEDUP_STRATEGY, gap_minutes=DEFAULT_DEDUP_GAP_MINUTES):
+    """
+    Deduplication columns for df, without modifying or reordering it
+
+    Returns:
+        (columns, order): dict of pickDate, dropDate, pickup_dedup_key,
+        delivery_dedup_key, keep_for_pickup and keep_for_delivery (aligned
+        with df by position), and the row positions sorted by pickup then
+        delivery arrival (missing last) in which the first row of each key
+        is the one kept
+    """
+    if strategy not in DEDUP_STRATEGIES:
+        raise ValueError(f"Unknown deduplication strategy '{strategy}' (expected one of {DEDUP_STRATEGIES})")
+
+    pick_date = df['pickTimeArrived_dt'].dt.date
+    drop_date = df['dropTimeArrived_dt'].dt.date
+    order = arrival_order(df)
+
+    if strategy == 'gap':
+        pickup_stop = arrival_clusters(df, ['loadId', 'carrierName', 'pickLocationName'],
+                                       'pickTimeArrived_dt', gap_minutes)
+        delivery_stop = arrival_clusters(df, ['loadId', 'carrierName', 'dropLocationName'],
+                                         'dropTimeArrived_dt', gap_minutes)
+    else:
+        pickup_stop = pick_date.astype(str)
+        delivery_stop = drop_date.astype(str)
+
+    load_carrier = df['loadId'].astype(str) + '|' + df['carrierName'].astype(str) + '|'
+    pickup_key = load_carrier + df['pickLocationName'].astype(str) + '|' + pickup_stop
+    delivery_key = load_carrier + df['dropLocationName'].astype(str) + '|' + delivery_stop
+
+    return {
+        'pickDate': pick_date,
+        'dropDate': drop_date,
+        'pickup_dedup_key': pickup_key,
+        'delivery_dedup_key': delivery_key,
+        'keep_for_pickup': _first_in_order(pickup_key, order),
+        'keep_for_delivery': _first_in_order(delivery_key, order),
+    }, order
+
+def arrival_order(df):
+    """
+    Row positions sorted by pickTimeArrived_dt, then dropTimeArrived_dt
+    (missing times last, ties in current order)
+    """
+    keys = []
+    for column in ['dropTimeArrived_dt', 'pickTimeArrived_dt']:
+        times = df[column].to_numpy(dtype='datetime64[ns]')
+        keys.append(np.where(np.isnat(times), np.iinfo(np.int64).max, times.view(np.int64)))
+    return np.lexsort(keys)
+
+def _first_in_order(keys, order):
+    """True for the first row of each key when rows are taken in order"""
+    first = np.empty(len(keys), dtype=bool)
+    first[order] = ~keys.iloc[order].duplicated().to_numpy()
+    return first
+
+def arrival_clusters(df, stop_columns, arrived_column, gap_minutes):
+    """
+    Cluster arrivals at each stop location by time gap
+
+    Rows are sorted once by (location group, arrival time); a new cluster
+    starts at a new location group or when an arrival comes more than
+    gap_minutes after the previous one. Rows without an arrival time form
+    one cluster per location group, like the 'date' strategy.
+
+    Returns:
+        Series of cluster labels (strings) aligned with df
+    """
+    group = df.groupby(stop_columns, sort=False, dropna=False).ngroup().to_numpy()
+    times = df[arrived_column].to_numpy(dtype='datetime64[ns]')
+    missing = np.isnat(times)
+    times = times.view(np.int64)
+
+    order = np.lexsort((times, missing, group))
+    group, times, missing = group[order], times[order], missing[order]
+
+    new_cluster = np.ones(len(order), dtype=bool)
+    new_cluster[1:] = ((group[1:] != group[:-1]) | (missing[1:] != missing[:-1]) |
+                       (~missing[1:] & (np.diff(times) > gap_minutes * 60 * 10**9)))
+
+    clusters = np.empty(len(order), dtype=np.int64)
+    clusters[order] = np.cumsum(new_cluster)
+    return pd.Series(clusters, index=df.index).astype(str)
@@ -0,0 +1,315 @@
+"""
+Deduplication audit for otp_reports
+
+Checks the edge cases of the pickup/delivery deduplication logic
+(loadId + carrierName + location + date) on the full table:
+
+    1. Near-simultaneous arrivals: orders on the same loadId + carrier +
+       location whose arrival times differ by at most N minutes on the same
+       date (they are one stop, but only dedupe if the timestamps match
+       the same calendar date).
+    2. Conflicting delay codes: dedup groups whose orders carry more than
+       one distinct delay code (only the first one is kept).
+    3. Dedup impact: record counts before and after deduplication.
+
+Every check is a few vectorized passes (group codes, one sort, array diffs
+at group boundaries), so the full table audits in seconds. Only the groups
+that are actually reported get their warpIds/times collected into lists.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Per-kind column names
+AUDIT_COLUMNS = {
+    'pickup': {
+        'location': 'pickLocationName',
+        'arrived': 'pickTimeArrived',
+        'delay_code': 'pickupDelayCode',
+    },
+    'delivery': {
+        'location': 'dropLocationName',
+        'arrived': 'dropTimeArrived',
+        'delay_code': 'deliveryDelayCode',
+    },
+}
+
+KINDS = ('pickup', 'delivery')
+
+NS_PER_SECOND = 10**9
+NS_PER_DAY = 86400 * NS_PER_SECOND
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def _stop_keys(kind):
+    return ['loadId', 'carrierName', AUDIT_COLUMNS[kind]['location']]
+
+def _arrival_times(df, kind):
+    return pd.to_datetime(df[AUDIT_COLUMNS[kind]['arrived']], errors='coerce')
+
+def _group_codes(df, keys):
+    """Integer group code per row (-1 where any key is missing)"""
+    codes = df.groupby(keys, sort=False).ngroup()
+    return codes.fillna(-1).to_numpy(dtype=np.int64)
+
+def _collect_groups(df, group_codes, selected, columns):
+    """
+    Gather the rows of selected groups into one row per group with list columns
+
+    Args:
+        df: Rows aligned with group_codes
+        group_codes: Group code per row
+        selected: Group codes to collect
+        columns: Columns to collect as lists
+
+    Returns:
+        DataFrame indexed by group code (in group code order)
+    """
+    rows = np.flatnonzero(np.isin(group_codes, selected))
+    rows = rows[np.argsort(group_codes[rows], kind='stable')]
+    codes = group_codes[rows]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    result = pd.DataFrame(index=codes[starts])
+    for col in columns:
+        values = df[col].to_numpy(dtype=object)[rows]
+        result[col] = [chunk.tolist() for chunk in np.split(values, starts[1:])]
+    return result
+
+# ============================================================================
+# CHECKS
+# ============================================================================
+
+def near_simultaneous_arrivals(df, kind='pickup', within_minutes=10):
+    """
+    Stops whose orders arrived at different times within N minutes on one date
+
+    Args:
+        df: otp_reports rows (mainShipment = YES)
+        kind: 'pickup' or 'delivery'
+        within_minutes: Maximum spread between first and last arrival
+
+    Returns:
+        DataFrame with loadId, carrierName, location, num_orders, warpIds,
+        times and time_diff_minutes, widest spread first
+    """
+    keys = _stop_keys(kind)
+    arrived = _arrival_times(df, kind)
+    valid = arrived.notna().to_numpy()
+    rows = df.loc[valid]
+
+    codes = _group_codes(rows, keys)
+    times = arrived.to_numpy()[valid].astype('datetime64[ns]').view(np.int64)
+    keep = codes >= 0
+    codes, times, positions = codes[keep], times[keep], np.flatnonzero(keep)
+
+    # One sort by (group, time); first/last arrival sit at the group boundaries
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+
+    spread = times[ends] - times[starts]
+    same_date = (times[starts] // NS_PER_DAY) == (times[ends] // NS_PER_DAY)
+    flagged = (spread > 0) & (spread <= within_minutes * 60 * NS_PER_SECOND) & same_date
+
+    columns = ['warpId', AUDIT_COLUMNS[kind]['arrived']]
+    if not flagged.any():
+        return pd.DataFrame(columns=['loadId', 'carrierName', 'location', 'num_orders',
+                                     'warpIds', 'times', 'time_diff_minutes'])
+
+    flagged_codes = codes[starts[flagged]]
+    row_codes = np.full(len(rows), -1, dtype=np.int64)
+    row_codes[positions[order]] = codes
+    collected = _collect_groups(rows, row_codes, flagged_codes, columns)
+    first_rows = rows.iloc[positions[order][starts[flagged]]]
+
+    result = pd.DataFrame({
+        'loadId': first_rows['loadId'].to_numpy(),
+        'carrierName': first_rows['carrierName'].to_numpy(),
+        'location': first_rows[keys[2]].to_numpy(),
+        'num_orders': (ends - starts + 1)[flagged],
+        'time_diff_minutes': spread[flagged] / NS_PER_SECOND / 60,
+    }, index=flagged_codes)
+    result['warpIds'] = collected['warpId']
+    result['times'] = collected[columns[1]]
+    result = result[['loadId', 'carrierName', 'location', 'num_orders',
+                     'warpIds', 'times', 'time_diff_minutes']]
+    return result.sort_values('time_diff_minutes', ascending=False, kind='stable').reset_index(drop=True)
+
+def conflicting_delay_codes(df, kind='pickup'):
+    """
+    Dedup groups (loadId + carrier + location + date) with more than one
+    distinct delay code
+
+    Args:
+        df: otp_reports rows (mainShipment = YES)
+        kind: 'pickup' or 'delivery'
+
+    Returns:
+        DataFrame with loadId, carrierName, location, date, num_orders,
+        warpIds, delay_codes and times
+    """
+    keys = _stop_keys(kind)
+    code_col = AUDIT_COLUMNS[kind]['delay_code']
+    arrived_col = AUDIT_COLUMNS[kind]['arrived']
+
+    rows = df.assign(_date=_arrival_times(df, kind).dt.normalize())
+    codes = _group_codes(rows, keys + ['_date'])
+    in_group = codes >= 0
+
+    distinct = rows[code_col].groupby(codes).transform('nunique').to_numpy()
+    flagged_codes = np.unique(codes[in_group & (distinct > 1)])
+
+    if len(flagged_codes) == 0:
+        return pd.DataFrame(columns=['loadId', 'carrierName', 'location', 'date', 'num_orders',
+                                     'warpIds', 'delay_codes', 'times'])
+
+    collected = _collect_groups(rows, codes, flagged_codes, ['warpId', arrived_col])
+    has_code = rows[code_col].notna().to_numpy()
+    distinct_codes = rows.loc[has_code, [code_col]].assign(_group=codes[has_code]).drop_duplicates()
+    collected['delay_codes'] = _collect_groups(distinct_codes, distinct_codes['_group'].to_numpy(),
+                                               flagged_codes, [code_col])[code_col]
+    first_rows = rows.loc[in_group].assign(_group=codes[in_group]).drop_duplicates('_group')
+    first_rows = first_rows.set_index('_group').loc[collected.index]
+
+    return pd.DataFrame({
+        'loadId': first_rows['loadId'].to_numpy(),
+        'carrierName': first_rows['carrierName'].to_numpy(),
+        'location': first_rows[keys[2]].to_numpy(),
+        'date': first_rows['_date'].dt.date.to_numpy(),
+        'num_orders': collected['warpId'].str.len().to_numpy(),
+        'warpIds': collected['warpId'].to_numpy(),
+        'delay_codes': collected['delay_codes'].to_numpy(),
+        'times': collected[arrived_col].to_numpy(),
+    })
+
+def dedup_impact(df, kind='pickup'):
+    """Record counts before and after deduplication on loadId + carrier + location + date"""
+    keys = _stop_keys(kind)
+    rows = df[keys].assign(_date=_arrival_times(df, kind).dt.normalize())
+    after = int((~rows.duplicated()).sum())
+    return {'before': len(df), 'after': after, 'removed': len(df) - after}
+
+def sample_duplicate_groups(df, kind='pickup', n=10):
+    """First n dedup groups with more than one order (warpIds, times, delay codes)"""
+    keys = _stop_keys(kind)
+    columns = ['warpId', AUDIT_COLUMNS[kind]['arrived'], AUDIT_COLUMNS[kind]['delay_code']]
+    rows = df.assign(date=_arrival_times(df, kind).dt.date)
+    codes = _group_codes(rows, keys + ['date'])
+    sizes = np.bincount(codes[codes >= 0])
+    selected = np.flatnonzero(sizes > 1)[:n]
+
+    collected = _collect_groups(rows, codes, selected, columns)
+    first_rows = rows.loc[np.isin(codes, selected)].assign(_group=codes[np.isin(codes, selected)])
+    first_rows = first_rows.drop_duplicates('_group').set_index('_group').loc[collected.index]
+    collected.index = pd.MultiIndex.from_frame(first_rows[keys + ['date']])
+    return collected
+
+# ============================================================================
+# AUDIT REPORT
+# ============================================================================
+
+def audit_deduplication(df, within_minutes=10, sample_size=10):
+    """
+    Run every deduplication check on otp_reports rows
+
+    Args:
+        df: Raw otp_reports rows (filtered to mainShipment = YES here)
+        within_minutes: Window for near-simultaneous arrivals
+        sample_size: Number of sample duplicate groups to include
+
+    Returns:
+        Dictionary with 'records', 'within_minutes', 'summary' (one row per
+        check and kind) and per-kind results under 'near_simultaneous',
+        'conflicting_codes', 'impact' and 'samples'
+    """
+    main_shipments = df[df['mainShipment'] == 'YES']
+
+    report = {
+        'records': len(main_shipments),
+        'within_minutes': within_minutes,
+        'near_simultaneous': {},
+        'conflicting_codes': {},
+        'impact': {},
+        'samples': {},
+    }
+    summary = []
+    for kind in KINDS:
+        near = near_simultaneous_arrivals(main_shipments, kind, within_minutes)
+        conflicts = conflicting_delay_codes(main_shipments, kind)
+        impact = dedup_impact(main_shipments, kind)
+
+        report['near_simultaneous'][kind] = near
+        report['conflicting_codes'][kind] = conflicts
+        report['impact'][kind] = impact
+        report['samples'][kind] = sample_duplicate_groups(main_shipments, kind, sample_size)
+
+        summary.append({'Check': 'Near-simultaneous arrivals', 'Kind': kind,
+                        'Groups': len(near), 'Orders': int(near['num_orders'].sum())})
+        summary.append({'Check': 'Conflicting delay codes', 'Kind': kind,
+                        'Groups': len(conflicts), 'Orders': int(conflicts['num_orders'].sum())})
+        summary.append({'Check': 'Removed by dedup', 'Kind': kind,
+                        'Groups': impact['after'], 'Orders': impact['removed']})
+
+    report['summary'] = pd.DataFrame(summary)
+    return report
+
+def print_audit_report(report, max_cases=20):
+    """Print an audit report in the deduplication edge case analysis format"""
+    print("=" * 80)
+    print("DEDUPLICATION EDGE CASE ANALYSIS")
+    print("=" * 80)
+    print(f"\nTotal mainShipment = YES records: {report['records']:,}")
+
+    for kind in KINDS:
+        columns = AUDIT_COLUMNS[kind]
+        near = report['near_simultaneous'][kind]
+        print("\n" + "=" * 80)
+        print(f"NEAR-SIMULTANEOUS {kind.upper()} ARRIVALS: same loadId + carrierName + {columns['location']}")
+        print(f"            but {columns['arrived']} differs by <= {report['within_minutes']} minutes on same date")
+        print("=" * 80)
+        print(f"\nFound {len(near)} stops, total warpIDs affected: {int(near['num_orders'].sum())}")
+        for _, case in near.head(max_cases).iterrows():
+            print(f"\n  LoadID: {case['loadId']}")
+            print(f"  Carrier: {case['carrierName']}")
+            print(f"  Location: {case['location']}")
+            print(f"  Number of orders: {case['num_orders']}")
+            print(f"  WarpIDs: {case['warpIds']}")
+            print(f"  Times: {case['times']}")
+            print(f"  Time difference: {case['time_diff_minutes']:.2f} minutes")
+
+    for kind in KINDS:
+        conflicts = report['conflicting_codes'][kind]
+        print("\n" + "=" * 80)
+        print(f"CONFLICTING {kind.upper()} DELAY CODES (loadId + carrierName + location + date)")
+        print("=" * 80)
+        print(f"\nFound {len(conflicts)} groups where orders have DIFFERENT {kind} delay codes")
+        print(f"Total orders affected: {int(conflicts['num_orders'].sum())}")
+        for _, case in conflicts.head(max_cases // 2).iterrows():
+            print(f"\n  LoadID: {case['loadId']}")
+            print(f"  Carrier: {case['carrierName']}")
+            print(f"  Location: {case['location']}")
+            print(f"  Date: {case['date']}")
+            print(f"  Number of orders: {case['num_orders']}")
+            print(f"  WarpIDs: {case['warpIds']}")
+            print(f"  Times: {case['times']}")
+            print(f"  Different delay codes: {case['delay_codes']}")
+
+    print("\n" + "=" * 80)
+    print("DEDUPLICATION IMPACT ANALYSIS")
+    print("=" * 80)
+    for kind in KINDS:
+        impact = report['impact'][kind]
+        pct = impact['removed'] / impact['before'] * 100 if impact['before'] else 0
+        print(f"\n{kind.upper()} DEDUPLICATION (loadId + carrierName + {AUDIT_COLUMNS[kind]['location']} + date):")
+        print(f"  Before: {impact['before']:,} records")
+        print(f"  After:  {impact['after']:,} records")
+        print(f"  Reduction: {impact['removed']:,} records ({pct:.1f}%)")
+
+    print("\n" + "=" * 80)
+    print("SUMMARY")
+    print("=" * 80)
+    print(report['summary'].to_string(index=False))
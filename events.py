@@ -0,0 +1,88 @@
+"""
+Pickup and delivery event tables for Carrier Performance Reports
+
+The processed frame has one wide row per order, with keep_for_pickup /
+keep_for_delivery flags marking the rows that count. Metrics, delay code
+analysis and exports only ever look at those rows, so the pipeline splits
+them out once into narrow event tables:
+
+    pickup    one row per deduplicated, succeeded pickup
+    delivery  one row per deduplicated, succeeded delivery
+    routes    loadId of every row whose load is Completed
+    lanes     origin/destination columns per lane_id (display strings are
+              built from this only for rows that are rendered)
+
+Event tables keep the processed frame's pickWindow index, so the period
+helpers (select_periods, period_slices) work on them unchanged.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lanes import LANE_COLUMNS, format_lane
+from masks import mask_cache
+
+# Columns kept per event table (names as in otp_reports)
+PICKUP_EVENT_COLUMNS = [
+    'carrierName', 'loadId', 'orderCode', 'lane_id',
+    'pickupDelayCode', 'OTP', 'isTracking', 'pick_minutes_late',
+    'pickWindowFrom', 'pickWindowTo', 'pickTimeDeparted', 'pickTimeArrived',
+]
+
+DELIVERY_EVENT_COLUMNS = [
+    'carrierName', 'loadId', 'orderCode', 'lane_id',
+    'deliveryDelayCode', 'OTD', 'isTracking', 'drop_minutes_late',
+    'dropWindowFrom', 'dropWindowTo', 'dropTimeDeparted', 'dropTimeArrived',
+]
+
+def build_event_tables(df):
+    """
+    Split a processed DataFrame into narrow event tables
+
+    Args:
+        df: DataFrame returned by report_generator.process_data (or a period
+            selection of it)
+
+    Returns:
+        Dict with 'pickup', 'delivery', 'routes' and 'lanes' DataFrames
+    """
+    masks = mask_cache(df)
+    pickup_ok = masks.mask('pickup_event')
+    delivery_ok = masks.mask('delivery_event')
+    completed = masks.mask('load_completed')
+
+    return {
+        'pickup': df.loc[pickup_ok, PICKUP_EVENT_COLUMNS],
+        'delivery': df.loc[delivery_ok, DELIVERY_EVENT_COLUMNS],
+        'routes': df.loc[completed, ['carrierName', 'loadId']],
+        'lanes': df.drop_duplicates('lane_id').set_index('lane_id')[LANE_COLUMNS],
+    }
+
+def as_event_tables(data):
+    """Event tables for data (event tables are returned as they are)"""
+    if isinstance(data, pd.DataFrame):
+        return build_event_tables(data)
+    return data
+
+def has_delay_code(events, code_column):
+    """Events with a (non-empty) delay code"""
+    return events[code_column].notna() & (events[code_column] != '')
+
+def event_lanes(events, lanes):
+    """Lane display strings ('City, ST > City, ST') for the rows of an event table"""
+    return pd.Series(format_lane(lanes.loc[events['lane_id']]).to_numpy(), index=events.index)
+
+def format_window(window_from, window_to):
+    """
+    Window display strings: 'MM/DD/YYYY HH:MM:SS - HH:MM:SS' when both ends
+    are on the same date, else 'from - to'
+    """
+    from_str = window_from.astype(str)
+    to_str = window_to.astype(str)
+    from_parts = from_str.str.partition(' ')
+    to_parts = to_str.str.partition(' ')
+    same_date = ((from_parts[1] == ' ') & (to_parts[1] == ' ') &
+                 (from_parts[0] == to_parts[0])).to_numpy()
+    return np.where(same_date,
+                    (from_str + ' - ' + to_parts[2]).to_numpy(),
+                    (from_str + ' - ' + to_str).to_numpy())
@@ -0,0 +1,207 @@
+"""
+Facility dwell and on-time performance for Carrier Performance Reports
+
+A facility is the pickLocationName of a pickup or the dropLocationName of a
+delivery. For every deduplicated, succeeded event the arrived/departed pair
+is parsed once into dwell minutes (time on site), and events are aggregated
+per facility, carrier and ISO week: volume, on-time counts, late counts and
+a mergeable dwell t-digest.
+
+Location names are interned as integer IDs: aggregates carry location_id and
+a 'locations' array maps IDs back to names. Per-carrier aggregates are
+stored with the daily rollups (rollups.py) and merged across carriers into
+one fleet-wide cache, so facility views never rescan shipment rows.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lateness import TDigest
+from masks import mask_cache
+from periods import period_label
+
+# Columns and predicates (masks.py) per facility kind
+FACILITY_KINDS = {
+    'pickup': {
+        'location': 'pickLocationName',
+        'arrived': 'pickTimeArrived',
+        'departed': 'pickTimeDeparted',
+        'event': 'pickup_event',
+        'known': 'otp_known',
+        'on_time': 'otp_on_time',
+        'late': 'otp_late',
+    },
+    'delivery': {
+        'location': 'dropLocationName',
+        'arrived': 'dropTimeArrived',
+        'departed': 'dropTimeDeparted',
+        'event': 'delivery_event',
+        'known': 'otd_known',
+        'on_time': 'otd_on_time',
+        'late': 'otd_late',
+    },
+}
+
+# Count columns stored per facility, carrier and week
+FACILITY_COUNT_COLUMNS = ['events', 'outcome_events', 'on_time', 'late', 'dwell_events']
+
+# Dwell quantiles shown in facility views
+DWELL_QUANTILES = (0.5, 0.9)
+
+# ============================================================================
+# DWELL AND LOCATION IDS
+# ============================================================================
+
+def dwell_minutes(arrived, departed):
+    """
+    Minutes on site between arrival and departure
+
+    NaN where either timestamp is missing or the departure is before the
+    arrival.
+    """
+    minutes = (departed - arrived).dt.total_seconds() / 60
+    return minutes.where(minutes >= 0)
+
+def intern_locations(*columns):
+    """
+    Intern location names as integer IDs shared by all columns
+
+    Returns:
+        (ids, names): one int32 ID array per column (-1 where the name is
+        missing) and the array of names indexed by ID
+    """
+    codes, names = pd.factorize(np.concatenate([column.to_numpy(dtype=object) for column in columns]))
+    ids = np.split(codes.astype(np.int32), np.cumsum([len(column) for column in columns])[:-1])
+    return ids, np.asarray(names, dtype=object)
+
+# ============================================================================
+# BUILDING FACILITY ROLLUPS
+# ============================================================================
+
+def build_facility_rollups(df):
+    """
+    Aggregate a processed DataFrame per facility, carrier and ISO week
+
+    Args:
+        df: DataFrame returned by report_generator.process_data
+
+    Returns:
+        Dict with 'locations' (names by location_id) and 'weekly', a
+        DataFrame with location_id, kind, carrierName, iso_year,
+        week_number, the FACILITY_COUNT_COLUMNS and a 'dwell' TDigest
+    """
+    masks = mask_cache(df)
+    location_ids, locations = intern_locations(*[df[spec['location']] for spec in FACILITY_KINDS.values()])
+    has_week = df['iso_year'].notna().to_numpy()
+
+    keys = ['location_id', 'carrierName', 'iso_year', 'week_number']
+    frames = []
+    for (kind, spec), ids in zip(FACILITY_KINDS.items(), location_ids):
+        rows = masks.mask(spec['event']) & (ids >= 0) & has_week
+
+        # Only event rows have their departure time parsed
+        dwell = dwell_minutes(df[f"{spec['arrived']}_dt"][rows],
+                              pd.to_datetime(df[spec['departed']][rows], errors='coerce'))
+        events = pd.DataFrame({
+            'location_id': ids[rows],
+            'carrierName': df['carrierName'].to_numpy()[rows],
+            'iso_year': df['iso_year'].to_numpy()[rows],
+            'week_number': df['week_number'].to_numpy()[rows],
+            'events': 1,
+            'outcome_events': masks.mask(spec['known'])[rows],
+            'on_time': masks.mask(spec['on_time'])[rows],
+            'late': masks.mask(spec['late'])[rows],
+            'dwell_events': dwell.notna().to_numpy(),
+            'dwell': dwell.to_numpy(),
+        })
+
+        groups = events.groupby(keys, sort=False)
+        weekly = groups[FACILITY_COUNT_COLUMNS].sum().astype('int64')
+        # Dwell sketches are merged, not summed, across carriers and weeks
+        weekly['dwell'] = [TDigest().add(minutes.to_numpy()) for _, minutes in groups['dwell']]
+        weekly = weekly.reset_index()
+        weekly.insert(1, 'kind', kind)
+        frames.append(weekly)
+
+    return {'locations': locations, 'weekly': pd.concat(frames, ignore_index=True)}
+
+def merge_facility_rollups(parts):
+    """
+    Combine facility rollups (e.g. of several carriers) under one set of
+    location IDs
+
+    Args:
+        parts: Iterable of build_facility_rollups results
+
+    Returns:
+        Facility rollups with the same layout
+    """
+    parts = list(parts)
+    if not parts:
+        return {'locations': np.empty(0, dtype=object), 'weekly': pd.DataFrame()}
+
+    names = pd.Index(np.concatenate([part['locations'] for part in parts])).unique()
+    weekly = []
+    for part in parts:
+        remap = names.get_indexer(part['locations']).astype(np.int32)
+        weekly.append(part['weekly'].assign(location_id=remap[part['weekly']['location_id'].to_numpy()]))
+    return {'locations': names.to_numpy(dtype=object), 'weekly': pd.concat(weekly, ignore_index=True)}
+
+# ============================================================================
+# FACILITY VIEWS
+# ============================================================================
+
+def facility_metrics(facilities, kind, periods=None, top_carriers=3):
+    """
+    Facility performance per week
+
+    Args:
+        facilities: Facility rollups (build_facility_rollups or
+            merge_facility_rollups)
+        kind: 'pickup' or 'delivery'
+        periods: Optional list of (iso_year, iso_week) periods to keep
+        top_carriers: Number of carriers listed per facility and week
+
+    Returns:
+        DataFrame with Facility, Week, Volume, On-Time %, dwell quantiles
+        (minutes) and Top Late Carriers ('Name (late count)'), busiest
+        facilities first
+    """
+    weekly = facilities['weekly']
+    if len(weekly) > 0:
+        weekly = weekly[(weekly['kind'] == kind).to_numpy()]
+    if periods is not None and len(weekly) > 0:
+        in_periods = pd.MultiIndex.from_arrays([weekly['iso_year'], weekly['week_number']]).isin(periods)
+        weekly = weekly[in_periods]
+
+    quantile_columns = [f'Dwell p{int(round(q * 100))} (min)' for q in DWELL_QUANTILES]
+    if len(weekly) == 0:
+        return pd.DataFrame(columns=['Facility', 'Week', 'Volume', 'On-Time %'] +
+                            quantile_columns + ['Top Late Carriers'])
+
+    keys = ['location_id', 'iso_year', 'week_number']
+    groups = weekly.groupby(keys)
+    counts = groups[FACILITY_COUNT_COLUMNS].sum()
+    dwell = np.array([np.atleast_1d(TDigest.merge_all(digests).quantile(DWELL_QUANTILES))
+                      for _, digests in groups['dwell']]).reshape(len(counts), len(DWELL_QUANTILES))
+
+    # Carriers with the most late events at each facility and week
+    offenders = (weekly[weekly['late'] > 0]
+                 .groupby(keys + ['carrierName'], as_index=False)['late'].sum()
+                 .sort_values(['late', 'carrierName'], ascending=[False, True])
+                 .groupby(keys).head(top_carriers))
+    offenders = ((offenders['carrierName'] + ' (' + offenders['late'].astype(str) + ')')
+                 .groupby([offenders[key] for key in keys], sort=False).agg(', '.join))
+
+    result = pd.DataFrame({
+        'Facility': facilities['locations'][counts.index.get_level_values('location_id')],
+        'Week': [period_label(period) for period in zip(counts.index.get_level_values('iso_year'),
+                                                        counts.index.get_level_values('week_number'))],
+        'Volume': counts['events'].to_numpy(),
+        'On-Time %': (counts['on_time'] / counts['outcome_events'].where(counts['outcome_events'] > 0)
+                      * 100).to_numpy(),
+    })
+    for column, values in zip(quantile_columns, dwell.T):
+        result[column] = values
+    result['Top Late Carriers'] = offenders.reindex(counts.index).fillna('').to_numpy()
+    return result.sort_values(['Volume', 'Facility', 'Week'], ascending=[False, True, True], ignore_index=True)
@@ -0,0 +1,36 @@
+"""
+DataFrame helpers for the processing pipeline
+
+Pipelines here run with pandas copy-on-write enabled: a selection or a
+new column never modifies the frame it came from, so functions return new
+frames instead of copying defensively or mutating their inputs.
+"""
+
+import pandas as pd
+
+def enable_copy_on_write():
+    """Turn on pandas copy-on-write (the default from pandas 3.0)"""
+    pd.set_option('mode.copy_on_write', True)
+
+def with_columns(df, columns):
+    """
+    Add or replace many columns in a single concat
+
+    Inserting derived columns one at a time gives each its own block and
+    fragments the frame; building them as one frame and concatenating once
+    keeps the block count low. Values are aligned by position. Replaced
+    columns move to the end.
+
+    Args:
+        df: Input frame (not modified)
+        columns: Dict of column name -> Series, array or scalar
+
+    Returns:
+        New DataFrame
+    """
+    values = {name: value.array if isinstance(value, pd.Series) else value
+              for name, value in columns.items()}
+    new = pd.DataFrame(values, index=df.index)
+    replaced = [name for name in columns if name in df.columns]
+    base = df.drop(columns=replaced) if replaced else df
+    return pd.concat([base, new], axis=1)
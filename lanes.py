@@ -0,0 +1,71 @@
+"""
+Lane dimension for Carrier Performance Reports
+
+A lane is an origin/destination pair (pickCity, pickState > dropCity,
+dropState). Each unique lane gets an integer ID once per load, so lane-level
+aggregation is a groupby on an integer column, and the display string is
+only built for rows that are actually rendered.
+"""
+
+import numpy as np
+import pandas as pd
+
+from masks import mask_cache
+
+LANE_COLUMNS = ['pickCity', 'pickState', 'dropCity', 'dropState']
+
+def lane_ids(df):
+    """
+    Integer lane ID for every row (same origin/destination, same ID)
+
+    Missing city/state values are treated as empty strings, matching how the
+    lane is displayed.
+    """
+    lane_id = df[LANE_COLUMNS].fillna('').groupby(LANE_COLUMNS, sort=False).ngroup()
+    return lane_id.to_numpy(dtype=np.int32)
+
+def format_lane(df):
+    """
+    Lane display string ('City, ST > City, ST') for each row of df
+
+    Only call this on rows being exported or rendered.
+    """
+    parts = df[LANE_COLUMNS].fillna('')
+    return (parts['pickCity'] + ', ' + parts['pickState'] + ' > ' +
+            parts['dropCity'] + ', ' + parts['dropState'])
+
+def lane_metrics(df):
+    """
+    Lane-level volume, OTP % and OTD % (deduplicated, succeeded events only)
+
+    Args:
+        df: Processed DataFrame with lane_id
+
+    Returns:
+        DataFrame indexed by lane_id with Lane, Shipments, Pickups, OTP % and
+        OTD %, busiest lanes first
+    """
+    masks = mask_cache(df)
+    counts = pd.DataFrame({
+        'lane_id': df['lane_id'].to_numpy(),
+        'Shipments': masks.mask('delivery_event'),
+        'Pickups': masks.mask('pickup_event'),
+        'otp_events': masks.mask('pickup_event', 'otp_known'),
+        'otp_on_time': masks.mask('pickup_event', 'otp_on_time'),
+        'otd_events': masks.mask('delivery_event', 'otd_known'),
+        'otd_on_time': masks.mask('delivery_event', 'otd_on_time'),
+    }).groupby('lane_id').sum()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        counts['OTP %'] = np.where(counts['otp_events'] > 0,
+                                   counts['otp_on_time'] / counts['otp_events'] * 100, np.nan)
+        counts['OTD %'] = np.where(counts['otd_events'] > 0,
+                                   counts['otd_on_time'] / counts['otd_events'] * 100, np.nan)
+
+    result = counts[['Shipments', 'Pickups', 'OTP %', 'OTD %']].sort_values(
+        ['Shipments', 'Pickups'], ascending=False)
+
+    # Materialize display strings for the aggregated lanes only
+    first_rows = df.drop_duplicates('lane_id').set_index('lane_id').loc[result.index]
+    result.insert(0, 'Lane', format_lane(first_rows))
+    return result
@@ -0,0 +1,158 @@
+"""
+Lateness magnitude for Carrier Performance Reports
+
+OTP/OTD only say whether an arrival was late. This module measures how late
+(minutes between the arrival and the end of the window) and summarizes the
+distribution with mergeable t-digest sketches, so p50/p90/p99 lateness for
+any range of days can be answered by merging stored sketches instead of
+rescanning raw rows.
+"""
+
+import numpy as np
+import pandas as pd
+
+from masks import mask_cache
+
+# Quantiles shown in the app and reports
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# ============================================================================
+# MINUTES LATE
+# ============================================================================
+
+def minutes_late(arrived, window_end):
+    """
+    Minutes between arrival and the end of the window
+
+    Positive values are minutes after the window closed, negative values
+    minutes before; NaN where either timestamp is missing.
+    """
+    return (arrived - window_end).dt.total_seconds() / 60
+
+def late_mask(df, kind):
+    """
+    Late events counted in OTP ('pickup') or OTD ('delivery'):
+    deduplicated, succeeded, and classified 'Late'
+    """
+    masks = mask_cache(df)
+    if kind == 'pickup':
+        return pd.Series(masks.mask('pickup_event', 'otp_late'), index=df.index)
+    return pd.Series(masks.mask('delivery_event', 'otd_late'), index=df.index)
+
+# ============================================================================
+# T-DIGEST
+# ============================================================================
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest)
+
+    Values are kept as weighted centroids. Centroids are small near the tails
+    (where p90/p99 live) and large in the middle, so the sketch stays a few
+    hundred centroids at most however many values it has seen. Two digests
+    merge by pooling their centroids and compressing again.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return int(self.weights.sum())
+
+    def add(self, values):
+        """Add an array of values (NaN is ignored)"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other):
+        """Fold another digest into this one"""
+        if other.count == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+    @classmethod
+    def merge_all(cls, digests, compression=100):
+        """New digest combining many digests"""
+        merged = cls(compression)
+        for digest in digests:
+            merged.merge(digest)
+        return merged
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        # Clusters span at most one unit of the arcsine scale
+        # k(q) = compression / pi * asin(2q - 1), i.e. ~compression clusters
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / np.pi * np.arcsin(2 * q_mid - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+
+        cluster_weights = np.bincount(cluster, weights=weights)
+        cluster_sums = np.bincount(cluster, weights=means * weights)
+        keep = cluster_weights > 0
+        self.weights = cluster_weights[keep]
+        self.means = cluster_sums[keep] / self.weights
+
+    def quantile(self, q):
+        """
+        Estimated value at quantile q (scalar or array of quantiles in [0, 1])
+
+        Returns NaN for an empty digest.
+        """
+        q = np.asarray(q, dtype=float)
+        if self.count == 0:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xp = np.concatenate([[0], centers, [total]])
+        fp = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(q * total, xp, fp)
+
+# ============================================================================
+# SUMMARIES
+# ============================================================================
+
+def lateness_summary(digests, quantiles=DEFAULT_QUANTILES):
+    """
+    Summarize lateness from a mapping of label -> TDigest
+
+    Returns:
+        DataFrame indexed by label with the late event count and one column
+        per quantile (minutes late)
+    """
+    rows = {}
+    for label, digest in digests.items():
+        row = {'Late Events': digest.count}
+        for q, value in zip(quantiles, np.atleast_1d(digest.quantile(quantiles))):
+            row[f'p{int(round(q * 100))} (min)'] = value
+        rows[label] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+def format_lateness(digest, quantiles=DEFAULT_QUANTILES):
+    """One-line lateness description, e.g. 'p50 12 min · p90 95 min · p99 4.1 h'"""
+    if digest.count == 0:
+        return 'No late arrivals'
+
+    def fmt(minutes):
+        return f'{minutes:.0f} min' if minutes < 120 else f'{minutes / 60:.1f} h'
+
+    values = np.atleast_1d(digest.quantile(quantiles))
+    return ' · '.join(f'p{int(round(q * 100))} {fmt(v)}' for q, v in zip(quantiles, values))
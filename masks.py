@@ -0,0 +1,130 @@
+"""
+Memoized row predicates for processed frames
+
+Reports test the same conditions over and over (pickStatus == 'Succeeded',
+the keep flags, non-empty delay codes, ...), each a scan over an object
+column. mask_cache(df) returns the cache attached to a processed frame:
+each named predicate is evaluated once and kept as a packed bitmap (one bit
+per row), and combinations are bitwise ANDs of those bitmaps.
+
+A cached predicate is recomputed when a column it reads is replaced
+(e.g. df['pickupDelayCode'] = ...). Writes into an existing column
+(df.loc[mask, col] = ...) cannot be detected; call invalidate() after them.
+"""
+
+import weakref
+
+import numpy as np
+
+# Predicate name -> (columns read, function of the frame returning a boolean Series)
+PREDICATES = {
+    'pick_succeeded': (['pickStatus'], lambda df: df['pickStatus'] == 'Succeeded'),
+    'drop_succeeded': (['dropStatus'], lambda df: df['dropStatus'] == 'Succeeded'),
+    'load_completed': (['loadStatus'], lambda df: df['loadStatus'] == 'Completed'),
+    'keep_for_pickup': (['keep_for_pickup'], lambda df: df['keep_for_pickup'] == True),
+    'keep_for_delivery': (['keep_for_delivery'], lambda df: df['keep_for_delivery'] == True),
+    'has_pickup_code': (['pickupDelayCode'],
+                        lambda df: df['pickupDelayCode'].notna() & (df['pickupDelayCode'] != '')),
+    'has_delivery_code': (['deliveryDelayCode'],
+                          lambda df: df['deliveryDelayCode'].notna() & (df['deliveryDelayCode'] != '')),
+    'otp_known': (['OTP'], lambda df: df['OTP'].notna()),
+    'otp_on_time': (['OTP'], lambda df: df['OTP'] == 'On Time'),
+    'otp_late': (['OTP'], lambda df: df['OTP'] == 'Late'),
+    'otd_known': (['OTD'], lambda df: df['OTD'].notna()),
+    'otd_on_time': (['OTD'], lambda df: df['OTD'] == 'On Time'),
+    'otd_late': (['OTD'], lambda df: df['OTD'] == 'Late'),
+    'tracking_known': (['isTracking'], lambda df: df['isTracking'].notna()),
+    'tracking_yes': (['isTracking'], lambda df: df['isTracking'] == 'YES'),
+}
+
+# Named combinations (ANDed predicates)
+COMBINATIONS = {
+    'pickup_event': ('pick_succeeded', 'keep_for_pickup'),
+    'delivery_event': ('drop_succeeded', 'keep_for_delivery'),
+}
+
+# Set bits per byte value, for counting rows without unpacking
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+def _column_data(df, column):
+    """
+    A column's values and a token that changes when the column is replaced
+
+    The token is the data address of a numpy-backed column. Extension arrays
+    (string[pyarrow], boolean, Int64, ...) give a new array from to_numpy on
+    every call, so they are identified by the ExtensionArray object itself.
+    """
+    series = df[column]
+    if isinstance(series.dtype, np.dtype):
+        values = series.to_numpy(copy=False)
+        return values, ('data', values.__array_interface__['data'][0])
+    values = series.array
+    return values, ('array', id(values))
+
+class MaskCache:
+    """Packed boolean masks for one frame, computed on first use"""
+
+    def __init__(self, df):
+        self._frame = weakref.ref(df)
+        self._rows = len(df)
+        self._bits = {}
+        self._tokens = {}
+        # Column arrays the cached bitmaps were computed from; holding them
+        # keeps their addresses (and ids) from being reused by a replacement
+        # column
+        self._sources = {}
+
+    @property
+    def frame(self):
+        df = self._frame()
+        if df is None:
+            raise ReferenceError("The frame for this mask cache no longer exists")
+        return df
+
+    def bits(self, name):
+        """Packed bitmap (np.packbits) for a predicate or combination"""
+        if name in COMBINATIONS:
+            return np.bitwise_and.reduce([self.bits(part) for part in COMBINATIONS[name]])
+
+        columns, predicate = PREDICATES[name]
+        df = self.frame
+        if len(df) != self._rows:
+            self.invalidate()
+            self._rows = len(df)
+
+        sources, tokens = zip(*[_column_data(df, col) for col in columns])
+        if self._tokens.get(name) != tokens:
+            values = predicate(df).to_numpy(dtype=bool, na_value=False)
+            self._bits[name] = np.packbits(values)
+            self._tokens[name] = tokens
+            self._sources[name] = sources
+        return self._bits[name]
+
+    def mask(self, *names):
+        """Boolean array of rows matching all named predicates"""
+        packed = np.bitwise_and.reduce([self.bits(name) for name in names])
+        return np.unpackbits(packed, count=self._rows).astype(bool)
+
+    def count(self, *names):
+        """Number of rows matching all named predicates"""
+        packed = np.bitwise_and.reduce([self.bits(name) for name in names])
+        return int(_POPCOUNT[packed].sum())
+
+    def invalidate(self, *names):
+        """Drop cached predicates (all of them if no names are given)"""
+        for name in names or list(self._bits):
+            self._bits.pop(name, None)
+            self._tokens.pop(name, None)
+            self._sources.pop(name, None)
+
+# Caches by frame id; entries are removed when the frame is garbage collected
+_caches = {}
+
+def mask_cache(df):
+    """The MaskCache attached to df (created on first use)"""
+    cache = _caches.get(id(df))
+    if cache is None or cache._frame() is not df:
+        cache = MaskCache(df)
+        _caches[id(df)] = cache
+        weakref.finalize(df, _caches.pop, id(df), None)
+    return cache
@@ -0,0 +1,380 @@
+"""
+Streaming OTP monitor for Carrier Performance Reports
+
+Reports are generated on demand; this monitor tails otp_reports instead.
+It polls for rows added or updated since its id / updatedAt watermark and
+keeps week-to-date counters per carrier (the rollups COUNT_COLUMNS: OTP,
+OTD and tracking numerators and denominators), deduplicated the same way as
+the reports ('date' strategy, see dedup.py). When a carrier's week-to-date
+OTP %, OTD % or Tracking % drops below its target, an alert is sent to the
+configured sinks (a JSON-lines file, a webhook, or any callable).
+
+Each row belongs to one pickup stop and one delivery stop (loadId +
+carrierName + location + arrival date). A stop counts only its earliest
+arrival, so a new or updated row touches at most two stops and the
+counters of one carrier: updates are O(1) per row (a stop holds the
+handful of orders dropped at one location).
+
+Usage:
+    python monitor.py                     # poll the database every MONITOR_INTERVAL seconds
+    python monitor.py replay events.pkl   # replay a recorded stream (pickle or CSV)
+
+Environment:
+    MONITOR_INTERVAL   Seconds between polls (default 60)
+    MONITOR_MIN_EVENTS Events before a metric can alert (default 20)
+    ALERT_FILE         JSON-lines file for alerts (default otp_alerts.jsonl)
+    ALERT_WEBHOOK      URL to POST alerts to (optional)
+"""
+
+import datetime
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from periods import period_bounds, period_label, recent_periods
+from preprocess import on_time_status
+from rollups import COUNT_COLUMNS
+from trends import METRIC_TARGETS, TREND_METRICS
+
+# Metrics need this many events in the week before they can alert
+DEFAULT_MIN_EVENTS = 20
+
+# Timestamp fields parsed per batch
+MONITOR_DATETIME_COLUMNS = ['pickWindowFrom', 'pickWindowTo', 'pickTimeArrived',
+                            'dropWindowTo', 'dropTimeArrived', 'updatedAt']
+
+# Counter positions
+_COUNTER = {name: i for i, name in enumerate(COUNT_COLUMNS)}
+
+# Sort key for rows without an arrival time (they are kept last)
+_NO_ARRIVAL = np.iinfo(np.int64).max
+
+# ============================================================================
+# ALERT SINKS
+# ============================================================================
+
+def file_sink(path):
+    """Alert sink appending one JSON object per line to path"""
+    def send(alert):
+        with open(path, 'a') as f:
+            f.write(json.dumps(alert) + '\n')
+    return send
+
+def webhook_sink(url, timeout=10):
+    """Alert sink POSTing each alert as JSON to url (failures are printed, not raised)"""
+    def send(alert):
+        request = urllib.request.Request(url, data=json.dumps(alert).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=timeout).close()
+        except Exception as e:
+            print(f"⚠️  Warning: Could not send alert to webhook: {e}")
+    return send
+
+# ============================================================================
+# MONITOR
+# ============================================================================
+
+class OTPMonitor:
+    """Week-to-date, dedup-aware performance counters per carrier with threshold alerts"""
+
+    def __init__(self, sinks=(), targets=None, min_events=DEFAULT_MIN_EVENTS, today=None):
+        """
+        Args:
+            sinks: Callables receiving each alert dict
+            targets: Metric -> target % (default: trends.METRIC_TARGETS)
+            min_events: Events a metric needs before it can alert
+            today: Date the week-to-date period starts from (default: today)
+        """
+        self.sinks = list(sinks)
+        self.targets = dict(METRIC_TARGETS if targets is None else targets)
+        self.min_events = min_events
+        self.period = recent_periods(1, today)[0]
+        self.last_id = 0
+        self.last_updated = pd.NaT
+
+        self._rows = {}       # row id -> (carrier, period, [(stop, sort key, contribution), ...])
+        self._stops = {}      # stop -> {row id: (sort key, contribution)}
+        self._kept = {}       # stop -> (row id, carrier, period, contribution) of the counted row
+        self._counters = {}   # (carrier, period) -> counts in COUNT_COLUMNS order
+        self._below = set()   # (carrier, metric) currently below target
+        self.alerts = []
+
+    # ------------------------------------------------------------------------
+    # Ingesting rows
+    # ------------------------------------------------------------------------
+
+    def process(self, rows, today=None):
+        """
+        Apply a batch of new or updated otp_reports rows
+
+        Rows are identified by id; a row seen again replaces its earlier
+        version. Rows whose pickWindowFrom is before the current week are
+        ignored.
+
+        Args:
+            rows: DataFrame of raw otp_reports rows
+            today: Current date (default: today); a new week drops the
+                previous week's state
+
+        Returns:
+            List of alerts raised by this batch
+        """
+        self._advance(recent_periods(1, today)[0])
+        if len(rows) == 0:
+            return []
+
+        parsed = {col: pd.to_datetime(rows[col], errors='coerce') for col in MONITOR_DATETIME_COLUMNS}
+        otp = on_time_status(parsed['pickTimeArrived'], parsed['pickWindowTo'])
+        otd = on_time_status(parsed['dropTimeArrived'], parsed['dropWindowTo'])
+        iso = parsed['pickWindowFrom'].dt.isocalendar()
+
+        columns = {col: rows[col].to_numpy() for col in
+                   ['id', 'loadId', 'carrierName', 'pickLocationName', 'dropLocationName',
+                    'pickStatus', 'dropStatus', 'isTracking']}
+        pick_arrived = parsed['pickTimeArrived']
+        drop_arrived = parsed['dropTimeArrived']
+        pick_sort = np.where(pick_arrived.isna(), _NO_ARRIVAL, pick_arrived.to_numpy().view(np.int64))
+        drop_sort = np.where(drop_arrived.isna(), _NO_ARRIVAL, drop_arrived.to_numpy().view(np.int64))
+        pick_date = pick_arrived.dt.date.astype(str).to_numpy()
+        drop_date = drop_arrived.dt.date.astype(str).to_numpy()
+        years = iso['year'].fillna(0).to_numpy(dtype=np.int64)
+        weeks = iso['week'].fillna(0).to_numpy(dtype=np.int64)
+
+        touched = set()
+        for i in range(len(rows)):
+            row_id = int(columns['id'][i])
+            carrier = columns['carrierName'][i]
+            period = (int(years[i]), int(weeks[i]))
+            load = (str(columns['loadId'][i]), str(carrier))
+
+            self._remove(row_id)
+            if period < self.period:
+                continue
+
+            tracking = columns['isTracking'][i]
+            pickup = [0] * len(COUNT_COLUMNS)
+            if columns['pickStatus'][i] == 'Succeeded':
+                pickup[_COUNTER['pickup_shipments']] = 1
+                pickup[_COUNTER['otp_events']] = int(otp[i] is not None)
+                pickup[_COUNTER['otp_on_time']] = int(otp[i] == 'On Time')
+                pickup[_COUNTER['tracking_events']] = int(pd.notna(tracking))
+                pickup[_COUNTER['tracking_yes']] = int(tracking == 'YES')
+            delivery = [0] * len(COUNT_COLUMNS)
+            if columns['dropStatus'][i] == 'Succeeded':
+                delivery[_COUNTER['shipments']] = 1
+                delivery[_COUNTER['otd_events']] = int(otd[i] is not None)
+                delivery[_COUNTER['otd_on_time']] = int(otd[i] == 'On Time')
+
+            # Ties in arrival time keep the newest row, as the reports do
+            # (rows are loaded ORDER BY id DESC)
+            sort_key = (int(pick_sort[i]), int(drop_sort[i]), -row_id)
+            stops = [(('pickup',) + load + (str(columns['pickLocationName'][i]), pick_date[i]), sort_key, pickup),
+                     (('delivery',) + load + (str(columns['dropLocationName'][i]), drop_date[i]), sort_key, delivery)]
+            self._rows[row_id] = (carrier, period, stops)
+            for stop, key, contribution in stops:
+                self._stops.setdefault(stop, {})[row_id] = (key, (carrier, period, contribution))
+                self._recount(stop)
+            touched.add(carrier)
+
+        self._advance_watermark(rows, parsed['updatedAt'])
+        return self._check(touched)
+
+    def _remove(self, row_id):
+        """Take a row out of its stops (before it is replaced)"""
+        old = self._rows.pop(row_id, None)
+        if old is None:
+            return
+        for stop, _, _ in old[2]:
+            members = self._stops[stop]
+            del members[row_id]
+            if not members:
+                del self._stops[stop]
+            self._recount(stop)
+
+    def _recount(self, stop):
+        """Count the stop's earliest row instead of the previously counted one"""
+        members = self._stops.get(stop)
+        kept = min(members.items(), key=lambda member: member[1][0]) if members else None
+        previous = self._kept.get(stop)
+        if kept is not None and previous is not None and kept[0] == previous[0] and kept[1][1] is previous[1]:
+            return
+
+        if previous is not None:
+            self._add(previous[1], -1)
+            del self._kept[stop]
+        if kept is not None:
+            self._add(kept[1][1], 1)
+            self._kept[stop] = (kept[0], kept[1][1])
+
+    def _add(self, counted, sign):
+        carrier, period, contribution = counted
+        counters = self._counters.setdefault((carrier, period), [0] * len(COUNT_COLUMNS))
+        for i, value in enumerate(contribution):
+            counters[i] += sign * value
+
+    def _advance(self, period):
+        """Move to a new week, dropping rows and counters of earlier weeks"""
+        if period <= self.period:
+            return
+        self.period = period
+        for row_id in [row_id for row_id, row in self._rows.items() if row[1] < period]:
+            self._remove(row_id)
+        self._counters = {key: counts for key, counts in self._counters.items() if key[1] >= period}
+        self._below.clear()
+
+    def _advance_watermark(self, rows, updated):
+        self.last_id = max(self.last_id, int(rows['id'].max()))
+        latest = updated.max()
+        if pd.notna(latest) and (pd.isna(self.last_updated) or latest > self.last_updated):
+            self.last_updated = latest
+
+    # ------------------------------------------------------------------------
+    # Metrics and alerts
+    # ------------------------------------------------------------------------
+
+    def counts(self, carrier_name, period=None):
+        """Week-to-date counts (COUNT_COLUMNS) for a carrier"""
+        counters = self._counters.get((carrier_name, period or self.period), [0] * len(COUNT_COLUMNS))
+        return dict(zip(COUNT_COLUMNS, counters))
+
+    def metrics(self, carrier_name, period=None):
+        """Week-to-date OTP %, OTD % and Tracking % (None without events)"""
+        counts = self.counts(carrier_name, period)
+        return {metric: (counts[numerator] / counts[denominator] * 100 if counts[denominator] > 0 else None)
+                for metric, (numerator, denominator) in TREND_METRICS.items()}
+
+    def carriers(self):
+        """Carriers with counters in the current week"""
+        return sorted({carrier for carrier, period in self._counters if period == self.period})
+
+    def _check(self, carriers):
+        """Alert for metrics that dropped below target (each alerts once until it recovers)"""
+        raised = []
+        for carrier in sorted(carriers):
+            counts = self.counts(carrier)
+            for metric, (numerator, denominator) in TREND_METRICS.items():
+                target = self.targets.get(metric)
+                if target is None or counts[denominator] < self.min_events:
+                    continue
+                value = counts[numerator] / counts[denominator] * 100
+                if value >= target:
+                    self._below.discard((carrier, metric))
+                elif (carrier, metric) not in self._below:
+                    self._below.add((carrier, metric))
+                    raised.append({
+                        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                        'carrier': carrier,
+                        'week': period_label(self.period),
+                        'metric': metric,
+                        'value': round(value, 2),
+                        'target': target,
+                        'events': counts[denominator],
+                    })
+
+        for alert in raised:
+            for sink in self.sinks:
+                sink(alert)
+        self.alerts.extend(raised)
+        return raised
+
+# ============================================================================
+# EVENT SOURCES
+# ============================================================================
+
+def fetch_changes(conn, monitor):
+    """
+    Rows added or updated since the monitor's watermark, for the current
+    week onwards (updatedAt is compared with >=, replayed rows are harmless)
+    """
+    week_start, _ = period_bounds(monitor.period)
+    last_updated = monitor.last_updated
+    query = """
+        SELECT *
+        FROM otp_reports
+        WHERE (id > %(last_id)s
+               OR STR_TO_DATE(updatedAt, '%m/%d/%Y %H:%i:%s') >= %(last_updated)s)
+        AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= %(week_start)s
+        ORDER BY id DESC
+    """
+    return pd.read_sql(query, conn, params={
+        'last_id': monitor.last_id,
+        'last_updated': (last_updated if pd.notna(last_updated) else pd.Timestamp(0)).strftime('%Y-%m-%d %H:%M:%S'),
+        'week_start': week_start.strftime('%Y-%m-%d'),
+    })
+
+def run(monitor, interval=60, iterations=None):
+    """
+    Poll the database and feed changed rows to the monitor
+
+    Args:
+        monitor: OTPMonitor
+        interval: Seconds between polls
+        iterations: Number of polls (default: run until interrupted)
+    """
+    from report_generator import get_db_connection
+
+    polls = 0
+    while iterations is None or polls < iterations:
+        conn = get_db_connection()
+        try:
+            rows = fetch_changes(conn, monitor)
+        finally:
+            conn.close()
+        alerts = monitor.process(rows)
+        print(f"🔄 {datetime.datetime.now():%Y-%m-%d %H:%M:%S} {len(rows):,} changed rows, "
+              f"{len(monitor.carriers())} carriers this week, {len(alerts)} new alerts")
+        polls += 1
+        if iterations is None or polls < iterations:
+            time.sleep(interval)
+
+def replay(monitor, events, batch_size=500, today=None):
+    """
+    Feed a recorded stream of rows to the monitor in batches
+
+    Args:
+        monitor: OTPMonitor
+        events: DataFrame of otp_reports rows in arrival order (a row may
+            appear several times, later versions replacing earlier ones)
+        batch_size: Rows per batch
+        today: Current date for every batch (default: today)
+
+    Returns:
+        List of alerts raised
+    """
+    alerts = []
+    for start in range(0, len(events), batch_size):
+        alerts.extend(monitor.process(events.iloc[start:start + batch_size], today=today))
+    return alerts
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+if __name__ == '__main__':
+    sinks = [file_sink(os.environ.get('ALERT_FILE', 'otp_alerts.jsonl'))]
+    if os.environ.get('ALERT_WEBHOOK'):
+        sinks.append(webhook_sink(os.environ['ALERT_WEBHOOK']))
+    monitor = OTPMonitor(sinks, min_events=int(os.environ.get('MONITOR_MIN_EVENTS', DEFAULT_MIN_EVENTS)))
+
+    if len(sys.argv) > 2 and sys.argv[1] == 'replay':
+        path = sys.argv[2]
+        events = pd.read_csv(path) if path.endswith('.csv') else pd.read_pickle(path)
+        # Replay as of the week of the recorded rows
+        today = pd.to_datetime(events['pickWindowFrom'], errors='coerce').min().date()
+        alerts = replay(monitor, events, today=today)
+        print(f"✅ Replayed {len(events):,} rows: {len(alerts)} alerts")
+        for alert in alerts:
+            print(f"   🚨 {alert['carrier']} {alert['metric']} {alert['value']}% < {alert['target']}% "
+                  f"({alert['events']} events, {alert['week']})")
+    elif len(sys.argv) > 1:
+        print(f"Unknown command '{sys.argv[1]}'. Use no arguments or 'replay <file>'.")
+        sys.exit(1)
+    else:
+        print(f"👀 Monitoring otp_reports from {period_label(monitor.period)} (Ctrl+C to stop)...")
+        run(monitor, interval=int(os.environ.get('MONITOR_INTERVAL', 60)))
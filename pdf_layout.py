@@ -0,0 +1,177 @@
+"""
+Measured pagination of the report's detail tables
+
+Detail tables used to be cut at a fixed number of rows per page, whatever
+the rows held: pages of one-line rows were mostly empty while long lanes ran
+out of their cells. Here every cell is measured with the table font's glyph
+advances (read once per character and cached), text that does not fit its
+column is wrapped onto more lines, and rows are packed onto each page until
+the table area is full.
+
+Both PDF backends draw the pages laid out here, so they paginate alike.
+Widths are measured with matplotlib's table font (DejaVu Sans Bold), which
+is slightly wider than reportlab's Helvetica.
+"""
+
+import string
+from functools import lru_cache
+
+import numpy as np
+from matplotlib.font_manager import FontProperties, findfont, get_font
+
+# Table cell fonts (points)
+DETAIL_FONT_SIZE = 5.5
+DETAIL_HEADER_FONT_SIZE = 7
+
+# Line height as a multiple of the font size (matplotlib's text linespacing)
+LINE_SPACING = 1.2
+
+# Horizontal padding of cell text (fraction of the cell width, matplotlib Cell.PAD)
+CELL_PAD = 0.1
+
+# Vertical space around the text of a row (points, top and bottom together)
+ROW_PADDING = 6
+
+# Font size glyph advances are read at (a large size keeps hinting out of them)
+_METRICS_SIZE = 100
+
+@lru_cache(maxsize=None)
+def _font():
+    font = get_font(findfont(FontProperties(weight='bold')))
+    font.set_size(_METRICS_SIZE, 72)
+    return font
+
+@lru_cache(maxsize=None)
+def char_advance(char):
+    """Advance width of a character in the table font, in points at font size 1"""
+    glyph = _font().load_char(ord(char))
+    return glyph.linearHoriAdvance / 65536 / _METRICS_SIZE
+
+@lru_cache(maxsize=None)
+def _max_ascii_advance():
+    return max(char_advance(char) for char in string.printable if char.isprintable())
+
+def text_width(text, fontsize):
+    """Width of a single line of text in points (kerning ignored)"""
+    return sum(char_advance(char) for char in text) * fontsize
+
+def wrap_text(text, width, fontsize):
+    """
+    Break text into lines that fit width (points)
+
+    Lines only break at spaces (and existing newlines); a word wider than
+    width keeps a line of its own.
+
+    Returns:
+        Text with '\\n' between lines
+    """
+    space = char_advance(' ') * fontsize
+    lines = []
+    for paragraph in text.split('\n'):
+        line, line_width = [], 0
+        for word in paragraph.split(' '):
+            word_width = text_width(word, fontsize)
+            if line and line_width + space + word_width > width:
+                lines.append(' '.join(line))
+                line, line_width = [], 0
+            line_width += (space if line else 0) + word_width
+            line.append(word)
+        lines.append(' '.join(line))
+    return '\n'.join(lines)
+
+def wrap_column(values, width, fontsize, lengths=None):
+    """
+    Wrap the cells of one column
+
+    Cells short enough to fit whatever their characters are left as they are
+    without measuring them; every other distinct value is measured once.
+
+    Args:
+        values: Cell strings
+        width: Column width in points
+        fontsize: Font size in points
+        lengths: Character counts of the values, if already known
+
+    Returns:
+        (cells, lines): wrapped cell strings and their line counts (array)
+    """
+    text_space = width * (1 - 2 * CELL_PAD)
+    max_chars = int(text_space / (_max_ascii_advance() * fontsize))
+    if lengths is None:
+        lengths = map(len, values)
+    wrapped = {}
+    cells = []
+    for value, length in zip(values, lengths):
+        if length <= max_chars and value.isascii() and '\n' not in value:
+            cells.append(value)
+            continue
+        if value not in wrapped:
+            wrapped[value] = wrap_text(value, text_space, fontsize)
+        cells.append(wrapped[value])
+    lines = np.fromiter((cell.count('\n') + 1 for cell in cells), dtype=int, count=len(cells))
+    return cells, lines
+
+def row_height(lines, fontsize):
+    """Height in points of rows holding this many lines of text"""
+    return lines * fontsize * LINE_SPACING + ROW_PADDING
+
+def pack_rows(row_heights, height):
+    """
+    Cut rows into pages filling height (points) each
+
+    Every page gets at least one row, even one taller than the page.
+
+    Returns:
+        List of (start, end) row positions
+    """
+    bottoms = np.cumsum(row_heights)
+    pages = []
+    start, used = 0, 0
+    while start < len(bottoms):
+        end = max(int(np.searchsorted(bottoms, used + height, side='right')), start + 1)
+        pages.append((start, end))
+        used = bottoms[end - 1]
+        start = end
+    return pages
+
+def paginate_table(header, columns, col_widths, table_size, fontsize=DETAIL_FONT_SIZE,
+                   header_fontsize=DETAIL_HEADER_FONT_SIZE, lengths=None):
+    """
+    Lay out a table over as few pages as its measured rows fit
+
+    Args:
+        header: Column names
+        columns: Cell strings, column by column
+        col_widths: Relative column widths (summing to 1)
+        table_size: (width, height) of the table area in points; the header
+            is repeated at the top of every page
+        fontsize, header_fontsize: Cell and header font sizes (points)
+        lengths: (rows, columns) array of the cells' character counts, if
+            already known
+
+    Returns:
+        Dict with the wrapped 'header' and 'rows', the 'header_height' and
+        'row_heights' (points) and the (start, end) row positions of the
+        'pages'
+    """
+    table_width, table_height = table_size
+    header = [wrap_text(str(name), width * table_width * (1 - 2 * CELL_PAD), header_fontsize)
+              for name, width in zip(header, col_widths)]
+    header_height = row_height(max(name.count('\n') + 1 for name in header), header_fontsize)
+
+    wrapped = []
+    lines = np.ones(len(columns[0]) if columns else 0, dtype=int)
+    for j, (column, width) in enumerate(zip(columns, col_widths)):
+        cells, cell_lines = wrap_column(column, width * table_width, fontsize,
+                                        None if lengths is None else lengths[:, j].tolist())
+        wrapped.append(cells)
+        np.maximum(lines, cell_lines, out=lines)
+    row_heights = row_height(lines, fontsize)
+
+    return {
+        'header': header,
+        'rows': [list(row) for row in zip(*wrapped)],
+        'header_height': header_height,
+        'row_heights': row_heights,
+        'pages': pack_rows(row_heights, table_height - header_height),
+    }
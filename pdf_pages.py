@@ -0,0 +1,1102 @@
+"""
+Pages of the Carrier Performance PDF report
+
+The full report is a sequence of sections: title, performance metrics, an
+optional rolling trends page, then for pickups and deliveries a delay code
+page (table and pie chart) followed by the paginated delay details. Named
+reports (REPORT_SPECS) select some of the sections. This module builds the
+content of each page (table rows, colors, detail frames) and renders the
+pages as matplotlib figures. Other backends (see pdf_reportlab.py) draw the
+same content with the same layout.
+"""
+
+import datetime
+import io
+import os
+from functools import lru_cache
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path
+from matplotlib.table import Cell
+from matplotlib.transforms import Affine2D, Bbox
+from PIL import Image
+
+from events import event_lanes, format_window
+from lateness import format_lateness
+from pdf_layout import DETAIL_FONT_SIZE, DETAIL_HEADER_FONT_SIZE, paginate_table
+from trends import METRIC_TARGETS
+
+# Color scheme
+WARP_GREEN = '#2E7D32'
+WARP_DARK = '#1976D2'
+WARP_GRAY = '#F5F5F5'
+WARP_WHITE = '#FFFFFF'
+WARP_BORDER = '#BDBDBD'
+WARP_TEXT = '#212121'
+ON_TIME_COLOR = '#4CAF50'
+# Tableau Classic color palette - Reordered: Coral Red first, Steel Blue 7th
+PIE_COLORS = ['#E15759', '#F28E2B', '#76B7B2', '#59A14F', '#EDC948', '#B07AA1',
+              '#4E79A7', '#FF9DA7', '#9C755F', '#BAB0AC', '#A0CBE8', '#FFBE7D']
+
+# Renderers of generate_pdf_report ('reportlab' draws tables natively, see
+# pdf_reportlab.py)
+PDF_BACKENDS = ('matplotlib', 'reportlab')
+DEFAULT_PDF_BACKEND = os.environ.get('PDF_BACKEND', 'matplotlib')
+
+# Processes rendering report pages (0: one per CPU core, see pdf_parallel.py)
+DEFAULT_PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 1)) or None
+
+# Bytes per chunk when streaming a written PDF (a multiple of 3, so chunks
+# can be base64-encoded one at a time)
+PDF_CHUNK_SIZE = 48 * 1024
+
+# Render budget: above this many delay detail pages (0: no limit), or above
+# this many estimated seconds of rendering them, the largest detail tables
+# are summarized (see over_budget_kinds)
+DEFAULT_MAX_DETAIL_PAGES = int(os.environ.get('PDF_MAX_DETAIL_PAGES', 100)) or None
+DEFAULT_MAX_RENDER_SECONDS = float(os.environ.get('PDF_MAX_RENDER_SECONDS', 0)) or None
+
+# Rough seconds to render one detail page on one core, per backend
+DETAIL_PAGE_SECONDS = {'matplotlib': 0.5, 'reportlab': 0.025}
+
+# Lane and delay code combinations on a detail summary page
+DETAIL_SUMMARY_ROWS = 20
+
+# Compact output (see write_report): the strongest stream compression.
+# Fonts stay Type 3, which embeds only the glyphs used; TrueType (Type 42)
+# subsets came out larger, more so once parallel parts are merged
+COMPACT_RC = {'pdf.compression': 9}
+
+# Size a written report should stay under (bytes, 0: no target)
+DEFAULT_PDF_TARGET_BYTES = int(os.environ.get('PDF_TARGET_BYTES', 0)) or None
+
+# Landscape letter, in inches
+PAGE_SIZE = (11, 8.5)
+
+# Next to this module, so reports can be written from any directory
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warp_logo.png')
+
+# Resolution of the embedded logo at its largest (title page) size
+LOGO_DPI = 200
+
+# Logo positions ([left, bottom, width, height] as fractions of the page)
+TITLE_LOGO_RECT = [0.35, 0.70, 0.3, 0.2]
+FOOTER_LOGO_RECT = [0.42, 0.02, 0.16, 0.06]
+
+# Top of the delay detail tables (fraction of the page axes; rows are packed
+# down to the bottom of the axes, see pdf_layout.py)
+DETAIL_TABLE_TOP = 0.85
+
+# Metrics table rows: (label, metrics_df metric)
+METRIC_ROWS = [('Shipments', 'Shipments'), ('Routes', 'Routes'),
+               ('OTP %\n(Target 98.5%)', 'OTP %'),
+               ('OTD %\n(Target 98.0%)', 'OTD %'),
+               ('Tracking %\n(Target 100%)', 'Tracking %')]
+PERCENT_METRICS = ['OTP %', 'OTD %', 'Tracking %']
+
+# Footnote for Routes estimated by the rollups' route sketches (marked '~',
+# see metrics_df.attrs['approximate_routes'] and routes.py)
+APPROXIMATE_ROUTES_NOTE = '~Routes: estimated (about ±1%) when over 2,048 routes'
+
+# Per-kind labels and delay_data keys of the delay code and detail pages
+DELAY_KINDS = {
+    'pickup': {
+        'title': 'Pickup',
+        'code': 'Pickup Delay Code',
+        'status': 'Pickup Status',
+        'columns': [('Pickup Delay Code', 'pickupDelayCode')],
+        'window': ('Pickup Window', 'pickWindowFrom', 'pickWindowTo'),
+        'times': [('Pick Departed', 'pickTimeDeparted'), ('Pick Arrived', 'pickTimeArrived')],
+    },
+    'delivery': {
+        'title': 'Delivery',
+        'code': 'Delivery Delay Code',
+        'status': 'Delivery Status',
+        'columns': [('Delivery Delay Code', 'deliveryDelayCode')],
+        'window': ('Drop Window', 'dropWindowFrom', 'dropWindowTo'),
+        'times': [('Drop Departed', 'dropTimeDeparted'), ('Drop Arrived', 'dropTimeArrived')],
+    },
+}
+
+# Report sections in report order: the page job each one adds (see
+# report_jobs) and the report data it needs ('metrics': metrics_df, the
+# title's weeks included; 'delays': delay_data; 'trends': trend_data)
+REPORT_SECTIONS = {
+    'title': {'job': ('title',), 'needs': ('metrics',)},
+    'metrics': {'job': ('metrics',), 'needs': ('metrics',)},
+    'trends': {'job': ('trends',), 'needs': ('trends',)},
+    'pickup_delay_codes': {'job': ('delay_codes', 'pickup'), 'needs': ('delays',)},
+    'pickup_details': {'job': ('details', 'pickup'), 'needs': ('delays',)},
+    'delivery_delay_codes': {'job': ('delay_codes', 'delivery'), 'needs': ('delays',)},
+    'delivery_details': {'job': ('details', 'delivery'), 'needs': ('delays',)},
+}
+
+# Named reports (report_sections), from the full report down to a two-page
+# executive report
+REPORT_SPECS = {
+    'full': tuple(REPORT_SECTIONS),
+    'summary': ('title', 'metrics', 'trends', 'pickup_delay_codes', 'delivery_delay_codes'),
+    'pickup': ('title', 'pickup_delay_codes', 'pickup_details'),
+    'delivery': ('title', 'delivery_delay_codes', 'delivery_details'),
+    'executive': ('title', 'metrics'),
+}
+DEFAULT_REPORT_SPEC = os.environ.get('REPORT_SPEC', 'full')
+
+# ============================================================================
+# DYNAMIC COLUMN WIDTH CALCULATION
+# ============================================================================
+
+def text_columns(df):
+    """
+    Cell strings of a table, column by column (empty for missing values)
+
+    Each value is converted to a string once; widths (text_lengths) and
+    pages (table_layout) are both worked out from these.
+
+    Returns:
+        List of object arrays, one per column
+    """
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        text = values.astype(str).to_numpy(dtype=object, copy=True)
+        text[values.isna().to_numpy()] = ''
+        columns.append(text)
+    return columns
+
+def text_lengths(columns):
+    """Character count of every cell of text_columns output, as a (rows, columns) array"""
+    return np.column_stack([np.fromiter(map(len, column), dtype=int, count=len(column)) for column in columns])
+
+def column_widths(header, lengths, min_w=0.06, max_w=0.30, rows=slice(None)):
+    """
+    Column widths in proportion to the longest text of each column
+
+    Args:
+        header: Column names (the longest line of each counts too)
+        lengths: text_lengths output for the table
+        min_w: Minimum width for any column (default 6%)
+        max_w: Maximum width for any column (default 30%)
+        rows: Rows to fit (e.g. one page's slice; default: the whole
+            table, so every page shares one set of widths)
+
+    Returns:
+        List of column widths that sum to 1.0
+    """
+    # Handle newlines in column names by taking the longest line
+    header_lens = [max(len(line) for line in str(name).split('\n')) for name in header]
+    max_lens = np.maximum(lengths[rows].max(axis=0, initial=0), header_lens)
+
+    # Proportional widths within the min/max constraints, renormalized to sum to 1.0
+    widths = np.clip(max_lens / max_lens.sum(), min_w, max_w)
+    return (widths / widths.sum()).tolist()
+
+def compute_col_widths(df, min_w=0.06, max_w=0.30):
+    """
+    Automatically compute optimal column widths based on actual text length.
+
+    Args:
+        df: DataFrame with the data to display
+        min_w: Minimum width for any column (default 6%)
+        max_w: Maximum width for any column (default 30%)
+
+    Returns:
+        List of column widths that sum to 1.0
+    """
+    return column_widths(df.columns, text_lengths(text_columns(df)), min_w, max_w)
+
+# ============================================================================
+# PAGE CONTENT
+# ============================================================================
+
+def get_performance_color(value, target):
+    """Returns color based on performance vs target."""
+    if pd.isna(value):
+        return WARP_WHITE
+    if value >= target:
+        return '#90EE90'  # Light green (meets target)
+    gap = target - value
+    if gap >= 10:
+        return '#FF4444'  # Bright red (very bad)
+    elif gap >= 5:
+        return '#FF6666'  # Red (bad)
+    elif gap >= 2:
+        return '#FF9966'  # Orange-red (concerning)
+    else:
+        return '#FFB366'  # Light orange (slightly below)
+
+def report_weeks(metrics_df):
+    """Period labels (e.g. '2026-W05') in the order of the metrics table"""
+    return list(dict.fromkeys(metrics_df.columns.get_level_values(1)))
+
+def weeks_subtitle(weeks):
+    return f'Weeks {weeks[0]} & {weeks[1]}' if len(weeks) == 2 else f'Weeks {", ".join(map(str, weeks))}'
+
+def metrics_table(metrics_df, weeks):
+    """
+    Rows and value cell colors of the performance metrics table
+
+    Returns:
+        (table_data, colors): header plus one row per metric, and the fill
+        color of each value cell (rows without a header, columns without
+        the metric names)
+    """
+    table_data = [['Metric'] + weeks]
+    colors = []
+    for i, (metric_name, metric_key) in enumerate(METRIC_ROWS, start=1):
+        row = [metric_name]
+        row_colors = []
+        for week in weeks:
+            val = metrics_df[(metric_key, week)].values[0]
+            if metric_key in PERCENT_METRICS:
+                row.append(f'{val:.1f}%' if not pd.isna(val) else '-')
+            elif metric_key == 'Routes' and week in approximate_routes(metrics_df):
+                row.append(f'~{int(val)}')
+            else:
+                row.append(f'{int(val)}' if not pd.isna(val) else '-')
+
+            # Color coding for performance metrics
+            if metric_key in METRIC_TARGETS and not pd.isna(val):
+                row_colors.append(get_performance_color(val, METRIC_TARGETS[metric_key]))
+            else:
+                row_colors.append(WARP_GRAY if i % 2 == 0 else WARP_WHITE)
+        table_data.append(row)
+        colors.append(row_colors)
+    return table_data, colors
+
+def approximate_routes(metrics_df):
+    """Period labels whose Routes are sketch estimates rather than exact counts"""
+    return metrics_df.attrs.get('approximate_routes', [])
+
+def delay_code_table(delay_data, kind):
+    """Header and rows (code, count, share) of the delay code table"""
+    spec = DELAY_KINDS[kind]
+    counts = delay_data[f'{kind}_delay_counts']
+    table_data = [[spec['code'].replace(' Delay', '\nDelay'), 'Count', '% of Total\nShipments']]
+    for code, count, share in zip(counts[spec['code']], counts['Count'], counts['% of Total Shipments']):
+        table_data.append([code, str(count), f"{share:.1f}%"])
+    return table_data
+
+def delay_details(delay_data, kind):
+    """Delay detail table (one row per late event) shown on the detail pages"""
+    spec = DELAY_KINDS[kind]
+    data = delay_data[f'{kind}_delay_data']
+    window_name, window_from, window_to = spec['window']
+    columns = {'Order Code': data['orderCode'].to_numpy()}
+    for name, col in spec['columns']:
+        columns[name] = data[col].to_numpy()
+    columns['Lane'] = event_lanes(data, delay_data['lanes']).to_numpy()
+    columns[window_name] = format_window(data[window_from], data[window_to])
+    for name, col in spec['times']:
+        columns[name] = data[col].to_numpy()
+    columns['Tracking'] = data['isTracking'].to_numpy()
+    return pd.DataFrame(columns)
+
+def subplot_rect(ncols, index):
+    """[left, bottom, width, height] of subplot index (0-based) in a 1 x ncols grid"""
+    params = plt.rcParams
+    left, right = params['figure.subplot.left'], params['figure.subplot.right']
+    bottom, top = params['figure.subplot.bottom'], params['figure.subplot.top']
+    wspace = params['figure.subplot.wspace']
+    width = (right - left) / (ncols + wspace * (ncols - 1))
+    return [left + index * width * (1 + wspace), bottom, width, top - bottom]
+
+def detail_table_size():
+    """(width, height) in points of the area a detail table fills on its page"""
+    _, _, width, height = subplot_rect(1, 0)
+    return PAGE_SIZE[0] * 72 * width, PAGE_SIZE[1] * 72 * height * DETAIL_TABLE_TOP
+
+def table_layout(frame):
+    """
+    Column widths, wrapped cells, row heights and pages of a detail-style table
+
+    Returns:
+        pdf_layout.paginate_table output plus the table's 'col_widths' (one
+        set for the whole table, so every page lines up)
+    """
+    columns = text_columns(frame)
+    lengths = text_lengths(columns)
+    col_widths = column_widths(frame.columns, lengths)
+    layout = paginate_table(frame.columns.tolist(), columns, col_widths, detail_table_size(), lengths=lengths)
+    layout['col_widths'] = col_widths
+    return layout
+
+def detail_layout(delay_data, kind):
+    """Layout (table_layout) of a delay detail table; one stored in delay_data under '<kind>_detail_layout' is reused"""
+    if f'{kind}_detail_layout' in delay_data:
+        return delay_data[f'{kind}_detail_layout']
+    return table_layout(delay_details(delay_data, kind))
+
+def with_detail_layouts(delay_data, summarize=(), kinds=tuple(DELAY_KINDS)):
+    """Copy of delay_data with the layouts of the kinds' detail tables computed (see detail_layout)"""
+    return {**delay_data, **{f'{kind}_detail_layout': detail_layout(delay_data, kind) for kind in kinds
+                             if len(delay_data[f'{kind}_delay_data']) > 0 and kind not in summarize}}
+
+def detail_title(kind, page_num, total_pages, section='Details'):
+    title = f"{DELAY_KINDS[kind]['title']} Delay {section}"
+    return f'{title} - Page {page_num + 1} of {total_pages}' if total_pages > 1 else title
+
+def detail_subtitle(start, end, total_rows):
+    return f'(Showing records {start + 1}-{end} of {total_rows} total)'
+
+def over_budget_kinds(delay_data, backend, workers=1, max_detail_pages=DEFAULT_MAX_DETAIL_PAGES,
+                      max_seconds=DEFAULT_MAX_RENDER_SECONDS, kinds=tuple(DELAY_KINDS)):
+    """
+    Delay kinds whose detail pages do not fit the render budget
+
+    The largest detail tables are summarized (see detail_summary) until the
+    remaining detail pages fit both limits. The time limit is turned into
+    pages with the backend's DETAIL_PAGE_SECONDS, spread over the workers.
+
+    Args:
+        delay_data: analyze_delay_codes output
+        backend: 'matplotlib' or 'reportlab'
+        workers: Processes rendering pages
+        max_detail_pages: Most detail pages to render (None: no limit)
+        max_seconds: Most estimated seconds of detail pages (None: no limit)
+        kinds: Kinds whose detail pages are in the report (see detail_kinds)
+
+    Returns:
+        Tuple of kinds to summarize (empty when the report fits)
+    """
+    budget = [limit for limit in (max_detail_pages,) if limit]
+    if max_seconds:
+        budget.append(int(max_seconds * workers / DETAIL_PAGE_SECONDS[backend]))
+    if not budget:
+        return ()
+
+    pages = {kind: len(detail_layout(delay_data, kind)['pages']) for kind in kinds
+             if len(delay_data[f'{kind}_delay_data']) > 0}
+    summarize = []
+    for kind in sorted(pages, key=pages.get, reverse=True):
+        if sum(pages.values()) <= min(budget):
+            break
+        summarize.append(kind)
+        pages[kind] = 0
+    return tuple(summarize)
+
+def detail_summary(delay_data, kind, top_n=DETAIL_SUMMARY_ROWS):
+    """
+    Late events by lane and delay code, busiest first (shown instead of the detail pages)
+
+    Returns:
+        DataFrame of the top_n combinations, plus one row totalling the rest
+    """
+    spec = DELAY_KINDS[kind]
+    data = delay_data[f'{kind}_delay_data']
+    code_column = spec['columns'][0][1]
+    counts = (pd.DataFrame({'Lane': event_lanes(data, delay_data['lanes']).to_numpy(),
+                            spec['code']: data[code_column].to_numpy()})
+              .value_counts(sort=True).rename('Late Events').reset_index())
+    top = counts.head(top_n)
+    if len(counts) > top_n:
+        rest = counts['Late Events'].iloc[top_n:]
+        top = pd.concat([top, pd.DataFrame({'Lane': [f'All other ({len(rest)} combinations)'],
+                                            spec['code']: [''], 'Late Events': [rest.sum()]})],
+                        ignore_index=True)
+    top['% of Late Events'] = (top['Late Events'] / len(data) * 100).map('{:.1f}%'.format)
+    return top
+
+def summary_subtitle(delay_data, kind):
+    return (f"({len(delay_data[f'{kind}_delay_data']):,} late events, too many to list here: "
+            f"every event is in the CSV appendix)")
+
+def detail_appendix(delay_data, kinds):
+    """
+    Delay details of the given kinds as one compact table (the CSV appendix of a summarized report)
+
+    Columns are shared by pickups and deliveries (Stop tells them apart).
+    """
+    frames = []
+    for kind in kinds:
+        spec = DELAY_KINDS[kind]
+        (departed, _), (arrived, _) = spec['times']
+        details = delay_details(delay_data, kind).rename(columns={
+            spec['columns'][0][0]: 'Delay Code', spec['window'][0]: 'Window',
+            departed: 'Departed', arrived: 'Arrived'})
+        details.insert(0, 'Stop', spec['title'])
+        frames.append(details)
+    return pd.concat(frames, ignore_index=True)
+
+# ============================================================================
+# MATPLOTLIB PAGES
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def logo_image(bottom_up=False):
+    """
+    The Warp logo as an RGBA array, decoded and downscaled to LOGO_DPI once
+
+    Args:
+        bottom_up: Rows from the bottom of the image up (as matplotlib
+            renderers take them)
+
+    Returns:
+        uint8 array of shape (rows, columns, 4), or None if the logo cannot
+        be loaded
+    """
+    if bottom_up:
+        logo = logo_image()
+        return None if logo is None else np.ascontiguousarray(logo[::-1])
+    try:
+        with Image.open(LOGO_PATH) as image:
+            image = image.convert('RGBA')
+    except Exception as e:
+        print(f"⚠️  Warning: Could not load logo: {e}")
+        return None
+    width = round(TITLE_LOGO_RECT[2] * PAGE_SIZE[0] * LOGO_DPI)
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    return np.asarray(image)
+
+class LogoImage(Artist):
+    """
+    An image (rows bottom up) fitted, aspect kept and centered, into rect
+    (fractions of the figure)
+
+    imshow resamples its image into a new array on every draw, so a PDF
+    gets one copy of the logo per page. This artist hands the renderer the
+    same array every time; the PDF writer embeds an array once per document
+    and every page references that image object.
+    """
+
+    def __init__(self, image, rect):
+        super().__init__()
+        self.image = image
+        self.rect = rect
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        left, bottom, width, height = self.rect
+        (x0, y0), (x1, y1) = self.figure.transFigure.transform([(left, bottom), (left + width, bottom + height)])
+        rows, cols = self.image.shape[:2]
+        scale = min((x1 - x0) / cols, (y1 - y0) / rows)
+        w, h = cols * scale, rows * scale
+        x, y = (x0 + x1 - w) / 2, (y0 + y1 - h) / 2
+
+        gc = renderer.new_gc()
+        if renderer.option_scale_image():
+            # Vector backends scale the image themselves
+            renderer.draw_image(gc, x, y, self.image, Affine2D().scale(w, h))
+        else:
+            # Raster backends draw pixels as they are: resample to the page size
+            row_idx = np.linspace(0, rows - 1, max(1, round(h))).astype(int)
+            col_idx = np.linspace(0, cols - 1, max(1, round(w))).astype(int)
+            renderer.draw_image(gc, x, y, self.image[row_idx][:, col_idx])
+        gc.restore()
+
+def add_logo(fig, rect):
+    """Add the Warp logo to a figure at rect (fractions of the page)"""
+    logo = logo_image(bottom_up=True)
+    if logo is not None:
+        fig.add_artist(LogoImage(logo, rect))
+
+def add_logo_footer(fig):
+    """Add Warp logo as a small footer to the page"""
+    add_logo(fig, FOOTER_LOGO_RECT)
+
+def title_page(carrier_name, weeks):
+    """PAGE 1: Title Page"""
+    fig = plt.figure(figsize=PAGE_SIZE, facecolor=WARP_WHITE)
+
+    # Add WARP logo at the top
+    add_logo(fig, TITLE_LOGO_RECT)
+
+    fig.text(0.5, 0.6, 'Carrier Performance Report',
+             ha='center', fontsize=24, fontweight='bold', color=WARP_DARK)
+    fig.text(0.5, 0.5, f'{carrier_name}',
+             ha='center', fontsize=20, fontweight='bold', color=WARP_TEXT)
+    fig.text(0.5, 0.4, weeks_subtitle(weeks),
+             ha='center', fontsize=16, fontweight='bold', color=WARP_TEXT)
+    fig.text(0.5, 0.3, f'Generated: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M")}',
+             ha='center', fontsize=12, fontweight='bold', style='italic', color=WARP_TEXT)
+    return fig
+
+def metrics_page(carrier_name, weeks, metrics_df):
+    """PAGE 2: Performance Metrics"""
+    fig = plt.figure(figsize=PAGE_SIZE, facecolor=WARP_WHITE)
+    fig.text(0.5, 0.92, 'Performance Metrics',
+             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK)
+
+    ax = fig.add_subplot(111)
+    ax.axis('off')
+
+    table_data, colors = metrics_table(metrics_df, weeks)
+
+    # Create table
+    table = ax.table(cellText=table_data, cellLoc='center', loc='center',
+                     bbox=[0.2, 0.3, 0.6, 0.5])
+    table.auto_set_font_size(False)
+    table.set_fontsize(12)
+    table.scale(1, 3)
+
+    # Dynamic column widths based on actual content
+    temp_df = pd.DataFrame(table_data[1:], columns=table_data[0])
+    col_widths = compute_col_widths(temp_df, min_w=0.15, max_w=0.50)
+    for i in range(len(table_data)):
+        for j, width in enumerate(col_widths):
+            table[(i, j)].set_width(width)
+
+    # Style header
+    for i in range(len(table_data[0])):
+        table[(0, i)].set_facecolor(WARP_DARK)
+        table[(0, i)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=13)
+        table[(0, i)].set_edgecolor(WARP_BORDER)
+        table[(0, i)].set_linewidth(2)
+
+    # Style rows with color coding for performance metrics
+    for i in range(1, len(table_data)):
+        table[(i, 0)].set_facecolor(WARP_DARK)
+        if i >= 3:
+            table[(i, 0)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=10)
+        else:
+            table[(i, 0)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=12)
+        table[(i, 0)].set_edgecolor(WARP_BORDER)
+        table[(i, 0)].set_linewidth(1.5)
+
+        for j in range(1, len(table_data[0])):
+            table[(i, j)].set_facecolor(colors[i - 1][j - 1])
+            table[(i, j)].set_text_props(weight='bold', color=WARP_TEXT)
+            table[(i, j)].set_edgecolor(WARP_BORDER)
+            table[(i, j)].set_linewidth(1)
+
+    fig.text(0.5, 0.82, carrier_name,
+             ha='center', fontsize=14, fontweight='bold', style='italic', color=WARP_TEXT)
+
+    # Add footnotes
+    fig.text(0.5, 0.15, '*OTP: Driver arrived after scheduled pickup window',
+             ha='center', fontsize=9, color=WARP_TEXT)
+    fig.text(0.5, 0.12, '*OTD: Driver arrived after scheduled dropoff window',
+             ha='center', fontsize=9, color=WARP_TEXT)
+    if approximate_routes(metrics_df):
+        fig.text(0.5, 0.18, APPROXIMATE_ROUTES_NOTE, ha='center', fontsize=9, color=WARP_TEXT)
+
+    # Add logo footer
+    add_logo_footer(fig)
+    return fig
+
+def trends_page(carrier_name, trend_data, logo=True):
+    """PAGE 2b: Rolling Trends"""
+    from trends import plot_trends
+
+    fig = plt.figure(figsize=PAGE_SIZE, facecolor=WARP_WHITE)
+    fig.text(0.5, 0.95, 'Performance Trends',
+             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
+    fig.text(0.5, 0.91, carrier_name,
+             ha='center', fontsize=14, fontweight='bold', style='italic', color=WARP_TEXT)
+
+    for i, metric_key in enumerate(PERCENT_METRICS):
+        ax = fig.add_axes([0.07 + i * 0.32, 0.22, 0.26, 0.6])
+        plot_trends(ax, trend_data, metric_key, target=METRIC_TARGETS[metric_key])
+
+    # Add logo footer
+    if logo:
+        add_logo_footer(fig)
+    return fig
+
+def draw_delay_pie(ax, delay_data, kind):
+    """Pie chart of on-time events and delay codes, with total and legend below"""
+    spec = DELAY_KINDS[kind]
+    counts = delay_data[f'{kind}_delay_counts']
+    counts_with_ontime = delay_data[f'{kind}_delay_counts_with_ontime']
+
+    def autopct_format(pct):
+        return f'{pct:.1f}%' if pct >= 5 else ''
+
+    # Use with_ontime data for pie chart
+    pie_colors_with_ontime = [ON_TIME_COLOR] + PIE_COLORS[:len(counts)]
+
+    wedges, texts, autotexts = ax.pie(counts_with_ontime['Count'],
+                                      autopct=autopct_format,
+                                      startangle=90,
+                                      colors=pie_colors_with_ontime,
+                                      wedgeprops={'edgecolor': WARP_WHITE, 'linewidth': 2})
+
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontsize(10)
+        autotext.set_weight('bold')
+
+    # Add "Total Shipments" text above legend
+    ax.text(0.5, -0.10, f"Total Shipments: {delay_data[f'total_{kind}_shipments']}",
+            ha='center', va='top', fontsize=11, fontweight='bold',
+            color=WARP_TEXT, transform=ax.transAxes)
+
+    # Legend below the text
+    ax.legend(wedges, counts_with_ontime[spec['code']],
+              title=spec['status'],
+              loc="upper center",
+              bbox_to_anchor=(0.5, -0.20),
+              fontsize=9,
+              ncol=2,
+              facecolor=WARP_WHITE,
+              edgecolor=WARP_BORDER,
+              labelcolor=WARP_TEXT)
+
+    legend = ax.get_legend()
+    if legend:
+        legend.get_title().set_color(WARP_DARK)
+        legend.get_title().set_fontsize(10)
+        legend.get_title().set_weight('bold')
+
+def delay_codes_page(delay_data, kind):
+    """PAGES 3 and 5: Pickup/Delivery Delay Codes (table and pie chart)"""
+    spec = DELAY_KINDS[kind]
+    fig = plt.figure(figsize=PAGE_SIZE, facecolor=WARP_WHITE)
+    fig.text(0.5, 0.95, f"{spec['title']} Delay Codes",
+             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
+    if f'{kind}_lateness' in delay_data:
+        fig.text(0.5, 0.91, f"Minutes late: {format_lateness(delay_data[f'{kind}_lateness'])}",
+                 ha='center', fontsize=10, fontweight='bold', style='italic', color=WARP_TEXT, transform=fig.transFigure)
+
+    if len(delay_data[f'{kind}_delay_counts']) > 0:
+        # Table on left
+        ax1 = fig.add_subplot(1, 2, 1)
+        ax1.axis('tight')
+        ax1.axis('off')
+
+        table_data = delay_code_table(delay_data, kind)
+
+        # Dynamic sizing
+        n_rows = len(table_data)
+        row_height = 0.08
+        max_height = 0.6
+        bbox_height = min(max_height, row_height * n_rows)
+        bbox_y = 0.5 - bbox_height / 2
+
+        table = ax1.table(cellText=table_data, cellLoc='left', loc='center',
+                          bbox=[0, bbox_y, 1, bbox_height])
+        table.auto_set_font_size(False)
+        table.set_fontsize(10)
+        table.scale(1, 1)
+
+        # Dynamic column widths based on actual content
+        # Create temp DataFrame for width calculation
+        temp_df = pd.DataFrame(table_data[1:], columns=table_data[0])
+        col_widths = compute_col_widths(temp_df, min_w=0.12, max_w=0.65)
+        for i in range(len(table_data)):
+            for j, width in enumerate(col_widths):
+                table[(i, j)].set_width(width)
+
+        # Style header
+        for j in range(3):
+            table[(0, j)].set_facecolor(WARP_DARK)
+            table[(0, j)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=10, wrap=True, ha='center', va='center')
+            table[(0, j)].set_edgecolor(WARP_BORDER)
+            table[(0, j)].set_linewidth(2)
+            table[(0, j)].set_height(0.08)
+
+        # Style data rows
+        for i in range(1, len(table_data)):
+            row_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
+            for j in range(3):
+                table[(i, j)].set_facecolor(row_color)
+                table[(i, j)].set_text_props(weight='bold', color=WARP_TEXT)
+                table[(i, j)].set_edgecolor(WARP_BORDER)
+                table[(i, j)].set_linewidth(1)
+                if j > 0:
+                    table[(i, j)].set_text_props(ha='center', weight='bold', color=WARP_TEXT)
+
+        # Pie chart on right
+        draw_delay_pie(fig.add_subplot(1, 2, 2), delay_data, kind)
+    else:
+        fig.text(0.5, 0.5, f"No {kind} delay codes found",
+                 ha='center', fontsize=14, fontweight='bold', style='italic', color=WARP_TEXT)
+
+    # Add logo footer
+    add_logo_footer(fig)
+    return fig
+
+class TextCell(Cell):
+    """Table cell drawing only its text (compact pages draw the cell backgrounds as row bands)"""
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        self._set_text_position(renderer)
+        self._text.draw(renderer)
+        self.stale = False
+
+class DetailPageTemplate:
+    """
+    PAGES 4+ and 6+: Pickup/Delivery Delay Details (or Summary) pages sharing one figure
+
+    The figure, titles, logo footer and a styled table with the header and
+    room for n_rows rows are built once. fill() only replaces the title,
+    cell text and row heights for the next page (rows a page does not use
+    are hidden), so every page of a table reuses the same artists instead
+    of building and styling a new figure.
+
+    Compact pages look the same but draw the data rows as one path of gray
+    bands and one path of grid lines under text-only cells, instead of a
+    filled and stroked rectangle per cell.
+    """
+
+    def __init__(self, layout, n_rows, compact=False):
+        """
+        Args:
+            layout: table_layout output (header, column widths)
+            n_rows: Most rows any page will show
+            compact: Draw row bands instead of cell rectangles
+        """
+        self.fig = plt.figure(figsize=PAGE_SIZE, facecolor=WARP_WHITE)
+        fig = self.fig
+
+        self.title = fig.text(0.5, 0.95, '', ha='center', fontsize=18, fontweight='bold', color=WARP_DARK,
+                              transform=fig.transFigure)
+        self.subtitle = fig.text(0.5, 0.92, '', ha='center', fontsize=10, fontweight='bold', style='italic',
+                                 color=WARP_TEXT, transform=fig.transFigure)
+
+        ax = fig.add_subplot(111)
+        ax.axis('tight')
+        ax.axis('off')
+        # Points per unit of axes height (row heights are laid out in points)
+        self.axes_height = PAGE_SIZE[1] * 72 * subplot_rect(1, 0)[3]
+
+        header = layout['header']
+        table_data = [header] + [[''] * len(header) for _ in range(n_rows)]
+
+        # The table is fitted to this box, which fill() sizes to each page's rows
+        self.bbox = Bbox.from_bounds(0, 0, 1, 1)
+        table = ax.table(cellText=table_data, cellLoc='left', loc='center', bbox=self.bbox)
+        if compact:
+            for i in range(1, len(table_data)):
+                for j in range(len(header)):
+                    table[(i, j)] = TextCell((0, 0), width=0, height=0, loc='left')
+        table.auto_set_font_size(False)
+        table.set_fontsize(DETAIL_FONT_SIZE)
+
+        # Style header
+        self.header_height = layout['header_height'] / self.axes_height
+        for i in range(len(header)):
+            table[(0, i)].set_facecolor(WARP_DARK)
+            table[(0, i)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=DETAIL_HEADER_FONT_SIZE,
+                                         ha='center', va='center')
+            table[(0, i)].set_edgecolor(WARP_BORDER)
+            table[(0, i)].set_linewidth(1.5)
+            table[(0, i)].set_height(self.header_height)
+
+        # Style data rows (cell text comes wrapped from detail_layout)
+        for i in range(1, len(table_data)):
+            row_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
+            for j in range(len(header)):
+                table[(i, j)].set_facecolor(row_color)
+                table[(i, j)].set_edgecolor(WARP_BORDER)
+                table[(i, j)].set_linewidth(0.5)
+                table[(i, j)].set_text_props(weight='bold', color=WARP_TEXT)
+
+        # Column widths are the same on every page
+        for (i, j), cell in table.get_celld().items():
+            cell.set_width(layout['col_widths'][j])
+
+        if compact:
+            # Bands and grid lines are laid out by fill() (axes coordinates)
+            self.bands = ax.add_patch(PathPatch(Path(np.zeros((0, 2))), facecolor=WARP_GRAY, edgecolor='none',
+                                                transform=ax.transAxes, zorder=-1))
+            self.grid = ax.add_patch(PathPatch(Path(np.zeros((0, 2))), facecolor='none', edgecolor=WARP_BORDER,
+                                               linewidth=0.5, transform=ax.transAxes, zorder=-1))
+            self.col_edges = np.concatenate([[0], np.cumsum(layout['col_widths'])]) / sum(layout['col_widths'])
+        self.compact = compact
+
+        # Data cells by row
+        self.rows = [[table[(i, j)] for j in range(len(header))] for i in range(1, len(table_data))]
+
+        # Add logo footer
+        add_logo_footer(fig)
+
+    def fill(self, rows, row_heights, title, subtitle):
+        """
+        Show the next page
+
+        Args:
+            rows: Rows of (wrapped) cell strings, at most n_rows
+            row_heights: Height of each row in points
+            title, subtitle: Page title and subtitle
+
+        Returns:
+            The page figure (save it before the next fill)
+        """
+        self.title.set_text(title)
+        self.subtitle.set_text(subtitle)
+        table_height = self.header_height
+        for i, cells in enumerate(self.rows):
+            shown = i < len(rows)
+            height = row_heights[i] / self.axes_height if shown else 0
+            table_height += height
+            for j, cell in enumerate(cells):
+                cell.set_visible(shown)
+                cell.set_height(height)
+                if shown:
+                    cell.get_text().set_text(rows[i][j])
+        self.bbox.set_points([[0, DETAIL_TABLE_TOP - table_height], [1, DETAIL_TABLE_TOP]])
+        if self.compact:
+            self._draw_bands(row_heights[:len(rows)])
+        return self.fig
+
+    def _draw_bands(self, row_heights):
+        """Lay out the row bands and grid lines of compact pages under rows of these heights (points)"""
+        # Row edges from the bottom of the header down
+        edges = DETAIL_TABLE_TOP - self.header_height - np.concatenate([[0], np.cumsum(row_heights)]) / self.axes_height
+        tops, bottoms = edges[:-1], edges[1:]
+
+        # Every other row is gray, starting with the second (as the cell colors)
+        bands = [[(0, bottom), (1, bottom), (1, top), (0, top), (0, bottom)]
+                 for top, bottom in zip(tops[1::2], bottoms[1::2])]
+        self.bands.set_path(Path.make_compound_path(*(Path(band, closed=True) for band in bands))
+                            if bands else Path(np.zeros((0, 2))))
+
+        lines = [[(0, y), (1, y)] for y in edges[1:]]
+        lines += [[(x, edges[0]), (x, edges[-1])] for x in self.col_edges]
+        self.grid.set_path(Path.make_compound_path(*(Path(line) for line in lines)))
+
+    def close(self):
+        plt.close(self.fig)
+
+def table_pages(layout, title, subtitle, first_page=0, end_page=None, compact=False):
+    """
+    Figures of a paginated table (table_layout), drawn from one DetailPageTemplate
+
+    Each figure is only valid until the next one is requested.
+
+    Args:
+        layout: table_layout output
+        title: Function (page_num, total_pages) -> page title
+        subtitle: Function (start, end) -> page subtitle, given the rows shown
+        first_page, end_page: Optional range of pages to render (0-based,
+            end exclusive); titles still count all pages
+        compact: Draw row bands instead of cell rectangles
+    """
+    ranges = layout['pages']
+    pages = range(len(ranges))[first_page:end_page]
+    if len(pages) == 0:
+        return
+    template = DetailPageTemplate(layout, max(ranges[page_num][1] - ranges[page_num][0] for page_num in pages),
+                                  compact)
+    try:
+        for page_num in pages:
+            start_idx, end_idx = ranges[page_num]
+            yield template.fill(layout['rows'][start_idx:end_idx], layout['row_heights'][start_idx:end_idx],
+                                title(page_num, len(ranges)), subtitle(start_idx, end_idx))
+    finally:
+        template.close()
+
+def detail_pages(delay_data, kind, first_page=0, end_page=None, compact=False):
+    """Figures of the paginated delay details (none without late events; see table_pages)"""
+    if len(delay_data[f'{kind}_delay_data']) == 0:
+        return
+    layout = detail_layout(delay_data, kind)
+    yield from table_pages(layout, lambda page_num, total_pages: detail_title(kind, page_num, total_pages),
+                           lambda start, end: detail_subtitle(start, end, len(layout['rows'])),
+                           first_page, end_page, compact)
+
+def detail_summary_pages(delay_data, kind, compact=False):
+    """Figures of the delay summary shown instead of the detail pages (see table_pages)"""
+    if len(delay_data[f'{kind}_delay_data']) == 0:
+        return
+    yield from table_pages(table_layout(detail_summary(delay_data, kind)),
+                           lambda page_num, total_pages: detail_title(kind, page_num, total_pages, 'Summary'),
+                           lambda start, end: summary_subtitle(delay_data, kind), compact=compact)
+
+def _closing(fig):
+    """Yield a single-page figure, closing it once it has been used"""
+    try:
+        yield fig
+    finally:
+        plt.close(fig)
+
+# ============================================================================
+# REPORT SECTIONS AND PAGE JOBS
+# ============================================================================
+
+def report_sections(spec=DEFAULT_REPORT_SPEC):
+    """
+    Sections of a report
+
+    Args:
+        spec: A REPORT_SPECS name, or REPORT_SECTIONS names
+
+    Returns:
+        Tuple of section names, in report order
+    """
+    if isinstance(spec, str):
+        if spec not in REPORT_SPECS:
+            raise ValueError(f"Unknown report '{spec}' (expected one of {tuple(REPORT_SPECS)})")
+        spec = REPORT_SPECS[spec]
+    unknown = set(spec) - set(REPORT_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown report sections {sorted(unknown)} (expected some of {tuple(REPORT_SECTIONS)})")
+    return tuple(name for name in REPORT_SECTIONS if name in spec)
+
+def section_needs(sections):
+    """Report data ('metrics', 'delays', 'trends') the sections need"""
+    return {need for name in sections for need in REPORT_SECTIONS[name]['needs']}
+
+def detail_kinds(sections):
+    """Delay kinds whose detail tables the sections show"""
+    return tuple(job[1] for job in (REPORT_SECTIONS[name]['job'] for name in sections) if job[0] == 'details')
+
+def report_jobs(delay_data, trend_data=None, detail_pages_per_job=None, summarize=(),
+                sections=REPORT_SPECS['full']):
+    """
+    The report as an ordered list of page jobs
+
+    Jobs are ('title',), ('metrics',), ('trends',), ('delay_codes', kind),
+    ('details', kind, first_page, end_page) (end_page None: to the last
+    page) and ('detail_summary', kind). Each job can be rendered on
+    its own (see pdf_parallel.py); rendering them in order gives the report.
+
+    Args:
+        delay_data: analyze_delay_codes output (None if no section needs it)
+        trend_data: Optional rolling trends (adds the trends page)
+        detail_pages_per_job: Split detail tables into jobs of this many
+            pages (default: one job per table)
+        summarize: Kinds to show a detail summary for instead of their
+            detail pages (see over_budget_kinds)
+        sections: Sections to include (report_sections output)
+    """
+    jobs = []
+    for name in sections:
+        job = REPORT_SECTIONS[name]['job']
+        if job[0] == 'trends' and (trend_data is None or len(trend_data) == 0):
+            continue
+        if job[0] != 'details':
+            jobs.append(job)
+            continue
+        kind = job[1]
+        if len(delay_data[f'{kind}_delay_data']) == 0:
+            continue
+        if kind in summarize:
+            jobs.append(('detail_summary', kind))
+            continue
+        if detail_pages_per_job is None:
+            jobs.append(('details', kind, 0, None))
+            continue
+        n_pages = len(detail_layout(delay_data, kind)['pages'])
+        for first_page in range(0, n_pages, detail_pages_per_job):
+            jobs.append(('details', kind, first_page, min(first_page + detail_pages_per_job, n_pages)))
+    return jobs
+
+def job_figures(job, carrier_name, metrics_df, delay_data, trend_data=None, compact=False):
+    """Figures of one page job (see report_figures)"""
+    name = job[0]
+    if name == 'title':
+        yield from _closing(title_page(carrier_name, report_weeks(metrics_df)))
+    elif name == 'metrics':
+        yield from _closing(metrics_page(carrier_name, report_weeks(metrics_df), metrics_df))
+    elif name == 'trends':
+        yield from _closing(trends_page(carrier_name, trend_data))
+    elif name == 'delay_codes':
+        yield from _closing(delay_codes_page(delay_data, job[1]))
+    elif name == 'details':
+        yield from detail_pages(delay_data, *job[1:], compact=compact)
+    elif name == 'detail_summary':
+        yield from detail_summary_pages(delay_data, job[1], compact)
+    else:
+        raise ValueError(f"Unknown page job '{name}'")
+
+def report_figures(carrier_name, metrics_df, delay_data, trend_data=None, jobs=None, compact=False):
+    """
+    Figures of every report page (or of the given page jobs), in order
+
+    Figures are closed (or reused for the next page) once the caller asks
+    for the next one, so save each figure before moving on.
+    """
+    for job in jobs or report_jobs(delay_data, trend_data):
+        yield from job_figures(job, carrier_name, metrics_df, delay_data, trend_data, compact)
+
+def write_matplotlib_report(pdf_pages, carrier_name, metrics_df, delay_data, trend_data=None, jobs=None,
+                            compact=False):
+    """Render every page (or the given page jobs) with matplotlib into a PdfPages"""
+    for fig in report_figures(carrier_name, metrics_df, delay_data, trend_data, jobs, compact):
+        pdf_pages.savefig(fig, facecolor=WARP_WHITE)
+
+def write_report(output, backend, carrier_name, metrics_df, delay_data, trend_data=None, jobs=None, compact=False):
+    """
+    Render every page (or the given page jobs) with one backend
+
+    matplotlib writes each page to output as soon as it is drawn; reportlab
+    writes the document when the last page is done.
+
+    Args:
+        output: File path or binary file-like object to write the PDF to
+        backend: 'matplotlib' or 'reportlab' (must be installed)
+        carrier_name, metrics_df, delay_data, trend_data: As for
+            report_generator.generate_pdf_report
+        jobs: Optional page jobs to render (default: the whole report)
+        compact: Write a smaller PDF: tables are drawn as row bands;
+            matplotlib compresses harder (COMPACT_RC) and reportlab embeds
+            the charts at a lower resolution
+    """
+    if backend == 'reportlab':
+        from pdf_reportlab import write_reportlab_report
+        write_reportlab_report(output, carrier_name, metrics_df, delay_data, trend_data, jobs, compact)
+        return
+
+    # Fonts and compression are chosen as the file is written, up to close()
+    with matplotlib.rc_context(COMPACT_RC if compact else {}):
+        pdf_pages = PdfPages(output)
+        try:
+            write_matplotlib_report(pdf_pages, carrier_name, metrics_df, delay_data, trend_data, jobs, compact)
+        finally:
+            pdf_pages.close()
+
+class ByteCounter(io.RawIOBase):
+    """
+    Binary file-like object counting the bytes written through it to a sink
+
+    tell() is the count, so neither the PDF writers nor pdf_size need to
+    seek the sink (which may be write-only, e.g. a pipe or a response).
+    """
+
+    def __init__(self, sink):
+        super().__init__()
+        self.sink = sink
+        self.written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.sink.write(data)
+        self.written += memoryview(data).nbytes
+        return memoryview(data).nbytes
+
+    def tell(self):
+        return self.written
+
+def pdf_size(output):
+    """Size in bytes of a written PDF (file path, or the ByteCounter it was written through)"""
+    if isinstance(output, (str, os.PathLike)):
+        return os.path.getsize(output)
+    return output.tell()
+
+def pdf_chunks(source, chunk_size=PDF_CHUNK_SIZE):
+    """
+    Iterate over a written PDF in chunks of bytes
+
+    Args:
+        source: File path, or binary file-like object (read from the start)
+        chunk_size: Bytes per chunk
+
+    Returns:
+        Iterator of bytes
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from pdf_chunks(f, chunk_size)
+        return
+
+    source.seek(0)
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
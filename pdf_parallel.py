@@ -0,0 +1,171 @@
+"""
+Process-parallel rendering of the Carrier Performance PDF report
+
+Once metrics_df and delay_data are computed, report pages are independent.
+The report is split into page jobs (pdf_pages.report_jobs: title, metrics,
+trends, the two delay code pages and chunks of detail pages), each job is
+rendered to its own small PDF in a process pool, and the parts are merged
+in job order into one document, so a long report takes roughly 1/cores of
+the serial wall time. Parts are written to a temporary directory rather
+than passed back in memory.
+
+Workers are forked so they share the report data without pickling it.
+Merging needs pypdf (pip install pypdf); without it, or where fork is not
+available, reports are rendered serially.
+"""
+
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+from pdf_pages import REPORT_SPECS, detail_kinds, detail_layout, report_jobs, with_detail_layouts, write_report
+
+# Jobs per worker (smaller jobs balance better, but each job has a fixed
+# setup cost and embeds its own fonts)
+JOBS_PER_WORKER = 3
+
+# Smallest chunk of detail pages worth a job of its own
+MIN_DETAIL_PAGES_PER_JOB = 5
+
+def resolve_workers(workers):
+    """Worker processes to use (None: one per CPU core; 1 if parallel rendering is unavailable)"""
+    workers = workers or os.cpu_count() or 1
+    if not PYPDF_AVAILABLE or 'fork' not in multiprocessing.get_all_start_methods():
+        return 1
+    return max(1, workers)
+
+def parallel_jobs(delay_data, trend_data, workers, summarize=(), sections=REPORT_SPECS['full']):
+    """Page jobs with detail tables cut into about JOBS_PER_WORKER chunks per worker"""
+    detail_pages = sum(len(detail_layout(delay_data, kind)['pages']) for kind in detail_kinds(sections)
+                       if len(delay_data[f'{kind}_delay_data']) > 0 and kind not in summarize)
+    pages_per_job = max(MIN_DETAIL_PAGES_PER_JOB, math.ceil(detail_pages / (workers * JOBS_PER_WORKER)))
+    return report_jobs(delay_data, trend_data, detail_pages_per_job=pages_per_job, summarize=summarize,
+                       sections=sections)
+
+# Report data shared with forked workers (set only while a pool is running)
+_shared_report = None
+
+def _render_job(task):
+    """Worker: render one page job to a PDF file, returning its path"""
+    job, backend, compact, path = task
+    write_report(path, backend, *_shared_report, jobs=[job], compact=compact)
+    return path
+
+def merge_pdfs(parts, output):
+    """
+    Concatenate PDFs in order
+
+    Args:
+        parts: Iterable of PDF file paths or bytes
+        output: File path or binary file-like object
+    """
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(PdfReader(io.BytesIO(part) if isinstance(part, bytes) else part))
+    # Every part embeds its own copy of the logo (and chart images); point
+    # all pages at one copy of each image, then drop the unused copies and
+    # any other identical objects (pypdf >= 4). Each part's fonts are
+    # subsets of the glyphs it drew, so they differ and are all kept
+    share_images(writer)
+    if hasattr(writer, 'compress_identical_objects'):
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    writer.write(output)
+
+def share_images(writer):
+    """
+    Point every use of identical image XObjects at the first copy
+
+    Copies are compared by content (stream data and dictionary, following
+    references such as /SMask), as each part's copy refers to its own soft
+    mask object.
+
+    Returns:
+        Number of image references re-pointed
+    """
+    images = {}
+    shared = 0
+    pending = [page.get('/Resources') for page in writer.pages]
+    while pending:
+        resources = pending.pop()
+        xobjects = resources.get_object().get('/XObject') if resources is not None else None
+        if xobjects is None:
+            continue
+        xobjects = xobjects.get_object()
+        for name, ref in list(xobjects.items()):
+            xobject = ref.get_object()
+            if xobject.get('/Subtype') == '/Form':
+                pending.append(xobject.get('/Resources'))
+            elif xobject.get('/Subtype') == '/Image' and isinstance(ref, IndirectObject):
+                first = images.setdefault(_content_key(xobject), ref)
+                if first != ref:
+                    xobjects[NameObject(name)] = first
+                    shared += 1
+    return shared
+
+def _content_key(obj):
+    """Hashable key of a PDF object's content, following references"""
+    obj = obj.get_object()
+    if isinstance(obj, StreamObject):
+        header = DictionaryObject({key: value for key, value in obj.items() if key != '/Length'})
+        return ('stream', _content_key(header), hashlib.sha1(obj.get_data()).digest())
+    if isinstance(obj, DictionaryObject):
+        return ('dict', tuple(sorted((key, _content_key(value)) for key, value in obj.items())))
+    if isinstance(obj, ArrayObject):
+        return ('array', tuple(_content_key(value) for value in obj))
+    return (type(obj).__name__, repr(obj))
+
+def render_parallel(output, backend, carrier_name, metrics_df, delay_data, trend_data=None, workers=None,
+                    summarize=(), compact=False, sections=REPORT_SPECS['full']):
+    """
+    Render the report with its page jobs spread over a process pool
+
+    Args:
+        output: File path or binary file-like object to write the PDF to
+        backend: 'matplotlib' or 'reportlab'
+        carrier_name, metrics_df, delay_data, trend_data: As for
+            report_generator.generate_pdf_report
+        workers: Number of worker processes (None: one per CPU core)
+        summarize: Kinds to summarize instead of listing (see
+            pdf_pages.over_budget_kinds)
+        compact: Write a smaller PDF (see pdf_pages.write_report)
+        sections: Report sections to render (pdf_pages.report_sections
+            output)
+    """
+    global _shared_report
+
+    workers = resolve_workers(workers)
+    if workers == 1:
+        write_report(output, backend, carrier_name, metrics_df, delay_data, trend_data,
+                     jobs=report_jobs(delay_data, trend_data, summarize=summarize, sections=sections),
+                     compact=compact)
+        return
+
+    # Lay out the detail tables once, before the workers fork
+    kinds = detail_kinds(sections)
+    if kinds:
+        delay_data = with_detail_layouts(delay_data, summarize, kinds)
+    jobs = parallel_jobs(delay_data, trend_data, workers, summarize, sections)
+    with tempfile.TemporaryDirectory(prefix='pdf_parts_') as parts_dir:
+        tasks = [(job, backend, compact, os.path.join(parts_dir, f'part_{i:04d}.pdf'))
+                 for i, job in enumerate(jobs)]
+        _shared_report = (carrier_name, metrics_df, delay_data, trend_data)
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                                     mp_context=multiprocessing.get_context('fork')) as pool:
+                # map returns the parts in job order
+                parts = list(pool.map(_render_job, tasks))
+        finally:
+            _shared_report = None
+
+        merge_pdfs(parts, output)
@@ -0,0 +1,358 @@
+"""
+ReportLab backend for the Carrier Performance PDF report
+
+matplotlib lays out every table cell as an artist (a patch and a text object
+with its own properties), which dominates render time for carriers with
+hundreds of detail pages. This backend draws the same pages with the same
+layout (pdf_pages.py) as PDF drawing operations on a reportlab canvas:
+tables become filled rectangles and strings, and the logo is embedded once
+and referenced from every page. matplotlib is only used for the charts (the
+delay code pies and the optional trends page), which are embedded as images.
+
+reportlab is optional (pip install reportlab); check REPORTLAB_AVAILABLE.
+"""
+
+import datetime
+import io
+from functools import lru_cache
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+from matplotlib.table import Table
+from PIL import Image
+
+try:
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas as reportlab_canvas
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+from lateness import format_lateness
+from pdf_layout import CELL_PAD, DETAIL_FONT_SIZE, DETAIL_HEADER_FONT_SIZE
+from pdf_pages import (
+    APPROXIMATE_ROUTES_NOTE,
+    DELAY_KINDS,
+    DETAIL_TABLE_TOP,
+    FOOTER_LOGO_RECT,
+    PAGE_SIZE,
+    TITLE_LOGO_RECT,
+    WARP_BORDER,
+    WARP_DARK,
+    WARP_GRAY,
+    WARP_TEXT,
+    WARP_WHITE,
+    approximate_routes,
+    compute_col_widths,
+    delay_code_table,
+    detail_layout,
+    detail_summary,
+    detail_subtitle,
+    detail_title,
+    draw_delay_pie,
+    logo_image,
+    metrics_table,
+    report_jobs,
+    report_weeks,
+    subplot_rect,
+    summary_subtitle,
+    table_layout,
+    trends_page,
+    weeks_subtitle,
+)
+
+# Page size in points
+PAGE_WIDTH = PAGE_SIZE[0] * 72
+PAGE_HEIGHT = PAGE_SIZE[1] * 72
+
+# Resolution of the embedded charts (compact reports: see write_reportlab_report)
+CHART_DPI = 200
+COMPACT_CHART_DPI = 120
+
+@lru_cache(maxsize=None)
+def _color(hex_color):
+    return HexColor(hex_color)
+
+def _font(italic=False):
+    return 'Helvetica-BoldOblique' if italic else 'Helvetica-Bold'
+
+def _in_axes(axes_rect, bbox):
+    """Page rect of a bbox given in the coordinates of an axes at axes_rect"""
+    left, bottom, width, height = axes_rect
+    x, y, w, h = bbox
+    return [left + x * width, bottom + y * height, w * width, h * height]
+
+def _row_height(axes_rect, scale=1):
+    """Default matplotlib table row height (in axes coordinates) in an axes at axes_rect"""
+    # matplotlib sizes rows for Table.FONTSIZE whatever the font size set later
+    return Table.FONTSIZE / 72 * 1.2 / (PAGE_SIZE[1] * axes_rect[3]) * scale
+
+# ============================================================================
+# DRAWING PRIMITIVES
+# ============================================================================
+
+def draw_text(c, x, y, text, fontsize, color, italic=False):
+    """Centered text with its baseline at (x, y), as fractions of the page"""
+    c.setFont(_font(italic), fontsize)
+    c.setFillColor(_color(color))
+    c.drawCentredString(x * PAGE_WIDTH, y * PAGE_HEIGHT, text)
+
+@lru_cache(maxsize=None)
+def _logo_reader():
+    """The downscaled logo (pdf_pages.logo_image) as one reportlab image"""
+    logo = logo_image()
+    return None if logo is None else ImageReader(Image.fromarray(logo))
+
+def draw_logo(c, rect):
+    """Draw the logo fitted into rect (fractions of the page); reportlab embeds it once per document"""
+    logo = _logo_reader()
+    if logo is None:
+        return
+    left, bottom, width, height = rect
+    c.drawImage(logo, left * PAGE_WIDTH, bottom * PAGE_HEIGHT, width * PAGE_WIDTH, height * PAGE_HEIGHT,
+                mask='auto', preserveAspectRatio=True, anchor='c')
+
+def draw_figure(c, fig, rect, dpi=CHART_DPI):
+    """Draw a matplotlib figure as an image into rect (fractions of the page) and close it"""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, transparent=True)
+    plt.close(fig)
+    buffer.seek(0)
+    left, bottom, width, height = rect
+    c.drawImage(ImageReader(buffer), left * PAGE_WIDTH, bottom * PAGE_HEIGHT,
+                width * PAGE_WIDTH, height * PAGE_HEIGHT, mask='auto')
+
+def draw_table(c, table_data, rect, col_widths, row_heights, cell_style, bands=False):
+    """
+    Draw a table filling rect (fractions of the page)
+
+    Args:
+        c: reportlab canvas
+        table_data: Rows of cell strings ('\\n' starts a new line)
+        rect: [left, bottom, width, height] of the table
+        col_widths: Relative column widths
+        row_heights: Relative row heights (top row first)
+        cell_style: Function (row, col) -> (fill, edge color, line width,
+            text color, font size, alignment)
+        bands: Draw each row below the header as one band under a single
+            set of grid lines, rather than a rectangle per cell (the cells
+            of a row must share their fill and edges)
+    """
+    left, bottom, width, height = rect
+    x_scale = width * PAGE_WIDTH / sum(col_widths)
+    y_scale = height * PAGE_HEIGHT / sum(row_heights)
+
+    top = (bottom + height) * PAGE_HEIGHT
+    grid = []
+    for i, row in enumerate(table_data):
+        h = row_heights[i] * y_scale
+        top -= h
+        x = left * PAGE_WIDTH
+        banded = bands and i > 0
+        if banded:
+            fill, edge, linewidth = cell_style(i, 0)[:3]
+            # The page is white already
+            if fill != WARP_WHITE:
+                c.setFillColor(_color(fill))
+                c.rect(x, top, width * PAGE_WIDTH, h, fill=1, stroke=0)
+            grid.append((x, top, x + width * PAGE_WIDTH, top))
+        for j, text in enumerate(row):
+            w = col_widths[j] * x_scale
+            fill, edge, linewidth, color, fontsize, align = cell_style(i, j)
+            if not banded:
+                c.setFillColor(_color(fill))
+                c.setStrokeColor(_color(edge))
+                c.setLineWidth(linewidth)
+                c.rect(x, top, w, h, fill=1, stroke=1)
+
+            if text:
+                lines = text.split('\n')
+                c.setFillColor(_color(color))
+                c.setFont(_font(), fontsize)
+                # Lines are centered vertically in the cell
+                baseline = top + h / 2 + (len(lines) - 1) * fontsize * 1.2 / 2 - fontsize * 0.35
+                for line in lines:
+                    if align == 'center':
+                        c.drawCentredString(x + w / 2, baseline, line)
+                    elif align == 'right':
+                        c.drawRightString(x + w * (1 - CELL_PAD), baseline, line)
+                    else:
+                        c.drawString(x + w * CELL_PAD, baseline, line)
+                    baseline -= fontsize * 1.2
+            x += w
+
+    if grid:
+        # Column lines run from the bottom of the header to the bottom of the table
+        header_bottom = (bottom + height) * PAGE_HEIGHT - row_heights[0] * y_scale
+        x = left * PAGE_WIDTH
+        for w in [0] + list(col_widths):
+            x += w * x_scale
+            grid.append((x, header_bottom, x, top))
+        c.setStrokeColor(_color(edge))
+        c.setLineWidth(linewidth)
+        c.lines(grid)
+
+# ============================================================================
+# PAGES
+# ============================================================================
+
+def title_page(c, carrier_name, weeks):
+    draw_logo(c, TITLE_LOGO_RECT)
+    draw_text(c, 0.5, 0.6, 'Carrier Performance Report', 24, WARP_DARK)
+    draw_text(c, 0.5, 0.5, f'{carrier_name}', 20, WARP_TEXT)
+    draw_text(c, 0.5, 0.4, weeks_subtitle(weeks), 16, WARP_TEXT)
+    draw_text(c, 0.5, 0.3, f'Generated: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M")}', 12, WARP_TEXT,
+              italic=True)
+
+def metrics_page(c, carrier_name, weeks, metrics_df):
+    draw_text(c, 0.5, 0.92, 'Performance Metrics', 18, WARP_DARK)
+
+    table_data, colors = metrics_table(metrics_df, weeks)
+    col_widths = compute_col_widths(pd.DataFrame(table_data[1:], columns=table_data[0]), min_w=0.15, max_w=0.50)
+
+    def cell_style(i, j):
+        if i == 0:
+            return WARP_DARK, WARP_BORDER, 2, WARP_WHITE, 13, 'center'
+        if j == 0:
+            return WARP_DARK, WARP_BORDER, 1.5, WARP_WHITE, 10 if i >= 3 else 12, 'center'
+        return colors[i - 1][j - 1], WARP_BORDER, 1, WARP_TEXT, 12, 'center'
+
+    axes = subplot_rect(1, 0)
+    draw_table(c, table_data, _in_axes(axes, [0.2, 0.3, 0.6, 0.5]), col_widths,
+               [1] * len(table_data), cell_style)
+
+    draw_text(c, 0.5, 0.82, carrier_name, 14, WARP_TEXT, italic=True)
+    c.setFont('Helvetica', 9)
+    c.setFillColor(_color(WARP_TEXT))
+    c.drawCentredString(0.5 * PAGE_WIDTH, 0.15 * PAGE_HEIGHT, '*OTP: Driver arrived after scheduled pickup window')
+    c.drawCentredString(0.5 * PAGE_WIDTH, 0.12 * PAGE_HEIGHT, '*OTD: Driver arrived after scheduled dropoff window')
+    if approximate_routes(metrics_df):
+        c.drawCentredString(0.5 * PAGE_WIDTH, 0.18 * PAGE_HEIGHT, APPROXIMATE_ROUTES_NOTE)
+    draw_logo(c, FOOTER_LOGO_RECT)
+
+def trend_chart_page(c, carrier_name, trend_data, dpi=CHART_DPI):
+    draw_figure(c, trends_page(carrier_name, trend_data, logo=False), [0, 0, 1, 1], dpi)
+    draw_logo(c, FOOTER_LOGO_RECT)
+
+def delay_codes_page(c, delay_data, kind, dpi=CHART_DPI):
+    spec = DELAY_KINDS[kind]
+    draw_text(c, 0.5, 0.95, f"{spec['title']} Delay Codes", 18, WARP_DARK)
+    if f'{kind}_lateness' in delay_data:
+        draw_text(c, 0.5, 0.91, f"Minutes late: {format_lateness(delay_data[f'{kind}_lateness'])}", 10, WARP_TEXT,
+                  italic=True)
+
+    if len(delay_data[f'{kind}_delay_counts']) > 0:
+        # Table on left
+        table_data = delay_code_table(delay_data, kind)
+        col_widths = compute_col_widths(pd.DataFrame(table_data[1:], columns=table_data[0]), min_w=0.12, max_w=0.65)
+        bbox_height = min(0.6, 0.08 * len(table_data))
+        axes = subplot_rect(2, 0)
+        row_height = _row_height(axes)
+
+        def cell_style(i, j):
+            if i == 0:
+                return WARP_DARK, WARP_BORDER, 2, WARP_WHITE, 10, 'center'
+            return (WARP_GRAY if i % 2 == 0 else WARP_WHITE, WARP_BORDER, 1, WARP_TEXT, 10,
+                    'center' if j > 0 else 'left')
+
+        draw_table(c, table_data, _in_axes(axes, [0, 0.5 - bbox_height / 2, 1, bbox_height]), col_widths,
+                   [0.08] + [row_height] * (len(table_data) - 1), cell_style)
+
+        # Pie chart on right, drawn by matplotlib on the right half of the page
+        fig = plt.figure(figsize=(PAGE_SIZE[0] / 2, PAGE_SIZE[1]))
+        left, bottom, width, height = subplot_rect(2, 1)
+        draw_delay_pie(fig.add_axes([(left - 0.5) * 2, bottom, width * 2, height]), delay_data, kind)
+        draw_figure(c, fig, [0.5, 0, 0.5, 1], dpi)
+    else:
+        draw_text(c, 0.5, 0.5, f"No {kind} delay codes found", 14, WARP_TEXT, italic=True)
+
+    draw_logo(c, FOOTER_LOGO_RECT)
+
+def table_pages(c, layout, title, subtitle, first_page=0, end_page=None, compact=False):
+    """Pages of a paginated table (as pdf_pages.table_pages)"""
+    ranges = layout['pages']
+    axes = subplot_rect(1, 0)
+    axes_height = PAGE_HEIGHT * axes[3]
+
+    def cell_style(i, j):
+        if i == 0:
+            return WARP_DARK, WARP_BORDER, 1.5, WARP_WHITE, DETAIL_HEADER_FONT_SIZE, 'center'
+        return WARP_GRAY if i % 2 == 0 else WARP_WHITE, WARP_BORDER, 0.5, WARP_TEXT, DETAIL_FONT_SIZE, 'left'
+
+    for page_num in range(len(ranges))[first_page:end_page]:
+        start_idx, end_idx = ranges[page_num]
+        draw_text(c, 0.5, 0.95, title(page_num, len(ranges)), 18, WARP_DARK)
+        draw_text(c, 0.5, 0.92, subtitle(start_idx, end_idx), 10, WARP_TEXT, italic=True)
+
+        row_heights = [layout['header_height']] + layout['row_heights'][start_idx:end_idx].tolist()
+        table_height = sum(row_heights) / axes_height
+        draw_table(c, [layout['header']] + layout['rows'][start_idx:end_idx],
+                   _in_axes(axes, [0, DETAIL_TABLE_TOP - table_height, 1, table_height]), layout['col_widths'],
+                   row_heights, cell_style, bands=compact)
+
+        draw_logo(c, FOOTER_LOGO_RECT)
+        c.showPage()
+
+def detail_pages(c, delay_data, kind, first_page=0, end_page=None, compact=False):
+    if len(delay_data[f'{kind}_delay_data']) == 0:
+        return
+    layout = detail_layout(delay_data, kind)
+    table_pages(c, layout, lambda page_num, total_pages: detail_title(kind, page_num, total_pages),
+                lambda start, end: detail_subtitle(start, end, len(layout['rows'])), first_page, end_page,
+                compact)
+
+def detail_summary_pages(c, delay_data, kind, compact=False):
+    if len(delay_data[f'{kind}_delay_data']) == 0:
+        return
+    table_pages(c, table_layout(detail_summary(delay_data, kind)),
+                lambda page_num, total_pages: detail_title(kind, page_num, total_pages, 'Summary'),
+                lambda start, end: summary_subtitle(delay_data, kind), compact=compact)
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def draw_job(c, job, carrier_name, metrics_df, delay_data, trend_data=None, compact=False):
+    """Draw the pages of one page job (see pdf_pages.report_jobs)"""
+    name = job[0]
+    dpi = COMPACT_CHART_DPI if compact else CHART_DPI
+    if name == 'details':
+        detail_pages(c, delay_data, *job[1:], compact=compact)
+        return
+    if name == 'detail_summary':
+        detail_summary_pages(c, delay_data, job[1], compact)
+        return
+    if name == 'title':
+        title_page(c, carrier_name, report_weeks(metrics_df))
+    elif name == 'metrics':
+        metrics_page(c, carrier_name, report_weeks(metrics_df), metrics_df)
+    elif name == 'trends':
+        trend_chart_page(c, carrier_name, trend_data, dpi)
+    elif name == 'delay_codes':
+        delay_codes_page(c, delay_data, job[1], dpi)
+    else:
+        raise ValueError(f"Unknown page job '{name}'")
+    c.showPage()
+
+def write_reportlab_report(output, carrier_name, metrics_df, delay_data, trend_data=None, jobs=None, compact=False):
+    """
+    Render every page (or the given page jobs) with reportlab
+
+    Args:
+        output: File path or binary file-like object to write the PDF to
+        carrier_name, metrics_df, delay_data, trend_data: As for
+            report_generator.generate_pdf_report
+        jobs: Optional page jobs to render (default: the whole report)
+        compact: Draw the detail tables as row bands and the charts at
+            COMPACT_CHART_DPI
+    """
+    if not REPORTLAB_AVAILABLE:
+        raise ImportError("reportlab is not installed (pip install reportlab)")
+
+    c = reportlab_canvas.Canvas(output, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+    for job in jobs or report_jobs(delay_data, trend_data):
+        draw_job(c, job, carrier_name, metrics_df, delay_data, trend_data, compact)
+    c.save()
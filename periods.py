@@ -0,0 +1,204 @@
+"""
+Year-aware ISO week periods for Carrier Performance Reports
+
+A period is an (iso_year, iso_week) tuple. Week numbers repeat every year,
+so reports select periods (or date ranges) instead of bare week numbers.
+Processed frames are indexed by pickWindowFrom, sorted, so a period or date
+range is extracted with a binary search instead of a full-column scan.
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# PERIOD HELPERS
+# ============================================================================
+
+def to_period(value, today=None):
+    """
+    Normalize a week selection to an (iso_year, iso_week) tuple
+
+    Args:
+        value: (year, week) tuple, 'YYYY-Www' string, or a bare week number.
+            A bare week number resolves to its most recent occurrence that is
+            not in the future (week 52 in January means last year's week 52;
+            week 53 means the last year that had one).
+        today: Reference date for bare week numbers (default: today)
+
+    Returns:
+        (iso_year, iso_week) tuple
+
+    Raises:
+        ValueError: If the year has no such ISO week
+    """
+    if isinstance(value, str):
+        year, week = value.upper().split('-W')
+        period = (int(year), int(week))
+    elif isinstance(value, (tuple, list)):
+        period = (int(value[0]), int(value[1]))
+    else:
+        today = today or datetime.date.today()
+        current_year, current_week, _ = today.isocalendar()
+        week = int(value)
+        year = current_year if week <= current_week else current_year - 1
+        # Only some years have a week 53
+        while week == 53 and iso_weeks(year) < 53:
+            year -= 1
+        period = (year, week)
+
+    year, week = period
+    if not 1 <= week <= iso_weeks(year):
+        raise ValueError(f"{year} has no ISO week {week} (it has {iso_weeks(year)} weeks)")
+    return period
+
+def iso_weeks(year):
+    """Number of ISO weeks in a year (52 or 53)"""
+    # December 28 is always in the last ISO week of its year
+    return datetime.date(year, 12, 28).isocalendar()[1]
+
+def normalize_periods(weeks, today=None):
+    """Normalize a list of week selections to sorted, unique periods"""
+    return sorted({to_period(w, today=today) for w in weeks})
+
+def period_label(period):
+    """Display label for a period, e.g. '2026-W05'"""
+    year, week = period
+    return f'{year}-W{week:02d}'
+
+def period_bounds(period):
+    """Start (Monday, inclusive) and end (next Monday, exclusive) of a period"""
+    year, week = period
+    start = pd.Timestamp(datetime.date.fromisocalendar(year, week, 1))
+    return start, start + pd.Timedelta(days=7)
+
+def recent_periods(n, today=None):
+    """The last n periods up to and including the current week, oldest first"""
+    today = today or datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+    periods = []
+    for i in range(n - 1, -1, -1):
+        year, week, _ = (monday - datetime.timedelta(weeks=i)).isocalendar()
+        periods.append((year, week))
+    return periods
+
+def periods_in_range(start_date, end_date):
+    """Periods overlapping the date range [start_date, end_date]"""
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+    periods = []
+    day = start - pd.Timedelta(days=start.weekday())
+    while day <= end:
+        year, week, _ = day.isocalendar()
+        periods.append((year, week))
+        day += pd.Timedelta(days=7)
+    return periods
+
+# ============================================================================
+# PERIOD INDEX
+# ============================================================================
+
+def period_columns(timestamps):
+    """iso_year and week_number columns for a Series of timestamps"""
+    iso = timestamps.dt.isocalendar()
+    return {'iso_year': iso['year'], 'week_number': iso['week']}
+
+def index_by_period(df, order=None):
+    """
+    Key a processed frame by pickWindowFrom, sorted, with iso_year and
+    week_number columns (added unless already present)
+
+    Rows without a pickWindowFrom have no week and are dropped. The sort is
+    stable, so rows within the same pickup window keep their order.
+
+    Args:
+        df: Processed frame
+        order: Optional row positions giving the order of rows within the
+            same pickup window (default: current order)
+    """
+    timestamps = df['pickWindowFrom_dt'].to_numpy()
+    positions = np.arange(len(df)) if order is None else np.asarray(order)
+    positions = positions[~np.isnat(timestamps[positions])]
+    positions = positions[np.argsort(timestamps[positions], kind='stable')]
+
+    if 'iso_year' not in df.columns:
+        df = df.assign(**period_columns(df['pickWindowFrom_dt']))
+    df = df.take(positions)
+    df.index = pd.DatetimeIndex(df['pickWindowFrom_dt'], name='pickWindow')
+    return df
+
+def slice_dates(df, start, end):
+    """
+    Rows with pickWindowFrom in [start, end), by binary search on the index
+
+    Args:
+        df: Frame returned by index_by_period
+        start: Range start (inclusive)
+        end: Range end (exclusive)
+    """
+    lo = df.index.searchsorted(pd.Timestamp(start), side='left')
+    hi = df.index.searchsorted(pd.Timestamp(end), side='left')
+    return df.iloc[lo:hi]
+
+def select_periods(df, periods):
+    """
+    Rows falling in any of the given periods, in index order
+
+    Args:
+        df: Frame returned by index_by_period
+        periods: Periods or week selections accepted by to_period
+    """
+    slices = [slice_dates(df, *period_bounds(p)) for p in normalize_periods(periods)]
+    if not slices:
+        return df.iloc[0:0]
+    return pd.concat(slices) if len(slices) > 1 else slices[0]
+
+def resolve_periods(weeks=None, start_date=None, end_date=None):
+    """
+    Periods covered by a week selection or a date range
+
+    Returns:
+        Sorted list of (iso_year, iso_week) tuples
+    """
+    if weeks is not None:
+        return normalize_periods(weeks)
+    if start_date is None or end_date is None:
+        raise ValueError("Provide either weeks or both start_date and end_date")
+    return periods_in_range(start_date, end_date)
+
+def period_slices(df, weeks=None, start_date=None, end_date=None):
+    """
+    Split an indexed frame into one slice per selected period
+
+    With a date range, the first and last periods are clipped to the range
+    (end_date is inclusive, like the app's date picker).
+
+    Returns:
+        List of (period, DataFrame) pairs, oldest first
+    """
+    slices = []
+    for period in resolve_periods(weeks, start_date, end_date):
+        start, end = period_bounds(period)
+        if weeks is None:
+            start = max(start, pd.Timestamp(start_date))
+            end = min(end, pd.Timestamp(end_date) + pd.Timedelta(days=1))
+        slices.append((period, slice_dates(df, start, end)))
+    return slices
+
+def period_range(first, last):
+    """Consecutive periods from first to last (inclusive)"""
+    start, _ = period_bounds(first)
+    end, _ = period_bounds(last)
+    periods = []
+    day = start
+    while day <= end:
+        year, week, _ = day.isocalendar()
+        periods.append((year, week))
+        day += pd.Timedelta(days=7)
+    return periods
+
+def period_of(timestamps):
+    """(iso_year, iso_week) period for each timestamp in a Series"""
+    iso = timestamps.dt.isocalendar()
+    return pd.Series(list(zip(iso['year'], iso['week'])), index=timestamps.index)
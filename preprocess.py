@@ -0,0 +1,225 @@
+"""
+Partition-parallel preprocessing of raw otp_reports rows
+
+Preprocessing parses the timestamp fields, classifies pickups/deliveries as
+On Time/Late, imputes missing delay codes and deduplicates stops. Every
+dedup key starts with loadId + carrierName, so rows hash-partitioned on
+those two fields never interact: each partition is processed on its own
+(in a process pool), and the derived columns are stitched back into the
+original row order. Partitions also return partial totals (counts that sum
+across partitions) for the pipeline's summary output.
+
+preprocess() with workers=1 runs in-process and is what the Streamlit app
+uses; the full-table batch (query_otp_clean.py) uses one worker per core.
+This module does not import Streamlit, so the CLI and the workflow can use it.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dedup import (DEFAULT_DEDUP_GAP_MINUTES, DEFAULT_DEDUP_STRATEGY, arrival_order,
+                   deduplication_columns)
+from frames import with_columns
+from lanes import lane_ids
+from lateness import minutes_late
+from periods import period_columns
+
+# Timestamp fields parsed into <name>_dt columns
+DATETIME_COLUMNS = [
+    'pickWindowFrom', 'dropWindowFrom', 'createdAt', 'updatedAt',
+    'pickTimeArrived', 'pickWindowTo', 'dropTimeArrived', 'dropWindowTo',
+]
+
+# Raw columns a partition needs (the rest stay in the parent process)
+PARTITION_COLUMNS = DATETIME_COLUMNS + [
+    'loadId', 'carrierName', 'pickLocationName', 'dropLocationName',
+    'pickupDelayCode', 'deliveryDelayCode',
+]
+
+# Columns the partitions hash on (every dedup key starts with them)
+PARTITION_KEY = ['loadId', 'carrierName']
+
+# ============================================================================
+# CLASSIFICATION
+# ============================================================================
+
+def on_time_status(arrived, window_end):
+    """'On Time' if arrived before the window closed, else 'Late' (None if either is missing)"""
+    status = np.where(arrived < window_end, 'On Time', 'Late').astype(object)
+    status[(arrived.isna() | window_end.isna()).to_numpy()] = None
+    return status
+
+def imputed_delay_codes(codes, outcome):
+    """Delay codes with 'Carrier Failure' filled in for late events without a code"""
+    late = np.asarray(outcome) == 'Late'
+    return codes.mask(late & (codes.isna() | (codes == '')).to_numpy(), 'Carrier Failure')
+
+def derive_columns(df, dedup_strategy=DEFAULT_DEDUP_STRATEGY, gap_minutes=DEFAULT_DEDUP_GAP_MINUTES):
+    """
+    Parse, classify and deduplicate one set of rows
+
+    Args:
+        df: Raw otp_reports rows (not modified)
+        dedup_strategy: Deduplication strategy ('date' or 'gap', see dedup.py)
+        gap_minutes: Maximum gap between arrivals of one stop ('gap' only)
+
+    Returns:
+        (derived, order): dict of derived columns aligned with df by
+        position, and the row positions in arrival order
+    """
+    # Convert date fields
+    derived = {f'{col}_dt': pd.to_datetime(df[col], errors='coerce') for col in DATETIME_COLUMNS}
+
+    # Calculate OTP and OTD
+    derived['OTP'] = on_time_status(derived['pickTimeArrived_dt'], derived['pickWindowTo_dt'])
+    derived['OTD'] = on_time_status(derived['dropTimeArrived_dt'], derived['dropWindowTo_dt'])
+
+    # Minutes between arrival and the end of the window
+    derived['pick_minutes_late'] = minutes_late(derived['pickTimeArrived_dt'], derived['pickWindowTo_dt'])
+    derived['drop_minutes_late'] = minutes_late(derived['dropTimeArrived_dt'], derived['dropWindowTo_dt'])
+
+    # Impute missing delay codes
+    derived['pickupDelayCode'] = imputed_delay_codes(df['pickupDelayCode'], derived['OTP'])
+    derived['deliveryDelayCode'] = imputed_delay_codes(df['deliveryDelayCode'], derived['OTD'])
+
+    # Add deduplication logic (flags are computed in arrival order)
+    stops = pd.DataFrame({'loadId': df['loadId'], 'carrierName': df['carrierName'],
+                          'pickLocationName': df['pickLocationName'],
+                          'dropLocationName': df['dropLocationName'],
+                          'pickTimeArrived_dt': derived['pickTimeArrived_dt'],
+                          'dropTimeArrived_dt': derived['dropTimeArrived_dt']})
+    dedup_columns, order = deduplication_columns(stops, dedup_strategy, gap_minutes)
+    derived.update(dedup_columns)
+    return derived, order
+
+def partial_totals(df, derived):
+    """
+    Counts for one set of rows that add up across partitions
+
+    Args:
+        df: Raw otp_reports rows
+        derived: Columns returned by derive_columns for df
+    """
+    pickup_late = np.asarray(derived['OTP']) == 'Late'
+    delivery_late = np.asarray(derived['OTD']) == 'Late'
+    pickup_code = df['pickupDelayCode']
+    delivery_code = df['deliveryDelayCode']
+    return {
+        'rows': len(df),
+        'otp_calculated': int(pd.notna(derived['OTP']).sum()),
+        'otd_calculated': int(pd.notna(derived['OTD']).sum()),
+        'pickup_duplicates': int((~derived['keep_for_pickup']).sum()),
+        'delivery_duplicates': int((~derived['keep_for_delivery']).sum()),
+        'pickup_imputed': int((pickup_late & (pickup_code.isna() | (pickup_code == '')).to_numpy()).sum()),
+        'delivery_imputed': int((delivery_late & (delivery_code.isna() | (delivery_code == '')).to_numpy()).sum()),
+    }
+
+# ============================================================================
+# PARTITIONING
+# ============================================================================
+
+def partition_positions(df, n_partitions):
+    """
+    Row positions of each partition, hashing loadId + carrierName
+
+    Rows of the same load and carrier always land in the same partition.
+
+    Returns:
+        List of n_partitions position arrays (each in ascending order)
+    """
+    hashes = pd.util.hash_pandas_object(df[PARTITION_KEY], index=False).to_numpy()
+    partition = hashes % np.uint64(n_partitions)
+    positions = np.argsort(partition, kind='stable')
+    bounds = np.cumsum(np.bincount(partition.astype(np.int64), minlength=n_partitions))
+    return np.split(positions, bounds[:-1])
+
+# Raw rows shared with forked workers (set only while a pool is running)
+_shared_rows = None
+
+def _process_partition(task):
+    """Worker: derive columns and partial totals for one partition"""
+    positions, dedup_strategy, gap_minutes = task
+    rows = _shared_rows.take(positions)
+    derived, _ = derive_columns(rows, dedup_strategy, gap_minutes)
+    totals = partial_totals(rows, derived)
+    # Plain arrays pickle faster than Series and are realigned by position
+    derived = {name: value.to_numpy() if isinstance(value, pd.Series) else np.asarray(value)
+               for name, value in derived.items()}
+    return positions, derived, totals
+
+def _merge_partitions(results, n_rows):
+    """Derived columns in original row order, and summed totals"""
+    positions = np.concatenate([result[0] for result in results])
+    inverse = np.empty(n_rows, dtype=np.int64)
+    inverse[positions] = np.arange(n_rows)
+
+    derived = {name: np.concatenate([result[1][name] for result in results])[inverse]
+               for name in results[0][1]}
+    totals = {name: sum(result[2][name] for result in results) for name in results[0][2]}
+    return derived, totals
+
+def preprocess(df, dedup_strategy=DEFAULT_DEDUP_STRATEGY, gap_minutes=DEFAULT_DEDUP_GAP_MINUTES,
+               workers=1):
+    """
+    Derive report columns from raw otp_reports rows
+    (dates, OTP/OTD, minutes late, imputed delay codes, deduplication flags,
+    lane IDs, ISO week)
+
+    With workers > 1 the rows are hash-partitioned on loadId + carrierName
+    and the partitions run in a process pool. The result is the same as
+    with one worker, except that 'gap' cluster labels inside the dedup keys
+    are numbered per partition.
+
+    Args:
+        df: Raw otp_reports rows (not modified)
+        dedup_strategy: Deduplication strategy ('date' or 'gap', see dedup.py)
+        gap_minutes: Maximum gap between arrivals of one stop ('gap' only)
+        workers: Number of worker processes (None: one per CPU core)
+
+    Returns:
+        Dictionary with:
+        - 'frame': df with the derived columns added (rows in original order)
+        - 'order': row positions in arrival order (earliest first)
+        - 'totals': row, OTP/OTD, duplicate and imputed delay code counts
+    """
+    global _shared_rows
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(df)))
+    # Workers are forked so they share the raw rows (and so scripts without
+    # a __main__ guard, like query_otp_clean.py, are not re-imported)
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        workers = 1
+
+    if workers == 1:
+        derived, order = derive_columns(df, dedup_strategy, gap_minutes)
+        totals = partial_totals(df, derived)
+    else:
+        _shared_rows = df[PARTITION_COLUMNS]
+        tasks = [(positions, dedup_strategy, gap_minutes)
+                 for positions in partition_positions(df, workers)]
+        try:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('fork')) as pool:
+                results = list(pool.map(_process_partition, tasks))
+        finally:
+            _shared_rows = None
+
+        derived, totals = _merge_partitions(results, len(df))
+        order = arrival_order(pd.DataFrame({
+            'pickTimeArrived_dt': derived['pickTimeArrived_dt'],
+            'dropTimeArrived_dt': derived['dropTimeArrived_dt'],
+        }))
+
+    # Intern origin/destination pairs as integer lane IDs (numbered across
+    # all rows, so this runs after the merge)
+    derived['lane_id'] = lane_ids(df)
+
+    # ISO year/week of pickWindowFrom
+    pick_window = pd.Series(derived['pickWindowFrom_dt'], index=df.index)
+    derived.update(period_columns(pick_window))
+    return {'frame': with_columns(df, derived), 'order': order, 'totals': totals}
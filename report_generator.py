@@ -5,48 +5,19 @@ Refactored from query_otp_clean.py
 
 import pandas as pd
 import mysql.connector
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
-import datetime
-from matplotlib.backends.backend_pdf import PdfPages
 import io
+import os
+import tempfile
 import streamlit as st
-
-# ============================================================================
-# DYNAMIC COLUMN WIDTH CALCULATION
-# ============================================================================
-
-def compute_col_widths(df, min_w=0.06, max_w=0.30):
-    """
-    Automatically compute optimal column widths based on actual text length.
-
-    Args:
-        df: DataFrame with the data to display
-        min_w: Minimum width for any column (default 6%)
-        max_w: Maximum width for any column (default 30%)
-
-    Returns:
-        List of column widths that sum to 1.0
-    """
-    max_lens = []
-    for col in df.columns:
-        # Get max character count in column (including header)
-        # Handle newlines in column names by taking the longest line
-        col_name_len = max(len(line) for line in str(col).split('\n'))
-        lens = df[col].astype(str).map(len)
-        max_lens.append(max(lens.max(), col_name_len))
-
-    # Calculate proportional widths
-    total = sum(max_lens)
-    widths = [l/total for l in max_lens]
-
-    # Apply min/max constraints
-    widths = [min(max(w, min_w), max_w) for w in widths]
-
-    # Renormalize to sum to 1.0
-    s = sum(widths)
-    return [w/s for w in widths]
+from dedup import DEFAULT_DEDUP_GAP_MINUTES, DEFAULT_DEDUP_STRATEGY
+from events import as_event_tables, event_lanes, format_window, has_delay_code
+from lateness import TDigest
+from pdf_pages import (DEFAULT_MAX_DETAIL_PAGES, DEFAULT_MAX_RENDER_SECONDS, DEFAULT_PDF_BACKEND,
+                       DEFAULT_PDF_TARGET_BYTES, DEFAULT_PDF_WORKERS, DEFAULT_REPORT_SPEC, PDF_BACKENDS,
+                       PDF_CHUNK_SIZE, ByteCounter, detail_appendix, detail_kinds, over_budget_kinds, pdf_chunks,
+                       pdf_size, report_sections, section_needs)
+from periods import index_by_period, period_label, period_slices, select_periods, slice_dates
+from preprocess import preprocess
 
 # ============================================================================
 # DATABASE CONNECTION
@@ -78,16 +49,36 @@ def get_db_connection():
 # ============================================================================
 
 @st.cache_data(ttl=1800)  # Cache for 30 minutes
-def load_and_process_data(carrier_name, weeks):
+def load_and_process_data(carrier_name, weeks=None, start_date=None, end_date=None,
+                          dedup_strategy=DEFAULT_DEDUP_STRATEGY, gap_minutes=DEFAULT_DEDUP_GAP_MINUTES):
     """
     Load data from database and process it
 
     Args:
         carrier_name: Name of the carrier to filter
-        weeks: List of week numbers to analyze
+        weeks: List of (iso_year, iso_week) periods to analyze (bare week
+            numbers resolve to their most recent occurrence)
+        start_date: Start of a date range, instead of weeks
+        end_date: End of a date range (inclusive), instead of weeks
+        dedup_strategy: Deduplication strategy ('date' or 'gap', see dedup.py)
+        gap_minutes: Maximum gap between arrivals of one stop ('gap' only)
 
     Returns:
-        Processed DataFrame
+        Processed DataFrame, indexed by pickWindowFrom
+    """
+    df = load_carrier_rows(carrier_name)
+    return process_carrier_rows(df, weeks, start_date, end_date, dedup_strategy, gap_minutes)
+
+@st.cache_data(ttl=1800)  # Cache for 30 minutes
+def load_carrier_rows(carrier_name):
+    """
+    Load a carrier's raw otp_reports rows (from 2025 onwards)
+
+    Args:
+        carrier_name: Name of the carrier to filter (case-insensitive)
+
+    Returns:
+        Raw DataFrame, as returned by the query
     """
     conn = get_db_connection()
 
@@ -111,154 +102,239 @@ def load_and_process_data(carrier_name, weeks):
 
     # Debug: Show how many rows were loaded
     print(f"DEBUG: Loaded {len(df)} rows for carrier '{carrier_name}'")
+    return df
 
-    # Convert date fields
-    df['pickWindowFrom_dt'] = pd.to_datetime(df['pickWindowFrom'], errors='coerce')
-    df['dropWindowFrom_dt'] = pd.to_datetime(df['dropWindowFrom'], errors='coerce')
-    df['createdAt_dt'] = pd.to_datetime(df['createdAt'], errors='coerce')
-    df['updatedAt_dt'] = pd.to_datetime(df['updatedAt'], errors='coerce')
-    df['pickTimeArrived_dt'] = pd.to_datetime(df['pickTimeArrived'], errors='coerce')
-    df['pickWindowTo_dt'] = pd.to_datetime(df['pickWindowTo'], errors='coerce')
-    df['dropTimeArrived_dt'] = pd.to_datetime(df['dropTimeArrived'], errors='coerce')
-    df['dropWindowTo_dt'] = pd.to_datetime(df['dropWindowTo'], errors='coerce')
-
-    # Calculate OTP and OTD
-    df['OTP'] = df.apply(calculate_otp, axis=1)
-    df['OTD'] = df.apply(calculate_otd, axis=1)
+def process_carrier_rows(df, weeks=None, start_date=None, end_date=None,
+                         dedup_strategy=DEFAULT_DEDUP_STRATEGY, gap_minutes=DEFAULT_DEDUP_GAP_MINUTES):
+    """
+    Process raw rows and keep the selected weeks or date range
 
-    # Add deduplication logic
-    df = add_deduplication_flags(df)
+    Does not touch Streamlit, so it can run in a background thread.
 
-    # Impute missing delay codes
-    df = impute_delay_codes(df)
+    Args:
+        df: Raw otp_reports rows (not modified)
+        weeks, start_date, end_date, dedup_strategy, gap_minutes: As for
+            load_and_process_data
 
-    # Add week number
-    df['week_number'] = df['pickWindowFrom_dt'].dt.isocalendar().week
+    Returns:
+        Processed DataFrame, indexed by pickWindowFrom
+    """
+    df = process_data(df, dedup_strategy, gap_minutes)
 
     # Debug: Show week distribution
     if len(df) > 0:
-        print(f"DEBUG: Week distribution: {df['week_number'].value_counts().to_dict()}")
-        print(f"DEBUG: Filtering for weeks: {weeks}")
+        print(f"DEBUG: Week distribution: {df.groupby(['iso_year', 'week_number']).size().to_dict()}")
+        print(f"DEBUG: Filtering for weeks: {weeks}" if weeks is not None
+              else f"DEBUG: Filtering for dates: {start_date} to {end_date}")
 
-    # Filter for selected weeks (carrier already filtered in SQL)
-    df_filtered = df[df['week_number'].isin(weeks)].copy()
+    # Filter for selected weeks or date range (carrier already filtered in SQL)
+    # The frame is sorted by pickWindowFrom, so this is a binary search
+    if weeks is not None:
+        df_filtered = select_periods(df, weeks)
+    else:
+        df_filtered = slice_dates(df, start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1))
 
     # Debug: Show filtered results
     print(f"DEBUG: After week filtering: {len(df_filtered)} rows")
 
     # Add lowercase column for consistency
-    df_filtered['carrierName_lower'] = df_filtered['carrierName'].str.lower()
+    return df_filtered.assign(carrierName_lower=df_filtered['carrierName'].str.lower())
+
+def process_data(df, dedup_strategy=DEFAULT_DEDUP_STRATEGY, gap_minutes=DEFAULT_DEDUP_GAP_MINUTES, workers=1):
+    """
+    Derive report columns from raw otp_reports rows
+    (dates, OTP/OTD, minutes late, deduplication flags, imputed delay codes,
+    lane IDs, ISO week)
+
+    All derived columns are computed first and added in one batch, then the
+    rows are sorted once (earliest arrivals first within each pickup window).
+
+    Args:
+        df: Raw otp_reports rows (not modified)
+        dedup_strategy: Deduplication strategy ('date' or 'gap', see dedup.py)
+        gap_minutes: Maximum gap between arrivals of one stop ('gap' only)
+        workers: Worker processes for preprocessing (see preprocess.py)
+
+    Returns:
+        Processed DataFrame, indexed by pickWindowFrom
+    """
+    result = preprocess(df, dedup_strategy, gap_minutes, workers=workers)
+
+    # Key the frame by pickWindowFrom for period slicing
+    return index_by_period(result['frame'], order=result['order'])
+
+@st.cache_data(ttl=1800)  # Cache for 30 minutes
+def load_carrier_trends(carrier_name):
+    """
+    Load rolling 4/8/13-week trends for a carrier from the fleet-wide trend
+    engine of the daily rollup store (closed weeks only)
 
-    return df_filtered
+    Returns:
+        trends.TrendEngine.to_frame output, or None if no rollups are stored
+    """
+    from periods import period_range
+    from rollups import RollupStore
+    from trends import TREND_METRICS
 
-def calculate_otp(row):
-    """Calculate On Time Pickup"""
-    if pd.isna(row['pickTimeArrived_dt']) or pd.isna(row['pickWindowTo_dt']):
+    store = RollupStore()
+    rollups = store.load(carrier_name)
+    if rollups is None:
+        return None
+    engine = store.trends()
+    if rollups['carrier'] not in engine.carriers:
         return None
-    return 'On Time' if row['pickTimeArrived_dt'] < row['pickWindowTo_dt'] else 'Late'
 
-def calculate_otd(row):
-    """Calculate On Time Delivery"""
-    if pd.isna(row['dropTimeArrived_dt']) or pd.isna(row['dropWindowTo_dt']):
+    # The fleet's weeks may start before the carrier's first week
+    trend_df = engine.to_frame(carriers=[rollups['carrier']])
+    active = trend_df.dropna(subset=list(TREND_METRICS), how='all')['period']
+    if len(active) == 0:
         return None
-    return 'On Time' if row['dropTimeArrived_dt'] < row['dropWindowTo_dt'] else 'Late'
-
-def add_deduplication_flags(df):
-    """Add deduplication flags to dataframe"""
-    df['pickDate'] = df['pickTimeArrived_dt'].dt.date
-    df['dropDate'] = df['dropTimeArrived_dt'].dt.date
-    
-    df = df.sort_values(['pickTimeArrived_dt', 'dropTimeArrived_dt'], na_position='last')
-    
-    df['pickup_dedup_key'] = (
-        df['loadId'].astype(str) + '|' +
-        df['carrierName'].astype(str) + '|' +
-        df['pickLocationName'].astype(str) + '|' +
-        df['pickDate'].astype(str)
-    )
-    
-    df['delivery_dedup_key'] = (
-        df['loadId'].astype(str) + '|' +
-        df['carrierName'].astype(str) + '|' +
-        df['dropLocationName'].astype(str) + '|' +
-        df['dropDate'].astype(str)
-    )
-    
-    df['keep_for_pickup'] = ~df.duplicated(subset=['pickup_dedup_key'], keep='first')
-    df['keep_for_delivery'] = ~df.duplicated(subset=['delivery_dedup_key'], keep='first')
-    
-    return df
+    # Case variants of the carrier name are one carrier
+    return (trend_df[trend_df['period'].isin(period_range(min(active), engine.periods[-1]))]
+            .assign(carrierName=carrier_name).reset_index(drop=True))
 
-def impute_delay_codes(df):
-    """Impute missing delay codes with 'Carrier Failure'"""
-    df.loc[(df['OTP'] == 'Late') &
-           ((df['pickupDelayCode'].isna()) | (df['pickupDelayCode'] == '')),
-           'pickupDelayCode'] = 'Carrier Failure'
-    
-    df.loc[(df['OTD'] == 'Late') &
-           ((df['deliveryDelayCode'].isna()) | (df['deliveryDelayCode'] == '')),
-           'deliveryDelayCode'] = 'Carrier Failure'
-    
-    return df
+def load_rollup_metrics(carrier_name, rows, weeks=None, start_date=None, end_date=None,
+                        dedup_strategy=DEFAULT_DEDUP_STRATEGY):
+    """
+    Performance metrics for a carrier summed from the daily rollup store
+
+    Rollups are deduplicated with the default strategy, so metrics for any
+    other strategy are left to calculate_performance_metrics. So are
+    metrics when the rollups are behind the rows the rest of the report is
+    built from (a row added or updated since they were last updated).
+
+    Args:
+        rows: Processed rows the report is built from (process_data output)
+
+    Returns:
+        calculate_performance_metrics output, or None if no current rollups
+        are stored (or dedup_strategy is not the default)
+    """
+    store = _rollup_store(carrier_name, dedup_strategy, rows)
+    return None if store is None else store.performance_metrics(carrier_name, weeks, start_date, end_date)
+
+def load_rollup_lateness(carrier_name, rows, weeks=None, start_date=None, end_date=None,
+                         dedup_strategy=DEFAULT_DEDUP_STRATEGY):
+    """
+    Minutes-late sketches for a carrier merged from the daily rollup store
+
+    Args:
+        rows: Processed rows the report is built from (the sketches are not
+            used when the rollups are behind them)
+
+    Returns:
+        Dict with 'pickup' and 'delivery' lateness.TDigest, or None as for
+        load_rollup_metrics
+    """
+    store = _rollup_store(carrier_name, dedup_strategy, rows)
+    return None if store is None else store.lateness_digests(carrier_name, weeks, start_date, end_date)
+
+def _rollup_store(carrier_name, dedup_strategy, rows):
+    """
+    The RollupStore if it holds rollups matching the carrier and strategy
+    and current with rows, else None
+    """
+    from rollups import RollupStore, rollups_current
+
+    store = RollupStore()
+    rollups = store.load(carrier_name) if dedup_strategy == DEFAULT_DEDUP_STRATEGY else None
+    if rollups is None:
+        return None
+    if not rollups_current(rollups, rows):
+        print(f"⚠️  Warning: Rollups for '{carrier_name}' are behind the loaded rows, "
+              f"computing from the rows instead (run 'python rollups.py update')")
+        return None
+    return store
+
+def load_facility_rollups():
+    """
+    Load fleet-wide facility aggregates from the rollup store
+
+    Returns:
+        facilities.merge_facility_rollups output, or None if no rollups are stored
+    """
+    from rollups import RollupStore
+
+    return RollupStore().facilities()
 
 # ============================================================================
 # METRICS CALCULATION
 # ============================================================================
 
-def calculate_performance_metrics(df, carrier_name, weeks):
+def calculate_performance_metrics(data, carrier_name, weeks=None, start_date=None, end_date=None):
     """
     Calculate performance metrics for the carrier
 
+    Args:
+        data: Event tables from events.build_event_tables (a processed
+            DataFrame, indexed by pickWindowFrom, is also accepted)
+        carrier_name: Name of the carrier
+        weeks: List of (iso_year, iso_week) periods
+        start_date: Start of a date range, instead of weeks
+        end_date: End of a date range (inclusive), instead of weeks
+
     Returns:
-        DataFrame with performance metrics
+        DataFrame with performance metrics, one column per metric and period
     """
+    events = as_event_tables(data)
     row_data = {'Carrier': carrier_name}
+    labels = []
 
-    for week in weeks:
-        week_data = df[df['week_number'] == week]
+    slices = zip(period_slices(events['pickup'], weeks, start_date, end_date),
+                 period_slices(events['delivery'], weeks, start_date, end_date),
+                 period_slices(events['routes'], weeks, start_date, end_date))
+
+    for (period, pickups), (_, deliveries), (_, completed) in slices:
+        week = period_label(period)
+        labels.append(week)
 
         # Shipment count
-        completed_shipments = week_data[(week_data['dropStatus'] == 'Succeeded') &
-                                         (week_data['keep_for_delivery'] == True)]
-        shipments = len(completed_shipments)
+        shipments = len(deliveries)
 
         # Routes count
-        routes = week_data[week_data['loadStatus'] == 'Completed']['loadId'].nunique()
+        routes = completed['loadId'].nunique()
 
         # OTP %
-        otp_data = week_data[(week_data['OTP'].notna()) &
-                              (week_data['keep_for_pickup'] == True) &
-                              (week_data['pickStatus'] == 'Succeeded')]
+        otp_data = pickups['OTP'].dropna()
         if len(otp_data) > 0:
-            otp_pct = (otp_data['OTP'] == 'On Time').sum() / len(otp_data) * 100
+            otp_pct = (otp_data == 'On Time').sum() / len(otp_data) * 100
         else:
             otp_pct = None
 
         # OTD %
-        otd_data = week_data[(week_data['OTD'].notna()) &
-                              (week_data['keep_for_delivery'] == True) &
-                              (week_data['dropStatus'] == 'Succeeded')]
+        otd_data = deliveries['OTD'].dropna()
         if len(otd_data) > 0:
-            otd_pct = (otd_data['OTD'] == 'On Time').sum() / len(otd_data) * 100
+            otd_pct = (otd_data == 'On Time').sum() / len(otd_data) * 100
         else:
             otd_pct = None
 
         # Tracking %
-        tracking_data = week_data[(week_data['isTracking'].notna()) &
-                                   (week_data['keep_for_pickup'] == True) &
-                                   (week_data['pickStatus'] == 'Succeeded')]
+        tracking_data = pickups['isTracking'].dropna()
         if len(tracking_data) > 0:
-            tracking_pct = (tracking_data['isTracking'] == 'YES').sum() / len(tracking_data) * 100
+            tracking_pct = (tracking_data == 'YES').sum() / len(tracking_data) * 100
         else:
             tracking_pct = None
 
         # Add to row
-        row_data[f'Shipments_W{week}'] = shipments
-        row_data[f'Routes_W{week}'] = routes
-        row_data[f'OTP_W{week}'] = otp_pct
-        row_data[f'OTD_W{week}'] = otd_pct
-        row_data[f'Tracking_W{week}'] = tracking_pct
+        row_data[f'Shipments_{week}'] = shipments
+        row_data[f'Routes_{week}'] = routes
+        row_data[f'OTP_{week}'] = otp_pct
+        row_data[f'OTD_{week}'] = otd_pct
+        row_data[f'Tracking_{week}'] = tracking_pct
+
+    return build_metrics_frame(row_data, labels)
+
+def build_metrics_frame(row_data, weeks):
+    """
+    Shape per-week metric values into the report's metrics table
+
+    Args:
+        row_data: Dict with 'Carrier' and '<Metric>_<period label>' values
+        weeks: List of period labels, in display order
 
+    Returns:
+        DataFrame with (metric, week) multi-level columns
+    """
     # Create dataframe
     carrier_result_df = pd.DataFrame([row_data])
     carrier_result_df = carrier_result_df.set_index('Carrier')
@@ -267,7 +343,7 @@ def calculate_performance_metrics(df, carrier_name, weeks):
     ordered_cols = []
     for metric in ['Shipments', 'Routes', 'OTP', 'OTD', 'Tracking']:
         for week in weeks:
-            ordered_cols.append(f'{metric}_W{week}')
+            ordered_cols.append(f'{metric}_{week}')
 
     carrier_result_df = carrier_result_df[ordered_cols]
 
@@ -275,143 +351,105 @@ def calculate_performance_metrics(df, carrier_name, weeks):
     new_cols = []
     for metric in ['Shipments', 'Routes', 'OTP %', 'OTD %', 'Tracking %']:
         for week in weeks:
-            new_cols.append((metric, f'W{week}'))
+            new_cols.append((metric, week))
 
     carrier_result_df.columns = pd.MultiIndex.from_tuples(new_cols)
 
     return carrier_result_df
 
-def generate_pickup_details_csv(df):
+def generate_pickup_details_csv(data):
     """
     Generate CSV export for pickup details including both delayed and on-time shipments
 
+    Args:
+        data: Event tables from events.build_event_tables (or a processed DataFrame)
+
     Returns:
         CSV string with all pickup details
     """
-    # Filter for successful pickups with deduplication
-    pickup_data = df[(df['pickStatus'] == 'Succeeded') &
-                     (df['keep_for_pickup'] == True)].copy()
+    # Successful pickups, deduplicated
+    events = as_event_tables(data)
+    pickup_data = events['pickup']
 
     if len(pickup_data) == 0:
         return None
 
-    # Format pickup window
-    def format_pickup_window(row):
-        from_str = str(row['pickWindowFrom'])
-        to_str = str(row['pickWindowTo'])
-        if ' ' in from_str and ' ' in to_str:
-            from_date, from_time = from_str.split(' ', 1)
-            to_date, to_time = to_str.split(' ', 1)
-            if from_date == to_date:
-                return f"{from_date} {from_time} - {to_time}"
-        return f"{from_str} - {to_str}"
-
-    pickup_data['Pickup Window'] = pickup_data.apply(format_pickup_window, axis=1)
-    pickup_data['Lane'] = (
-        pickup_data['pickCity'].fillna('') + ', ' +
-        pickup_data['pickState'].fillna('') + ' > ' +
-        pickup_data['dropCity'].fillna('') + ', ' +
-        pickup_data['dropState'].fillna('')
-    )
-
-    # Create status column (On-Time or delay code)
-    pickup_data['Status'] = pickup_data.apply(
-        lambda row: row['pickupDelayCode'] if pd.notna(row['pickupDelayCode']) and row['pickupDelayCode'] != '' else 'On-Time',
-        axis=1
-    )
-
-    # Select and rename columns for export
-    export_df = pickup_data[[
-        'orderCode', 'Status', 'Lane', 'Pickup Window',
-        'pickTimeDeparted', 'pickTimeArrived', 'isTracking', 'OTP'
-    ]].copy()
-
-    export_df.columns = [
-        'Order Code', 'Pickup Status', 'Lane', 'Pickup Window',
-        'Pick Departed', 'Pick Arrived', 'Tracking', 'OTP Result'
-    ]
+    # Status column is the delay code, or On-Time
+    export_df = pd.DataFrame({
+        'Order Code': pickup_data['orderCode'].to_numpy(),
+        'Pickup Status': pickup_data['pickupDelayCode'].where(
+            has_delay_code(pickup_data, 'pickupDelayCode'), 'On-Time').to_numpy(),
+        'Lane': event_lanes(pickup_data, events['lanes']).to_numpy(),
+        'Pickup Window': format_window(pickup_data['pickWindowFrom'], pickup_data['pickWindowTo']),
+        'Pick Departed': pickup_data['pickTimeDeparted'].to_numpy(),
+        'Pick Arrived': pickup_data['pickTimeArrived'].to_numpy(),
+        'Tracking': pickup_data['isTracking'].to_numpy(),
+        'OTP Result': pickup_data['OTP'].to_numpy(),
+    })
 
     # Sort by status (delays first, then on-time)
-    export_df['sort_key'] = export_df['Pickup Status'].apply(lambda x: 0 if x != 'On-Time' else 1)
-    export_df = export_df.sort_values('sort_key').drop('sort_key', axis=1)
+    sort_key = (export_df['Pickup Status'] == 'On-Time').astype('int64')
+    export_df = export_df.iloc[sort_key.sort_values().index]
 
     return export_df.to_csv(index=False)
 
-def generate_delivery_details_csv(df):
+def generate_delivery_details_csv(data):
     """
     Generate CSV export for delivery details including both delayed and on-time shipments
 
+    Args:
+        data: Event tables from events.build_event_tables (or a processed DataFrame)
+
     Returns:
         CSV string with all delivery details
     """
-    # Filter for successful deliveries with deduplication
-    delivery_data = df[(df['dropStatus'] == 'Succeeded') &
-                       (df['keep_for_delivery'] == True)].copy()
+    # Successful deliveries, deduplicated
+    events = as_event_tables(data)
+    delivery_data = events['delivery']
 
     if len(delivery_data) == 0:
         return None
 
-    # Format drop window
-    def format_drop_window(row):
-        from_str = str(row['dropWindowFrom'])
-        to_str = str(row['dropWindowTo'])
-        if ' ' in from_str and ' ' in to_str:
-            from_date, from_time = from_str.split(' ', 1)
-            to_date, to_time = to_str.split(' ', 1)
-            if from_date == to_date:
-                return f"{from_date} {from_time} - {to_time}"
-        return f"{from_str} - {to_str}"
-
-    delivery_data['Drop Window'] = delivery_data.apply(format_drop_window, axis=1)
-    delivery_data['Lane'] = (
-        delivery_data['pickCity'].fillna('') + ', ' +
-        delivery_data['pickState'].fillna('') + ' > ' +
-        delivery_data['dropCity'].fillna('') + ', ' +
-        delivery_data['dropState'].fillna('')
-    )
-
-    # Create status column (On-Time or delay code)
-    delivery_data['Status'] = delivery_data.apply(
-        lambda row: row['deliveryDelayCode'] if pd.notna(row['deliveryDelayCode']) and row['deliveryDelayCode'] != '' else 'On-Time',
-        axis=1
-    )
-
-    # Select and rename columns for export
-    export_df = delivery_data[[
-        'orderCode', 'Status', 'Lane', 'Drop Window',
-        'dropTimeDeparted', 'dropTimeArrived', 'isTracking', 'OTD'
-    ]].copy()
-
-    export_df.columns = [
-        'Order Code', 'Delivery Status', 'Lane', 'Drop Window',
-        'Drop Departed', 'Drop Arrived', 'Tracking', 'OTD Result'
-    ]
+    # Status column is the delay code, or On-Time
+    export_df = pd.DataFrame({
+        'Order Code': delivery_data['orderCode'].to_numpy(),
+        'Delivery Status': delivery_data['deliveryDelayCode'].where(
+            has_delay_code(delivery_data, 'deliveryDelayCode'), 'On-Time').to_numpy(),
+        'Lane': event_lanes(delivery_data, events['lanes']).to_numpy(),
+        'Drop Window': format_window(delivery_data['dropWindowFrom'], delivery_data['dropWindowTo']),
+        'Drop Departed': delivery_data['dropTimeDeparted'].to_numpy(),
+        'Drop Arrived': delivery_data['dropTimeArrived'].to_numpy(),
+        'Tracking': delivery_data['isTracking'].to_numpy(),
+        'OTD Result': delivery_data['OTD'].to_numpy(),
+    })
 
     # Sort by status (delays first, then on-time)
-    export_df['sort_key'] = export_df['Delivery Status'].apply(lambda x: 0 if x != 'On-Time' else 1)
-    export_df = export_df.sort_values('sort_key').drop('sort_key', axis=1)
+    sort_key = (export_df['Delivery Status'] == 'On-Time').astype('int64')
+    export_df = export_df.iloc[sort_key.sort_values().index]
 
     return export_df.to_csv(index=False)
 
-def analyze_delay_codes(df, carrier_name, weeks):
+def analyze_delay_codes(data, carrier_name, weeks):
     """
     Analyze delay codes for pickup and delivery
 
+    Args:
+        data: Event tables from events.build_event_tables (or a processed DataFrame)
+
     Returns:
         Dictionary with delay code analysis
     """
+    events = as_event_tables(data)
+    pickups, deliveries = events['pickup'], events['delivery']
+
     # Delivery delay codes
-    carrier_delay_data = df[(df['deliveryDelayCode'].notna()) &
-                             (df['deliveryDelayCode'] != '') &
-                             (df['keep_for_delivery'] == True) &
-                             (df['dropStatus'] == 'Succeeded')].copy()
+    carrier_delay_data = deliveries[has_delay_code(deliveries, 'deliveryDelayCode')]
 
     carrier_delay_counts = carrier_delay_data['deliveryDelayCode'].value_counts().reset_index()
     carrier_delay_counts.columns = ['Delivery Delay Code', 'Count']
 
-    total_delivery_shipments = len(df[(df['dropStatus'] == 'Succeeded') &
-                                       (df['keep_for_delivery'] == True)])
-    total_routes = df[df['loadStatus'] == 'Completed']['loadId'].nunique()
+    total_delivery_shipments = len(deliveries)
+    total_routes = events['routes']['loadId'].nunique()
 
     carrier_delay_counts['% of Total Shipments'] = (carrier_delay_counts['Count'] / total_delivery_shipments * 100).round(1)
 
@@ -426,16 +464,12 @@ def analyze_delay_codes(df, carrier_name, weeks):
     carrier_delay_counts_with_ontime = pd.concat([on_time_delivery_row, carrier_delay_counts], ignore_index=True)
 
     # Pickup delay codes
-    carrier_pickup_delay_data = df[(df['pickupDelayCode'].notna()) &
-                                    (df['pickupDelayCode'] != '') &
-                                    (df['keep_for_pickup'] == True) &
-                                    (df['pickStatus'] == 'Succeeded')].copy()
+    carrier_pickup_delay_data = pickups[has_delay_code(pickups, 'pickupDelayCode')]
 
     carrier_pickup_delay_counts = carrier_pickup_delay_data['pickupDelayCode'].value_counts().reset_index()
     carrier_pickup_delay_counts.columns = ['Pickup Delay Code', 'Count']
 
-    total_pickup_shipments = len(df[(df['pickStatus'] == 'Succeeded') &
-                                     (df['keep_for_pickup'] == True)])
+    total_pickup_shipments = len(pickups)
 
     carrier_pickup_delay_counts['% of Total Shipments'] = (carrier_pickup_delay_counts['Count'] / total_pickup_shipments * 100).round(1)
 
@@ -458,610 +492,120 @@ def analyze_delay_codes(df, carrier_name, weeks):
         'pickup_delay_data': carrier_pickup_delay_data,
         'total_delivery_shipments': total_delivery_shipments,
         'total_pickup_shipments': total_pickup_shipments,
-        'total_routes': total_routes
+        'total_routes': total_routes,
+        'lanes': events['lanes'],
+        'pickup_lateness': TDigest().add(pickups.loc[pickups['OTP'] == 'Late', 'pick_minutes_late'].to_numpy()),
+        'delivery_lateness': TDigest().add(deliveries.loc[deliveries['OTD'] == 'Late', 'drop_minutes_late'].to_numpy())
     }
 
-def generate_pdf_report(df, carrier_name, weeks, metrics_df, delay_data):
+def generate_pdf_report(df, carrier_name, weeks, metrics_df=None, delay_data=None, trend_data=None,
+                        backend=DEFAULT_PDF_BACKEND, workers=DEFAULT_PDF_WORKERS, output=None,
+                        max_detail_pages=DEFAULT_MAX_DETAIL_PAGES, max_seconds=DEFAULT_MAX_RENDER_SECONDS,
+                        appendix=None, compact=False, target_bytes=DEFAULT_PDF_TARGET_BYTES,
+                        sections=DEFAULT_REPORT_SPEC):
     """
     Generate PDF report
 
+    Pages are laid out in pdf_pages.py and drawn by one of two backends.
+    Pass output to write the PDF straight to a file instead of holding the
+    whole document in memory.
+
+    The report holds the given sections only (a named report such as
+    'summary', 'pickup' or 'executive', see pdf_pages.REPORT_SPECS).
+    metrics_df and delay_data are computed from df when left out, and only
+    if a section needs them.
+
+    Rendering is kept within a budget: when the delay detail pages would go
+    over max_detail_pages (or take more than about max_seconds), the largest
+    detail tables are replaced by a summary of their top lanes and delay
+    codes, and every late event goes to a CSV appendix instead.
+
+    Args:
+        df: Event tables from events.build_event_tables (or a processed
+            DataFrame)
+        metrics_df: calculate_performance_metrics output (None: computed
+            if needed)
+        delay_data: analyze_delay_codes output (None: computed if needed)
+        trend_data: Optional rolling trends for the carrier
+            (trends.TrendEngine.to_frame output); adds a trend page
+        backend: 'matplotlib', or 'reportlab' to draw the tables natively
+            (much faster for long detail tables; needs reportlab installed)
+        workers: Number of processes rendering pages (None: one per CPU
+            core; see pdf_parallel.py)
+        output: Optional file path or binary file-like object to write the
+            PDF to
+        max_detail_pages: Most delay detail pages to render (None: no limit)
+        max_seconds: Most estimated seconds of detail pages (None: no limit)
+        appendix: Optional file path or text file-like object to write the
+            CSV appendix to (only written when details are summarized)
+        compact: Write a smaller PDF, e.g. for email (tables drawn as row
+            bands; see pdf_pages.write_report)
+        target_bytes: Size the PDF should stay under (None: no target);
+            the written size is reported against it
+        sections: REPORT_SPECS name, or pdf_pages.REPORT_SECTIONS names
+
     Returns:
-        PDF as bytes
+        PDF as bytes, or output when given
     """
-    # Color scheme
-    WARP_GREEN = '#2E7D32'
-    WARP_DARK = '#1976D2'
-    WARP_GRAY = '#F5F5F5'
-    WARP_WHITE = '#FFFFFF'
-    WARP_BORDER = '#BDBDBD'
-    WARP_TEXT = '#212121'
-    # Tableau Classic color palette - Reordered: Coral Red first, Steel Blue 7th
-    PIE_COLORS = ['#E15759', '#F28E2B', '#76B7B2', '#59A14F', '#EDC948', '#B07AA1',
-                  '#4E79A7', '#FF9DA7', '#9C755F', '#BAB0AC', '#A0CBE8', '#FFBE7D']
-
-    def get_performance_color(value, target):
-        """Returns color based on performance vs target."""
-        if pd.isna(value):
-            return WARP_WHITE
-        if value >= target:
-            return '#90EE90'  # Light green (meets target)
-        gap = target - value
-        if gap >= 10:
-            return '#FF4444'  # Bright red (very bad)
-        elif gap >= 5:
-            return '#FF6666'  # Red (bad)
-        elif gap >= 2:
-            return '#FF9966'  # Orange-red (concerning)
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}' (expected one of {PDF_BACKENDS})")
+    if backend == 'reportlab':
+        from pdf_reportlab import REPORTLAB_AVAILABLE
+        if not REPORTLAB_AVAILABLE:
+            print("⚠️  Warning: reportlab is not installed, rendering the PDF with matplotlib")
+            backend = 'matplotlib'
+
+    sections = report_sections(sections)
+    needs = section_needs(sections)
+    if metrics_df is None and 'metrics' in needs:
+        metrics_df = calculate_performance_metrics(df, carrier_name, weeks)
+    if delay_data is None and 'delays' in needs:
+        delay_data = analyze_delay_codes(df, carrier_name, weeks)
+
+    from pdf_parallel import render_parallel, resolve_workers
+    workers = resolve_workers(workers)
+    summarize = over_budget_kinds(delay_data, backend, workers, max_detail_pages, max_seconds,
+                                  detail_kinds(sections))
+    if summarize:
+        print(f"⚠️  Warning: {' and '.join(summarize)} delay details are over the render budget, "
+              f"showing a summary instead")
+        if appendix is not None:
+            detail_appendix(delay_data, summarize).to_csv(appendix, index=False)
+
+    # Create PDF in memory unless a file was given; file-like objects are
+    # written through a ByteCounter, so they are never seeked
+    buffer = io.BytesIO() if output is None else output
+    target = buffer if isinstance(buffer, (str, os.PathLike)) else ByteCounter(buffer)
+    render_parallel(target, backend, carrier_name, metrics_df, delay_data, trend_data, workers, summarize, compact,
+                    sections)
+
+    if target_bytes is not None:
+        size = pdf_size(target)
+        if size > target_bytes:
+            print(f"⚠️  Warning: PDF is {size / 1e6:.2f} MB, over its {target_bytes / 1e6:.2f} MB target"
+                  + ("" if compact else " (compact=True writes a smaller file)"))
         else:
-            return '#FFB366'  # Light orange (slightly below)
-
-    # Helper function to add logo footer to each page
-    def add_logo_footer(fig):
-        """Add Warp logo as a small footer to the page"""
-        try:
-            logo = plt.imread('warp_logo.png')
-            # Create axes for logo positioning (centered, bottom of page, smaller)
-            ax_logo = fig.add_axes([0.42, 0.02, 0.16, 0.06])  # [left, bottom, width, height]
-            ax_logo.imshow(logo)
-            ax_logo.axis('off')
-        except Exception as e:
-            print(f"⚠️  Warning: Could not load logo footer: {e}")
-
-    # Create PDF in memory
-    buffer = io.BytesIO()
-    pdf_pages = PdfPages(buffer)
+            print(f"✅ PDF is {size / 1e6:.2f} MB (target {target_bytes / 1e6:.2f} MB)")
 
-    try:
-        # PAGE 1: Title Page
-        fig = plt.figure(figsize=(11, 8.5), facecolor=WARP_WHITE)
-
-        # Add WARP logo at the top
-        try:
-            logo = plt.imread('warp_logo.png')
-            ax_logo = fig.add_axes([0.35, 0.70, 0.3, 0.2])
-            ax_logo.imshow(logo)
-            ax_logo.axis('off')
-        except Exception as e:
-            print(f"⚠️  Warning: Could not load logo: {e}")
-
-        fig.text(0.5, 0.6, f'Carrier Performance Report',
-                 ha='center', fontsize=24, fontweight='bold', color=WARP_DARK)
-        fig.text(0.5, 0.5, f'{carrier_name}',
-                 ha='center', fontsize=20, fontweight='bold', color=WARP_TEXT)
-        fig.text(0.5, 0.4, f'Weeks {weeks[0]} & {weeks[1]}' if len(weeks) == 2 else f'Weeks {", ".join(map(str, weeks))}',
-                 ha='center', fontsize=16, fontweight='bold', color=WARP_TEXT)
-        fig.text(0.5, 0.3, f'Generated: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M")}',
-                 ha='center', fontsize=12, fontweight='bold', style='italic', color=WARP_TEXT)
-        plt.axis('off')
-        pdf_pages.savefig(fig, facecolor=WARP_WHITE)
-        plt.close()
-
-        # PAGE 2: Performance Metrics
-        fig = plt.figure(figsize=(11, 8.5), facecolor=WARP_WHITE)
-        fig.text(0.5, 0.92, 'Performance Metrics',
-                 ha='center', fontsize=18, fontweight='bold', color=WARP_DARK)
-
-        ax = fig.add_subplot(111)
-        ax.axis('off')
-
-        # Prepare table data
-        table_data = []
-        table_data.append(['Metric', f'Week {weeks[0]}', f'Week {weeks[1]}'] if len(weeks) == 2 else ['Metric'] + [f'Week {w}' for w in weeks])
-
-        # Add rows
-        for metric_name, metric_key in [('Shipments', 'Shipments'), ('Routes', 'Routes'),
-                                         ('OTP %\n(Target 98.5%)', 'OTP %'),
-                                         ('OTD %\n(Target 98.0%)', 'OTD %'),
-                                         ('Tracking %\n(Target 100%)', 'Tracking %')]:
-            row = [metric_name]
-            for week in weeks:
-                val = metrics_df[(metric_key, f'W{week}')].values[0]
-                if metric_key in ['OTP %', 'OTD %', 'Tracking %']:
-                    row.append(f'{val:.1f}%' if not pd.isna(val) else '-')
-                else:
-                    row.append(f'{int(val)}' if not pd.isna(val) else '-')
-            table_data.append(row)
-
-        # Create table
-        table = ax.table(cellText=table_data, cellLoc='center', loc='center',
-                         bbox=[0.2, 0.3, 0.6, 0.5])
-        table.auto_set_font_size(False)
-        table.set_fontsize(12)
-        table.scale(1, 3)
-
-        # Dynamic column widths based on actual content
-        temp_df = pd.DataFrame(table_data[1:], columns=table_data[0])
-        col_widths = compute_col_widths(temp_df, min_w=0.15, max_w=0.50)
-        for i in range(len(table_data)):
-            for j, width in enumerate(col_widths):
-                table[(i, j)].set_width(width)
-
-        # Style header
-        for i in range(len(table_data[0])):
-            table[(0, i)].set_facecolor(WARP_DARK)
-            table[(0, i)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=13)
-            table[(0, i)].set_edgecolor(WARP_BORDER)
-            table[(0, i)].set_linewidth(2)
-
-        # Style rows with color coding for performance metrics
-        metric_targets = {'OTP %': 98.5, 'OTD %': 99.9, 'Tracking %': 100.0}
-        metric_keys = ['Shipments', 'Routes', 'OTP %', 'OTD %', 'Tracking %']
-
-        for i in range(1, len(table_data)):
-            table[(i, 0)].set_facecolor(WARP_DARK)
-            if i >= 3:
-                table[(i, 0)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=10)
-            else:
-                table[(i, 0)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=12)
-            table[(i, 0)].set_edgecolor(WARP_BORDER)
-            table[(i, 0)].set_linewidth(1.5)
-
-            metric_key = metric_keys[i - 1]
-            for j in range(1, len(table_data[0])):
-                week_idx = j - 1
-                val = metrics_df[(metric_key, f'W{weeks[week_idx]}')].values[0]
-
-                # Apply color coding for performance metrics
-                if metric_key in metric_targets and not pd.isna(val):
-                    cell_color = get_performance_color(val, metric_targets[metric_key])
-                else:
-                    cell_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
-
-                table[(i, j)].set_facecolor(cell_color)
-                table[(i, j)].set_text_props(weight='bold', color=WARP_TEXT)
-                table[(i, j)].set_edgecolor(WARP_BORDER)
-                table[(i, j)].set_linewidth(1)
-
-        fig.text(0.5, 0.82, carrier_name,
-                 ha='center', fontsize=14, fontweight='bold', style='italic', color=WARP_TEXT)
-
-        # Add footnotes
-        fig.text(0.5, 0.15, '*OTP: Driver arrived after scheduled pickup window',
-                 ha='center', fontsize=9, color=WARP_TEXT)
-        fig.text(0.5, 0.12, '*OTD: Driver arrived after scheduled dropoff window',
-                 ha='center', fontsize=9, color=WARP_TEXT)
-
-        # Add logo footer
-        add_logo_footer(fig)
-
-        pdf_pages.savefig(fig, facecolor=WARP_WHITE)
-        plt.close()
-
-        # PAGE 3: Pickup Delay Codes (OTP)
-        carrier_pickup_delay_counts = delay_data['pickup_delay_counts']
-        carrier_pickup_delay_counts_with_ontime = delay_data['pickup_delay_counts_with_ontime']
-        total_pickup_shipments = delay_data['total_pickup_shipments']
-
-        fig = plt.figure(figsize=(11, 8.5), facecolor=WARP_WHITE)
-        fig.text(0.5, 0.95, 'Pickup Delay Codes',
-                 ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
-
-        if len(carrier_pickup_delay_counts) > 0:
-            # Table on left
-            ax1 = plt.subplot(1, 2, 1)
-            ax1.axis('tight')
-            ax1.axis('off')
-
-            table_data = [['Pickup\nDelay Code', 'Count', '% of Total\nShipments']]
-            for _, row in carrier_pickup_delay_counts.iterrows():
-                table_data.append([
-                    row['Pickup Delay Code'],
-                    str(row['Count']),
-                    f"{row['% of Total Shipments']:.1f}%"
-                ])
-
-            # Dynamic sizing
-            n_rows = len(table_data)
-            row_height = 0.08
-            max_height = 0.6
-            bbox_height = min(max_height, row_height * n_rows)
-            bbox_y = 0.5 - bbox_height / 2
-
-            table = ax1.table(cellText=table_data, cellLoc='left', loc='center',
-                             bbox=[0, bbox_y, 1, bbox_height])
-            table.auto_set_font_size(False)
-            table.set_fontsize(10)
-            table.scale(1, 1)
-
-            # Dynamic column widths based on actual content
-            # Create temp DataFrame for width calculation
-            temp_df = pd.DataFrame(table_data[1:], columns=table_data[0])
-            col_widths = compute_col_widths(temp_df, min_w=0.12, max_w=0.65)
-            for i in range(len(table_data)):
-                for j, width in enumerate(col_widths):
-                    table[(i, j)].set_width(width)
-
-            # Style header
-            for j in range(3):
-                table[(0, j)].set_facecolor(WARP_DARK)
-                table[(0, j)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=10, wrap=True, ha='center', va='center')
-                table[(0, j)].set_edgecolor(WARP_BORDER)
-                table[(0, j)].set_linewidth(2)
-                table[(0, j)].set_height(0.08)
-
-            # Style data rows
-            for i in range(1, len(table_data)):
-                row_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
-                for j in range(3):
-                    table[(i, j)].set_facecolor(row_color)
-                    table[(i, j)].set_text_props(weight='bold', color=WARP_TEXT)
-                    table[(i, j)].set_edgecolor(WARP_BORDER)
-                    table[(i, j)].set_linewidth(1)
-                    if j > 0:
-                        table[(i, j)].set_text_props(ha='center', weight='bold', color=WARP_TEXT)
-
-            # Pie chart on right
-            ax2 = plt.subplot(1, 2, 2)
-
-            def autopct_format(pct):
-                return f'{pct:.1f}%' if pct >= 5 else ''
-
-            # Use with_ontime data for pie chart
-            pie_colors_with_ontime = ['#4CAF50'] + PIE_COLORS[:len(carrier_pickup_delay_counts)]
-
-            wedges, texts, autotexts = ax2.pie(carrier_pickup_delay_counts_with_ontime['Count'],
-                                                autopct=autopct_format,
-                                                startangle=90,
-                                                colors=pie_colors_with_ontime,
-                                                wedgeprops={'edgecolor': WARP_WHITE, 'linewidth': 2})
-
-            for autotext in autotexts:
-                autotext.set_color('white')
-                autotext.set_fontsize(10)
-                autotext.set_weight('bold')
-
-            # Add "Total Shipments" text above legend
-            ax2.text(0.5, -0.10, f'Total Shipments: {total_pickup_shipments}',
-                    ha='center', va='top', fontsize=11, fontweight='bold',
-                    color=WARP_TEXT, transform=ax2.transAxes)
-
-            # Legend below the text
-            ax2.legend(wedges, carrier_pickup_delay_counts_with_ontime['Pickup Delay Code'],
-                      title="Pickup Status",
-                      loc="upper center",
-                      bbox_to_anchor=(0.5, -0.20),
-                      fontsize=9,
-                      ncol=2,
-                      facecolor=WARP_WHITE,
-                      edgecolor=WARP_BORDER,
-                      labelcolor=WARP_TEXT)
-
-            legend = ax2.get_legend()
-            if legend:
-                legend.get_title().set_color(WARP_DARK)
-                legend.get_title().set_fontsize(10)
-                legend.get_title().set_weight('bold')
-        else:
-            fig.text(0.5, 0.5, 'No pickup delay codes found',
-                     ha='center', fontsize=14, fontweight='bold', style='italic', color=WARP_TEXT)
-
-        # Add logo footer
-        add_logo_footer(fig)
-
-        pdf_pages.savefig(fig, facecolor=WARP_WHITE)
-        plt.close()
-
-        # PAGE 4+: Pickup Delay Details (OTP - paginated)
-        carrier_pickup_delay_data = delay_data['pickup_delay_data']
-
-        if len(carrier_pickup_delay_data) > 0:
-            # Format pickup window
-            def format_pickup_window(row):
-                from_str = str(row['pickWindowFrom'])
-                to_str = str(row['pickWindowTo'])
-                if ' ' in from_str and ' ' in to_str:
-                    from_date, from_time = from_str.split(' ', 1)
-                    to_date, to_time = to_str.split(' ', 1)
-                    if from_date == to_date:
-                        return f"{from_date} {from_time} - {to_time}"
-                return f"{from_str} - {to_str}"
-
-            carrier_pickup_delay_data['Pickup Window'] = carrier_pickup_delay_data.apply(format_pickup_window, axis=1)
-            carrier_pickup_delay_data['Lane'] = (
-                carrier_pickup_delay_data['pickCity'].fillna('') + ', ' +
-                carrier_pickup_delay_data['pickState'].fillna('') + ' > ' +
-                carrier_pickup_delay_data['dropCity'].fillna('') + ', ' +
-                carrier_pickup_delay_data['dropState'].fillna('')
-            )
-
-            pickup_delay_details = carrier_pickup_delay_data[[
-                'orderCode', 'pickupDelayCode', 'Lane', 'Pickup Window',
-                'pickTimeDeparted', 'pickTimeArrived', 'isTracking'
-            ]].copy()
-
-            pickup_delay_details.columns = [
-                'Order Code', 'Pickup Delay Code', 'Lane', 'Pickup Window',
-                'Pick Departed', 'Pick Arrived', 'Tracking'
-            ]
-
-            # Paginate
-            rows_per_page = 12
-            total_rows = len(pickup_delay_details)
-            total_pages = (total_rows + rows_per_page - 1) // rows_per_page
-
-            for page_num in range(total_pages):
-                start_idx = page_num * rows_per_page
-                end_idx = min(start_idx + rows_per_page, total_rows)
-                display_data = pickup_delay_details.iloc[start_idx:end_idx]
-
-                fig = plt.figure(figsize=(11, 8.5), facecolor=WARP_WHITE)
-
-                if total_pages > 1:
-                    fig.text(0.5, 0.95, f'Pickup Delay Details - Page {page_num + 1} of {total_pages}',
-                             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
-                else:
-                    fig.text(0.5, 0.95, 'Pickup Delay Details',
-                             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
-
-                fig.text(0.5, 0.92, f'(Showing records {start_idx + 1}-{end_idx} of {total_rows} total)',
-                         ha='center', fontsize=10, fontweight='bold', style='italic', color=WARP_TEXT, transform=fig.transFigure)
-
-                ax = fig.add_subplot(111)
-                ax.axis('tight')
-                ax.axis('off')
-
-                table_data = [display_data.columns.tolist()]
-                for _, row in display_data.iterrows():
-                    table_data.append([str(val) if not pd.isna(val) else '' for val in row])
-
-                # Dynamic sizing
-                num_rows = len(table_data)
-                bbox_height = min(0.85, 0.1 + (num_rows * 0.05))
-                bbox_y = 0.85 - bbox_height
-                table = ax.table(cellText=table_data, cellLoc='left', loc='center',
-                                bbox=[0, bbox_y, 1, bbox_height])
-                table.auto_set_font_size(False)
-                table.set_fontsize(5.5)
-                table.scale(1, 1.2)
-
-                # Dynamic column widths based on actual content
-                col_widths = compute_col_widths(display_data)
-                for i, width in enumerate(col_widths):
-                    for j in range(len(table_data)):
-                        table[(j, i)].set_width(width)
-
-                # Style header
-                for i in range(len(display_data.columns)):
-                    table[(0, i)].set_facecolor(WARP_DARK)
-                    table[(0, i)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=7, wrap=True, ha='center', va='center')
-                    table[(0, i)].set_edgecolor(WARP_BORDER)
-                    table[(0, i)].set_linewidth(1.5)
-                    table[(0, i)].set_height(0.04)
-
-                # Style data rows
-                for i in range(1, len(table_data)):
-                    row_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
-                    for j in range(len(display_data.columns)):
-                        table[(i, j)].set_facecolor(row_color)
-                        table[(i, j)].set_edgecolor(WARP_BORDER)
-                        table[(i, j)].set_linewidth(0.5)
-                        table[(i, j)].set_text_props(wrap=True, weight='bold', color=WARP_TEXT)
-
-                # Add logo footer
-                add_logo_footer(fig)
-
-                pdf_pages.savefig(fig, facecolor=WARP_WHITE)
-                plt.close()
-
-        # PAGE 5: Delivery Delay Codes (OTD)
-        carrier_delay_counts = delay_data['delivery_delay_counts']
-        carrier_delay_counts_with_ontime = delay_data['delivery_delay_counts_with_ontime']
-        total_delivery_shipments = delay_data['total_delivery_shipments']
-
-        fig = plt.figure(figsize=(11, 8.5), facecolor=WARP_WHITE)
-        fig.text(0.5, 0.95, 'Delivery Delay Codes',
-                 ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
-
-        if len(carrier_delay_counts) > 0:
-            # Table on left
-            ax1 = plt.subplot(1, 2, 1)
-            ax1.axis('tight')
-            ax1.axis('off')
-
-            table_data = [['Delivery\nDelay Code', 'Count', '% of Total\nShipments']]
-            for _, row in carrier_delay_counts.iterrows():
-                table_data.append([
-                    row['Delivery Delay Code'],
-                    str(row['Count']),
-                    f"{row['% of Total Shipments']:.1f}%"
-                ])
-
-            # Dynamic sizing
-            n_rows = len(table_data)
-            row_height = 0.08
-            max_height = 0.6
-            bbox_height = min(max_height, row_height * n_rows)
-            bbox_y = 0.5 - bbox_height / 2
-
-            table = ax1.table(cellText=table_data, cellLoc='left', loc='center',
-                             bbox=[0, bbox_y, 1, bbox_height])
-            table.auto_set_font_size(False)
-            table.set_fontsize(10)
-            table.scale(1, 1)
-
-            # Dynamic column widths based on actual content
-            # Create temp DataFrame for width calculation
-            temp_df = pd.DataFrame(table_data[1:], columns=table_data[0])
-            col_widths = compute_col_widths(temp_df, min_w=0.12, max_w=0.65)
-            for i in range(len(table_data)):
-                for j, width in enumerate(col_widths):
-                    table[(i, j)].set_width(width)
-
-            # Style header
-            for j in range(3):
-                table[(0, j)].set_facecolor(WARP_DARK)
-                table[(0, j)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=10, wrap=True, ha='center', va='center')
-                table[(0, j)].set_edgecolor(WARP_BORDER)
-                table[(0, j)].set_linewidth(2)
-                table[(0, j)].set_height(0.08)
-
-            # Style data rows
-            for i in range(1, len(table_data)):
-                row_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
-                for j in range(3):
-                    table[(i, j)].set_facecolor(row_color)
-                    table[(i, j)].set_text_props(weight='bold', color=WARP_TEXT)
-                    table[(i, j)].set_edgecolor(WARP_BORDER)
-                    table[(i, j)].set_linewidth(1)
-                    if j > 0:
-                        table[(i, j)].set_text_props(ha='center', weight='bold', color=WARP_TEXT)
-
-            # Pie chart on right
-            ax2 = plt.subplot(1, 2, 2)
-
-            def autopct_format(pct):
-                return f'{pct:.1f}%' if pct >= 5 else ''
-
-            # Use with_ontime data for pie chart
-            pie_colors_with_ontime = ['#4CAF50'] + PIE_COLORS[:len(carrier_delay_counts)]
-
-            wedges, texts, autotexts = ax2.pie(carrier_delay_counts_with_ontime['Count'],
-                                                autopct=autopct_format,
-                                                startangle=90,
-                                                colors=pie_colors_with_ontime,
-                                                wedgeprops={'edgecolor': WARP_WHITE, 'linewidth': 2})
-
-            for autotext in autotexts:
-                autotext.set_color('white')
-                autotext.set_fontsize(10)
-                autotext.set_weight('bold')
-
-            # Add "Total Shipments" text above legend
-            ax2.text(0.5, -0.10, f'Total Shipments: {total_delivery_shipments}',
-                    ha='center', va='top', fontsize=11, fontweight='bold',
-                    color=WARP_TEXT, transform=ax2.transAxes)
-
-            # Legend below the text
-            ax2.legend(wedges, carrier_delay_counts_with_ontime['Delivery Delay Code'],
-                      title="Delivery Status",
-                      loc="upper center",
-                      bbox_to_anchor=(0.5, -0.20),
-                      fontsize=9,
-                      ncol=2,
-                      facecolor=WARP_WHITE,
-                      edgecolor=WARP_BORDER,
-                      labelcolor=WARP_TEXT)
-
-            legend = ax2.get_legend()
-            if legend:
-                legend.get_title().set_color(WARP_DARK)
-                legend.get_title().set_fontsize(10)
-                legend.get_title().set_weight('bold')
-        else:
-            fig.text(0.5, 0.5, 'No delivery delay codes found',
-                     ha='center', fontsize=14, fontweight='bold', style='italic', color=WARP_TEXT)
-
-        # Add logo footer
-        add_logo_footer(fig)
-
-        pdf_pages.savefig(fig, facecolor=WARP_WHITE)
-        plt.close()
-
-        # PAGE 6+: Delivery Delay Details (OTD - paginated)
-        carrier_delay_data = delay_data['delivery_delay_data']
-
-        if len(carrier_delay_data) > 0:
-            # Format drop window
-            def format_drop_window(row):
-                from_str = str(row['dropWindowFrom'])
-                to_str = str(row['dropWindowTo'])
-                if ' ' in from_str and ' ' in to_str:
-                    from_date, from_time = from_str.split(' ', 1)
-                    to_date, to_time = to_str.split(' ', 1)
-                    if from_date == to_date:
-                        return f"{from_date} {from_time} - {to_time}"
-                return f"{from_str} - {to_str}"
-
-            carrier_delay_data['Drop Window'] = carrier_delay_data.apply(format_drop_window, axis=1)
-            carrier_delay_data['Lane'] = (
-                carrier_delay_data['pickCity'].fillna('') + ', ' +
-                carrier_delay_data['pickState'].fillna('') + ' > ' +
-                carrier_delay_data['dropCity'].fillna('') + ', ' +
-                carrier_delay_data['dropState'].fillna('')
-            )
-
-            delivery_delay_details = carrier_delay_data[[
-                'orderCode', 'deliveryDelayCode', 'Lane', 'Drop Window',
-                'dropTimeDeparted', 'dropTimeArrived', 'isTracking'
-            ]].copy()
-
-            delivery_delay_details.columns = [
-                'Order Code', 'Delivery Delay Code', 'Lane', 'Drop Window',
-                'Drop Departed', 'Drop Arrived', 'Tracking'
-            ]
-
-            # Paginate
-            rows_per_page = 12
-            total_rows = len(delivery_delay_details)
-            total_pages = (total_rows + rows_per_page - 1) // rows_per_page
-
-            for page_num in range(total_pages):
-                start_idx = page_num * rows_per_page
-                end_idx = min(start_idx + rows_per_page, total_rows)
-                display_data = delivery_delay_details.iloc[start_idx:end_idx]
-
-                fig = plt.figure(figsize=(11, 8.5), facecolor=WARP_WHITE)
-
-                if total_pages > 1:
-                    fig.text(0.5, 0.95, f'Delivery Delay Details - Page {page_num + 1} of {total_pages}',
-                             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
-                else:
-                    fig.text(0.5, 0.95, 'Delivery Delay Details',
-                             ha='center', fontsize=18, fontweight='bold', color=WARP_DARK, transform=fig.transFigure)
-
-                fig.text(0.5, 0.92, f'(Showing records {start_idx + 1}-{end_idx} of {total_rows} total)',
-                         ha='center', fontsize=10, fontweight='bold', style='italic', color=WARP_TEXT, transform=fig.transFigure)
-
-                ax = fig.add_subplot(111)
-                ax.axis('tight')
-                ax.axis('off')
-
-                table_data = [display_data.columns.tolist()]
-                for _, row in display_data.iterrows():
-                    table_data.append([str(val) if not pd.isna(val) else '' for val in row])
-
-                # Dynamic sizing
-                num_rows = len(table_data)
-                bbox_height = min(0.85, 0.1 + (num_rows * 0.05))
-                bbox_y = 0.85 - bbox_height
-                table = ax.table(cellText=table_data, cellLoc='left', loc='center',
-                                bbox=[0, bbox_y, 1, bbox_height])
-                table.auto_set_font_size(False)
-                table.set_fontsize(5.5)
-                table.scale(1, 1.2)
-
-                # Dynamic column widths based on actual content
-                col_widths = compute_col_widths(display_data)
-                for i, width in enumerate(col_widths):
-                    for j in range(len(table_data)):
-                        table[(j, i)].set_width(width)
-
-                # Style header
-                for i in range(len(display_data.columns)):
-                    table[(0, i)].set_facecolor(WARP_DARK)
-                    table[(0, i)].set_text_props(weight='bold', color=WARP_WHITE, fontsize=7, wrap=True, ha='center', va='center')
-                    table[(0, i)].set_edgecolor(WARP_BORDER)
-                    table[(0, i)].set_linewidth(1.5)
-                    table[(0, i)].set_height(0.06)
-
-                # Style data rows
-                for i in range(1, len(table_data)):
-                    row_color = WARP_GRAY if i % 2 == 0 else WARP_WHITE
-                    for j in range(len(display_data.columns)):
-                        table[(i, j)].set_facecolor(row_color)
-                        table[(i, j)].set_edgecolor(WARP_BORDER)
-                        table[(i, j)].set_linewidth(0.5)
-                        table[(i, j)].set_text_props(wrap=True, weight='bold', color=WARP_TEXT)
-
-                # Add logo footer
-                add_logo_footer(fig)
-
-                pdf_pages.savefig(fig, facecolor=WARP_WHITE)
-                plt.close()
-
-    finally:
-        pdf_pages.close()
-
-    buffer.seek(0)
-    return buffer.getvalue()
+    if output is None:
+        return buffer.getvalue()
+    return output
 
+def stream_pdf_report(df, carrier_name, weeks, metrics_df, delay_data, trend_data=None,
+                      chunk_size=PDF_CHUNK_SIZE, **options):
+    """
+    Generate PDF report as an iterator of byte chunks
+
+    The report is written to a temporary file, so memory use does not grow
+    with the number of pages.
+
+    Args:
+        As for generate_pdf_report (options: its keyword arguments)
+        chunk_size: Bytes per chunk
+
+    Returns:
+        Iterator of bytes
+    """
+    with tempfile.TemporaryFile() as f:
+        generate_pdf_report(df, carrier_name, weeks, metrics_df, delay_data, trend_data, output=f, **options)
+        yield from pdf_chunks(f, chunk_size)
@@ -0,0 +1,687 @@
+"""
+Daily rollup store for Carrier Performance Reports
+
+Persists per-carrier, per-day aggregates (event counts, on-time counts,
+tracking counts, delay-code counts and route sketches) so that any week or date
+range report can be answered by summing days instead of reprocessing every
+shipment row. Per-carrier facility aggregates (facilities.py) are stored
+alongside and merged into one fleet-wide facility cache, and the daily
+counts of every carrier feed one fleet-wide rolling trend engine
+(trends.py), extended as weeks close.
+
+Usage:
+    python rollups.py backfill            # build rollups for every carrier
+    python rollups.py update              # re-aggregate weeks with new/updated rows
+                                          # (and append newly closed weeks to the trends)
+    python rollups.py routes START END    # distinct routes across the fleet (END exclusive)
+"""
+
+import datetime
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from facilities import build_facility_rollups, merge_facility_rollups
+from lateness import TDigest, late_mask
+from masks import mask_cache
+from periods import period_bounds, period_label, period_of, period_range, recent_periods, resolve_periods
+from routes import RouteSketch, route_hashes
+from trends import TrendEngine, weekly_counts_from_daily
+
+# Default location of the persisted rollups (one pickle per carrier)
+ROLLUP_DIR = 'rollups'
+
+# Fleet-wide facility cache, kept in ROLLUP_DIR next to the carrier files
+FACILITY_FILE = '_facilities.pkl'
+
+# Fleet-wide rolling trends over the closed weeks, also in ROLLUP_DIR
+TREND_FILE = '_trends.pkl'
+
+# Count columns stored per carrier per day
+COUNT_COLUMNS = [
+    'shipments',            # dropStatus = Succeeded, deduplicated for delivery
+    'pickup_shipments',     # pickStatus = Succeeded, deduplicated for pickup
+    'otp_events', 'otp_on_time',
+    'otd_events', 'otd_on_time',
+    'tracking_events', 'tracking_yes',
+]
+
+# ============================================================================
+# BUILDING ROLLUPS
+# ============================================================================
+
+def build_daily_rollups(df):
+    """
+    Aggregate a processed DataFrame into per-carrier, per-day rollups
+
+    Days are taken from pickWindowFrom, the same field the week number is
+    derived from, so summing the days of a week reproduces the weekly metrics.
+
+    Args:
+        df: DataFrame returned by report_generator.process_data
+
+    Returns:
+        Dict with 'daily' counts, 'delay_codes' counts, 'routes' distinct
+        route sketches, 'lateness' minutes-late sketches and 'load_weeks'
+        (the weeks each loadId has rows in, for incremental updates)
+    """
+    day = df['pickWindowFrom_dt'].dt.normalize()
+
+    masks = mask_cache(df)
+
+    flags = pd.DataFrame({
+        'carrierName': df['carrierName'],
+        'day': day,
+        'shipments': masks.mask('delivery_event'),
+        'pickup_shipments': masks.mask('pickup_event'),
+        'otp_events': masks.mask('pickup_event', 'otp_known'),
+        'otp_on_time': masks.mask('pickup_event', 'otp_on_time'),
+        'otd_events': masks.mask('delivery_event', 'otd_known'),
+        'otd_on_time': masks.mask('delivery_event', 'otd_on_time'),
+        'tracking_events': masks.mask('pickup_event', 'tracking_known'),
+        'tracking_yes': masks.mask('pickup_event', 'tracking_yes'),
+    })
+    flags = flags[flags['day'].notna()]
+
+    daily = flags.groupby(['carrierName', 'day'], as_index=False)[COUNT_COLUMNS].sum()
+    daily[COUNT_COLUMNS] = daily[COUNT_COLUMNS].astype('int64')
+
+    # Delay code counts (same filters as analyze_delay_codes)
+    delay_frames = []
+    for kind, code_col, event, code in [('pickup', 'pickupDelayCode', 'pickup_event', 'has_pickup_code'),
+                                        ('delivery', 'deliveryDelayCode', 'delivery_event', 'has_delivery_code')]:
+        has_code = masks.mask(event, code) & day.notna().to_numpy()
+        counts = (pd.DataFrame({'carrierName': df['carrierName'][has_code],
+                                'day': day[has_code],
+                                'code': df[code_col][has_code]})
+                  .groupby(['carrierName', 'day', 'code'], as_index=False)
+                  .size()
+                  .rename(columns={'size': 'count'}))
+        counts.insert(2, 'kind', kind)
+        delay_frames.append(counts)
+    delay_codes = pd.concat(delay_frames, ignore_index=True)
+
+    # Route sketches per day: routes are distinct loadIds, so they are
+    # unioned (not summed) when days are combined
+    completed = masks.mask('load_completed') & day.notna().to_numpy()
+    routes = pd.DataFrame({'carrierName': df['carrierName'][completed],
+                           'day': day[completed],
+                           'hash': route_hashes(df['loadId'][completed])})
+    routes = pd.DataFrame(
+        [(carrier, group_day, RouteSketch.from_hashes(hashes.to_numpy()))
+         for (carrier, group_day), hashes in routes.groupby(['carrierName', 'day'])['hash']],
+        columns=['carrierName', 'day', 'routes'])
+
+    # Minutes-late sketches for late events (merged, not summed, across days)
+    lateness_frames = []
+    for kind, minutes_col in [('pickup', 'pick_minutes_late'), ('delivery', 'drop_minutes_late')]:
+        late = late_mask(df, kind) & day.notna()
+        groups = pd.DataFrame({'carrierName': df['carrierName'][late],
+                               'day': day[late],
+                               'minutes': df[minutes_col][late]})
+        sketches = pd.DataFrame(
+            [(carrier, group_day, kind, TDigest().add(minutes.to_numpy()))
+             for (carrier, group_day), minutes in groups.groupby(['carrierName', 'day'])['minutes']],
+            columns=['carrierName', 'day', 'kind', 'digest'])
+        lateness_frames.append(sketches)
+    lateness = pd.concat(lateness_frames, ignore_index=True)
+
+    load_weeks = (df.loc[df['loadId'].notna(), ['loadId', 'iso_year', 'week_number']]
+                  .drop_duplicates(ignore_index=True))
+
+    return {'daily': daily, 'delay_codes': delay_codes, 'routes': routes, 'lateness': lateness,
+            'load_weeks': load_weeks}
+
+def _build_carrier_rollups(carrier_name):
+    """Load, process and roll up one carrier (runs in a worker process)"""
+    from report_generator import get_db_connection, process_data
+
+    conn = get_db_connection()
+    query = """
+        SELECT *
+        FROM otp_reports
+        WHERE LOWER(carrierName) = LOWER(%(carrier_name)s)
+        AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+        ORDER BY id DESC
+    """
+    df = pd.read_sql(query, conn, params={'carrier_name': carrier_name})
+    conn.close()
+
+    df = process_data(df)
+    rollups = build_daily_rollups(df)
+    rollups['facilities'] = build_facility_rollups(df)
+    rollups['carrier'] = carrier_name
+    rollups['built_at'] = datetime.datetime.now()
+    rollups['last_id'] = int(df['id'].max()) if len(df) > 0 else 0
+    rollups['last_updated'] = df['updatedAt_dt'].max() if len(df) > 0 else pd.NaT
+    return rollups
+
+def _update_carrier_rollups(rollups, changes):
+    """
+    Re-aggregate the weeks touched by changed rows and splice them into a
+    carrier's stored rollups (runs in a worker process)
+
+    Touched weeks are the weeks of the changed rows plus every week their
+    loads had rows in when the rollups were built (a row's pickWindowFrom
+    may have moved). Dedup keys start with loadId + carrierName, so those
+    weeks are reprocessed together with every row of their loads.
+
+    Args:
+        rollups: Stored rollups of the carrier
+        changes: Changed rows of the carrier (id, loadId, pickWindowFrom,
+            updatedAt_dt)
+
+    Returns:
+        Updated rollups
+    """
+    from report_generator import get_db_connection, process_data
+
+    load_weeks = rollups['load_weeks']
+    periods = _touched_periods(rollups, changes)
+
+    params = {'carrier_name': rollups['carrier']}
+    in_weeks = []
+    for i, period in enumerate(periods):
+        params[f'start_{i}'], params[f'end_{i}'] = (bound.strftime('%Y-%m-%d') for bound in period_bounds(period))
+        in_weeks.append(f"(STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= %(start_{i})s "
+                        f"AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') < %(end_{i})s)")
+    in_weeks = ' OR '.join(in_weeks)
+
+    conn = get_db_connection()
+    query = f"""
+        SELECT *
+        FROM otp_reports
+        WHERE LOWER(carrierName) = LOWER(%(carrier_name)s)
+        AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+        AND (loadId IN (SELECT loadId
+                        FROM otp_reports
+                        WHERE LOWER(carrierName) = LOWER(%(carrier_name)s)
+                        AND ({in_weeks}))
+             OR (loadId IS NULL AND ({in_weeks})))
+        ORDER BY id DESC
+    """
+    df = pd.read_sql(query, conn, params=params)
+    conn.close()
+
+    df = process_data(df)
+    rebuilt = build_daily_rollups(df)
+    for key in ['daily', 'delay_codes', 'routes', 'lateness']:
+        stored = rollups[key]
+        rollups[key] = pd.concat([stored[~_in_periods(stored['day'], periods)],
+                                  rebuilt[key][_in_periods(rebuilt[key]['day'], periods)]],
+                                 ignore_index=True).sort_values('day', kind='stable', ignore_index=True)
+
+    # Every row of the reprocessed loads was loaded, so their weeks are replaced
+    rollups['load_weeks'] = pd.concat([load_weeks[~load_weeks['loadId'].isin(rebuilt['load_weeks']['loadId'])],
+                                       rebuilt['load_weeks']], ignore_index=True)
+
+    # Facility aggregates are weekly: the touched weeks are replaced
+    facilities = build_facility_rollups(df)
+    parts = []
+    for part in [rollups['facilities'], facilities]:
+        weekly = part['weekly']
+        touched = pd.MultiIndex.from_arrays([weekly['iso_year'], weekly['week_number']]).isin(periods)
+        parts.append({'locations': part['locations'],
+                      'weekly': weekly[touched if part is facilities else ~touched]})
+    rollups['facilities'] = merge_facility_rollups(parts)
+
+    rollups['built_at'] = datetime.datetime.now()
+    rollups['last_id'] = max(rollups['last_id'], int(changes['id'].max()))
+    last_updated = changes['updatedAt_dt'].max()
+    if pd.notna(last_updated) and (pd.isna(rollups['last_updated']) or last_updated > rollups['last_updated']):
+        rollups['last_updated'] = last_updated
+    return rollups
+
+def _touched_periods(rollups, changes):
+    """Weeks of the changed rows and of every week their loads had rows in (sorted)"""
+    load_weeks = rollups['load_weeks']
+    moved = load_weeks[load_weeks['loadId'].isin(changes['loadId'])]
+    days = pd.to_datetime(changes['pickWindowFrom'], errors='coerce').dropna()
+    return sorted(set(period_of(days)) | set(zip(moved['iso_year'], moved['week_number'])))
+
+def rollups_current(rollups, rows):
+    """
+    True if no row is past the rollups' id / updatedAt watermark, i.e. the
+    rollups already count every row (run 'python rollups.py update' otherwise)
+
+    Args:
+        rollups: One carrier's stored rollups
+        rows: Processed rows of the carrier (process_data output)
+    """
+    if len(rows) == 0:
+        return True
+    if rows['id'].max() > rollups['last_id']:
+        return False
+    latest = rows['updatedAt_dt'].max()
+    return pd.isna(latest) or (pd.notna(rollups['last_updated']) and latest <= rollups['last_updated'])
+
+def _in_periods(days, periods):
+    """Boolean array of the days falling in any of the periods"""
+    days = pd.to_datetime(days)
+    mondays = days - pd.to_timedelta(days.dt.weekday, unit='D')
+    return mondays.isin([period_bounds(period)[0] for period in periods]).to_numpy()
+
+# ============================================================================
+# ROLLUP STORE
+# ============================================================================
+
+class RollupStore:
+    """Persisted daily rollups, one pickle file per carrier"""
+
+    def __init__(self, path=ROLLUP_DIR):
+        self.path = path
+
+    def _file(self, carrier_name):
+        slug = re.sub(r'[^a-z0-9]+', '_', carrier_name.lower()).strip('_')
+        return os.path.join(self.path, f'{slug}.pkl')
+
+    def _carrier_files(self):
+        """Paths of the stored carrier rollups"""
+        if not os.path.isdir(self.path):
+            return []
+        return [os.path.join(self.path, file_name) for file_name in sorted(os.listdir(self.path))
+                if file_name.endswith('.pkl') and file_name not in (FACILITY_FILE, TREND_FILE)]
+
+    def _write(self, target, data):
+        """Pickle data to target (atomically replaces the old file)"""
+        os.makedirs(self.path, exist_ok=True)
+        tmp = target + '.tmp'
+        pd.to_pickle(data, tmp)
+        os.replace(tmp, target)
+
+    def save(self, carrier_name, rollups):
+        """Write one carrier's rollups (atomically replaces the old file)"""
+        self._write(self._file(carrier_name), rollups)
+
+    def load(self, carrier_name):
+        """Load one carrier's rollups, or None if they have not been built"""
+        target = self._file(carrier_name)
+        if not os.path.exists(target):
+            return None
+        return pd.read_pickle(target)
+
+    def carriers(self):
+        """Carrier names with stored rollups"""
+        return [pd.read_pickle(path)['carrier'] for path in self._carrier_files()]
+
+    def facilities(self):
+        """
+        Fleet-wide facility rollups (every carrier's, merged)
+
+        The merged rollups are cached in FACILITY_FILE and rebuilt only when a
+        carrier's rollups are newer than the cache.
+
+        Returns:
+            facilities.merge_facility_rollups output, or None if no stored
+            rollups have facility aggregates
+        """
+        target = os.path.join(self.path, FACILITY_FILE)
+        carrier_files = self._carrier_files()
+        if os.path.exists(target) and all(os.path.getmtime(path) <= os.path.getmtime(target)
+                                          for path in carrier_files):
+            return pd.read_pickle(target)
+
+        parts = [rollups['facilities'] for rollups in map(pd.read_pickle, carrier_files)
+                 if 'facilities' in rollups]
+        if not parts:
+            return None
+        facilities = merge_facility_rollups(parts)
+        self._write(target, facilities)
+        return facilities
+
+    def trends(self):
+        """
+        Rolling trends for every carrier over the closed weeks
+
+        The engine is cached in TREND_FILE. Weeks closed since it was written
+        are appended to it (TrendEngine.append_week); it is rebuilt only
+        when a carrier's rollups are newer than the cache (update() keeps
+        the cache current itself, see _advance_trends).
+
+        Returns:
+            trends.TrendEngine keyed by the carrier names the rollups were
+            built for, or None if no rollups are stored
+        """
+        target = os.path.join(self.path, TREND_FILE)
+        carrier_files = self._carrier_files()
+        if not carrier_files:
+            return None
+        if not os.path.exists(target) or any(os.path.getmtime(path) > os.path.getmtime(target)
+                                             for path in carrier_files):
+            return self._build_trends()
+
+        engine = pd.read_pickle(target)
+        if self._append_closed_weeks(engine):
+            self._write(target, engine)
+        return engine
+
+    def _build_trends(self):
+        """Build the trend engine from every carrier's closed weeks and cache it"""
+        engine = TrendEngine.from_weekly_counts(self._weekly_counts())
+        self._write(os.path.join(self.path, TREND_FILE), engine)
+        return engine
+
+    def _weekly_counts(self, start=None):
+        """Weekly trend counts of every stored carrier over the closed weeks (from period start on)"""
+        end, _ = period_bounds(recent_periods(1)[0])
+        parts = []
+        for rollups in map(pd.read_pickle, self._carrier_files()):
+            daily = rollups['daily']
+            selected = daily['day'] < end
+            if start is not None:
+                selected &= daily['day'] >= period_bounds(start)[0]
+            # Case variants of the carrier name are one carrier
+            parts.append(daily[selected].assign(carrierName=rollups['carrier']))
+        return weekly_counts_from_daily(pd.concat(parts, ignore_index=True))
+
+    def _append_closed_weeks(self, engine):
+        """Append the weeks closed after the engine's last week; True if there were any"""
+        closed = recent_periods(2)[0]
+        if not engine.periods or engine.periods[-1] >= closed:
+            return False
+        new_periods = period_range(engine.periods[-1], closed)[1:]
+        weekly = self._weekly_counts(start=new_periods[0])
+        for period in new_periods:
+            engine.append_week(period, weekly[weekly['period'].isin([period])].set_index('carrierName'))
+        return True
+
+    def _advance_trends(self, revised):
+        """
+        Bring the cached trends up to date after an update
+
+        Newly closed weeks are appended, unless a week the engine already
+        holds was re-aggregated (then it is rebuilt). Without a cache there
+        is nothing to do: trends() builds it when first asked.
+
+        Args:
+            revised: Periods re-aggregated by the update, or None if whole
+                carriers were rebuilt
+        """
+        target = os.path.join(self.path, TREND_FILE)
+        if not os.path.exists(target):
+            return
+        engine = pd.read_pickle(target)
+        if revised is None or not engine.periods or any(period <= engine.periods[-1] for period in revised):
+            self._build_trends()
+        else:
+            # Written even when no week closed, so the cache stays newer
+            # than the carrier rollups just saved
+            self._append_closed_weeks(engine)
+            self._write(target, engine)
+
+    def backfill(self, carrier_names, max_workers=None):
+        """
+        Build and save rollups for the given carriers in parallel
+
+        Deduplication keys always include carrierName, so each carrier can be
+        processed independently in its own worker process.
+
+        Args:
+            carrier_names: Carriers to build
+            max_workers: Worker processes (default: CPU count)
+
+        Returns:
+            List of carriers that were built
+        """
+        # Case variants of a name load the same rows (carrier filter is case-insensitive)
+        carrier_names = list({name.lower(): name for name in carrier_names}.values())
+
+        built = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_build_carrier_rollups, name): name for name in carrier_names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    self.save(name, future.result())
+                    built.append(name)
+                except Exception as e:
+                    print(f"⚠️  Warning: Could not build rollups for '{name}': {e}")
+        return built
+
+    def update(self, max_workers=None):
+        """
+        Bring the rollups up to date with rows added or updated since they
+        were built (id / updatedAt watermark)
+
+        Only rows past the oldest stored watermark are read. For each
+        carrier with changes, the weeks those rows touch are re-aggregated
+        and spliced into its stored rollups (weeks rather than days, as
+        facility aggregates are weekly). Carriers without stored rollups,
+        or with rollups from before load weeks were kept, are built in full.
+        The cached fleet trends are then extended by any newly closed weeks.
+
+        Returns:
+            List of carriers that were updated
+        """
+        from report_generator import get_db_connection
+
+        stored = {rollups['carrier'].lower(): rollups for rollups in map(pd.read_pickle, self._carrier_files())}
+        last_id = min((rollups['last_id'] for rollups in stored.values()), default=0)
+        last_updated = min((rollups['last_updated'] for rollups in stored.values()), default=pd.NaT)
+        if any(pd.isna(rollups['last_updated']) for rollups in stored.values()):
+            last_updated = pd.NaT
+
+        conn = get_db_connection()
+        changes = pd.read_sql("""
+            SELECT id, carrierName, loadId, pickWindowFrom, updatedAt
+            FROM otp_reports
+            WHERE (id > %(last_id)s
+                   OR STR_TO_DATE(updatedAt, '%m/%d/%Y %H:%i:%s') >= %(last_updated)s)
+            AND carrierName IS NOT NULL
+            AND carrierName != ''
+            AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+        """, conn, params={
+            'last_id': last_id,
+            'last_updated': (last_updated if pd.notna(last_updated) else pd.Timestamp(0)).strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        conn.close()
+
+        changes['updatedAt_dt'] = pd.to_datetime(changes['updatedAt'], errors='coerce')
+        rebuild, incremental = [], []
+        for carrier_lower, rows in changes.groupby(changes['carrierName'].str.lower()):
+            rollups = stored.get(carrier_lower)
+            if rollups is None or 'load_weeks' not in rollups:
+                rebuild.append(rows['carrierName'].iloc[0])
+                continue
+            # Rows past this carrier's own watermark
+            if pd.isna(rollups['last_updated']):
+                updated = rows['updatedAt_dt'].notna()
+            else:
+                updated = rows['updatedAt_dt'] > rollups['last_updated']
+            rows = rows[(rows['id'] > rollups['last_id']) | updated]
+            if len(rows) > 0:
+                incremental.append((rollups, rows))
+
+        # Weeks re-aggregated (a carrier built in full revises every week)
+        revised = None if rebuild else {period for rollups, rows in incremental
+                                        for period in _touched_periods(rollups, rows)}
+
+        updated = []
+        if incremental:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_update_carrier_rollups, rollups, rows): rollups['carrier']
+                           for rollups, rows in incremental}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        self.save(name, future.result())
+                        updated.append(name)
+                    except Exception as e:
+                        print(f"⚠️  Warning: Could not update rollups for '{name}': {e}")
+        if rebuild:
+            updated.extend(self.backfill(rebuild, max_workers=max_workers))
+        self._advance_trends(revised)
+        return updated
+
+    # ------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------
+
+    def performance_metrics(self, carrier_name, weeks=None, start_date=None, end_date=None):
+        """
+        Performance metrics table computed from rollups instead of raw rows
+
+        Args:
+            carrier_name: Carrier to summarize
+            weeks: List of (iso_year, iso_week) periods
+            start_date: Start of a date range, instead of weeks
+            end_date: End of a date range (inclusive), instead of weeks
+
+        Returns:
+            Same DataFrame as report_generator.calculate_performance_metrics.
+            Routes past a route sketch's exact limit are estimates; their
+            period labels are listed in attrs['approximate_routes']
+        """
+        from report_generator import build_metrics_frame
+
+        rollups = self.load(carrier_name)
+        if rollups is None:
+            raise KeyError(f"No rollups stored for carrier '{carrier_name}'")
+
+        row_data = {'Carrier': carrier_name}
+        labels, approximate = [], []
+        for period in resolve_periods(weeks, start_date, end_date):
+            start, end = period_bounds(period)
+            if weeks is None:
+                start = max(start, pd.Timestamp(start_date))
+                end = min(end, pd.Timestamp(end_date) + pd.Timedelta(days=1))
+            totals = _summarize_days(rollups, lambda day: (day >= start) & (day < end))
+
+            week = period_label(period)
+            labels.append(week)
+            row_data[f'Shipments_{week}'] = totals['shipments']
+            row_data[f'Routes_{week}'] = totals['routes']
+            if not totals['routes_exact']:
+                approximate.append(week)
+            row_data[f'OTP_{week}'] = _pct(totals['otp_on_time'], totals['otp_events'])
+            row_data[f'OTD_{week}'] = _pct(totals['otd_on_time'], totals['otd_events'])
+            row_data[f'Tracking_{week}'] = _pct(totals['tracking_yes'], totals['tracking_events'])
+
+        metrics = build_metrics_frame(row_data, labels)
+        metrics.attrs['approximate_routes'] = approximate
+        return metrics
+
+    def lateness_digests(self, carrier_name, weeks=None, start_date=None, end_date=None):
+        """
+        Merged minutes-late sketches for a week selection or date range
+
+        Returns:
+            Dict with 'pickup' and 'delivery' lateness.TDigest
+        """
+        rollups = self.load(carrier_name)
+        if rollups is None:
+            raise KeyError(f"No rollups stored for carrier '{carrier_name}'")
+
+        lateness = rollups.get('lateness')
+        selected = pd.Series(False, index=lateness.index) if lateness is not None else None
+        for period in resolve_periods(weeks, start_date, end_date):
+            start, end = period_bounds(period)
+            if weeks is None:
+                start = max(start, pd.Timestamp(start_date))
+                end = min(end, pd.Timestamp(end_date) + pd.Timedelta(days=1))
+            if lateness is not None:
+                selected |= (lateness['day'] >= start) & (lateness['day'] < end)
+
+        digests = {}
+        for kind in ['pickup', 'delivery']:
+            if lateness is None:
+                digests[kind] = TDigest()
+            else:
+                digests[kind] = TDigest.merge_all(lateness.loc[selected & (lateness['kind'] == kind), 'digest'])
+        return digests
+
+    def route_count(self, start_date, end_date, carrier_names=None):
+        """
+        Distinct routes over a date range, across carriers
+
+        Every carrier's day sketches are unioned, so a load counts once even
+        if it appears on several days or carriers.
+
+        Args:
+            start_date: First day (inclusive)
+            end_date: Last day (exclusive)
+            carrier_names: Carriers to include (default: every stored carrier)
+
+        Returns:
+            Number of distinct completed loadIds
+        """
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        if carrier_names is None:
+            stored = map(pd.read_pickle, self._carrier_files())
+        else:
+            stored = (self.load(name) for name in carrier_names)
+
+        sketches = []
+        for rollups in stored:
+            if rollups is not None:
+                sketches.extend(_route_sketches(rollups, lambda day: (day >= start) & (day < end)))
+        return RouteSketch.merge_all(sketches).count
+
+def _route_sketches(rollups, day_filter):
+    """Route sketches of the days selected by day_filter"""
+    routes = rollups['routes']
+    return routes.loc[day_filter(routes['day']), 'routes']
+
+def _summarize_days(rollups, day_filter):
+    """Combine the days selected by day_filter: counts are summed, routes unioned"""
+    daily = rollups['daily']
+    totals = daily.loc[day_filter(daily['day']), COUNT_COLUMNS].sum().astype(int).to_dict()
+    routes = RouteSketch.merge_all(_route_sketches(rollups, day_filter))
+    totals['routes'] = routes.count
+    totals['routes_exact'] = routes.exact
+
+    delay_codes = rollups['delay_codes']
+    selected = delay_codes[day_filter(delay_codes['day'])]
+    for kind in ['pickup', 'delivery']:
+        totals[f'{kind}_delay_codes'] = (selected[selected['kind'] == kind]
+                                         .groupby('code')['count'].sum()
+                                         .sort_values(ascending=False))
+    return totals
+
+def _pct(numerator, denominator):
+    return numerator / denominator * 100 if denominator > 0 else None
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+if __name__ == '__main__':
+    from frames import enable_copy_on_write
+    enable_copy_on_write()
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'update'
+    store = RollupStore()
+
+    if command == 'backfill':
+        from report_generator import get_db_connection
+        conn = get_db_connection()
+        carriers = pd.read_sql("""
+            SELECT DISTINCT carrierName
+            FROM otp_reports
+            WHERE carrierName IS NOT NULL
+            AND carrierName != ''
+            AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+        """, conn)['carrierName'].tolist()
+        conn.close()
+        print(f"📦 Backfilling rollups for {len(carriers)} carriers...")
+        built = store.backfill(carriers)
+        print(f"✅ Built rollups for {len(built)} carriers in '{store.path}'")
+        store.facilities()
+        store.trends()
+    elif command == 'update':
+        print("🔄 Updating rollups for carriers with new or updated rows...")
+        updated = store.update()
+        print(f"✅ Updated {len(updated)} carriers: {updated}")
+        store.facilities()
+        store.trends()
+    elif command == 'routes' and len(sys.argv) == 4:
+        start_date, end_date = sys.argv[2], sys.argv[3]
+        routes = store.route_count(start_date, end_date)
+        print(f"🛣️  {routes:,} distinct routes across {len(store.carriers())} carriers "
+              f"from {start_date} to {end_date}")
+    else:
+        print(f"Unknown command '{command}'. Use 'backfill', 'update' or 'routes START END'.")
+        sys.exit(1)
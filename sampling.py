@@ -0,0 +1,251 @@
+"""
+Fast approximate metrics from a stratified sample of loads
+
+A fleet-wide or long-range report processes every row before anything can
+be shown. A preview processes a sample instead: within each carrier x ISO
+week stratum, whole loads are kept with probability `fraction` (raised for
+small strata so every carrier and week has at least MIN_LOADS_PER_STRATUM
+loads). Loads are sampled whole because deduplication works within a load,
+and by a hash of loadId + carrierName, so a given seed always picks the
+same loads.
+
+Counts are Horvitz-Thompson estimates (a load sampled with probability p
+stands for 1/p loads) and percentages are ratio estimates; both come with
+normal-approximation confidence intervals computed over the sampled loads.
+"""
+
+import numpy as np
+import pandas as pd
+
+from events import as_event_tables, has_delay_code
+from periods import period_label, period_slices
+
+DEFAULT_SAMPLE_FRACTION = 0.1
+
+# Strata with fewer loads than this are sampled more heavily (or fully)
+MIN_LOADS_PER_STRATUM = 30
+
+# z for the reported confidence intervals (95%)
+CONFIDENCE_Z = 1.96
+
+STRATUM_KEYS = ['carrierName', 'iso_year', 'week_number']
+
+# ============================================================================
+# SAMPLING
+# ============================================================================
+
+def row_periods(df):
+    """
+    ISO year and week of each raw row's pickWindowFrom (-1 if missing)
+
+    Only the date part is parsed, once per distinct date, so this is much
+    cheaper than parsing the full timestamps.
+    """
+    codes, dates = pd.factorize(df['pickWindowFrom'].astype(str).str.slice(0, 10))
+    iso = pd.to_datetime(pd.Series(dates), errors='coerce').dt.isocalendar()
+    iso_year = iso['year'].fillna(-1).to_numpy(dtype=np.int64)[codes]
+    iso_week = iso['week'].fillna(-1).to_numpy(dtype=np.int64)[codes]
+    return iso_year, iso_week
+
+def stratified_sample(df, fraction=DEFAULT_SAMPLE_FRACTION, min_loads=MIN_LOADS_PER_STRATUM,
+                      periods=None, seed=0):
+    """
+    Sample whole loads from raw otp_reports rows, stratified by carrier and week
+
+    Args:
+        df: Raw otp_reports rows (not processed)
+        fraction: Share of loads to keep in each stratum
+        min_loads: Minimum loads kept per stratum (all of them if fewer)
+        periods: Optional list of (iso_year, iso_week) periods to sample from
+        seed: Picks a different (but repeatable) set of loads
+
+    Returns:
+        Dictionary with:
+        - 'rows': The sampled raw rows (process them like the full set)
+        - 'strata': DataFrame indexed by carrierName, iso_year and
+          week_number with loads, sampled_loads and fraction (the
+          probability each load was sampled with)
+    """
+    iso_year, iso_week = row_periods(df)
+    keep = iso_year >= 0
+    if periods is not None:
+        keep &= pd.MultiIndex.from_arrays([iso_year, iso_week]).isin(periods)
+
+    # One uniform number per load; a load is sampled if it falls below the
+    # fraction of its stratum
+    hashes = pd.util.hash_pandas_object(df[['loadId', 'carrierName']], index=False,
+                                        hash_key=f'{seed:016d}'[-16:]).to_numpy()
+    uniform = hashes / np.float64(2 ** 64)
+
+    keys = pd.DataFrame({'carrierName': df['carrierName'].to_numpy(), 'iso_year': iso_year,
+                         'week_number': iso_week, 'load': hashes})[keep]
+    loads = keys.drop_duplicates().groupby(STRATUM_KEYS, dropna=False).size()
+    fractions = np.minimum(1.0, np.maximum(fraction, min_loads / loads))
+
+    stratum = loads.index.get_indexer(pd.MultiIndex.from_frame(keys[STRATUM_KEYS]))
+    sampled = uniform[keep] < fractions.to_numpy()[stratum]
+
+    strata = pd.DataFrame({
+        'loads': loads,
+        'sampled_loads': keys[sampled].drop_duplicates().groupby(STRATUM_KEYS, dropna=False).size(),
+        'fraction': fractions,
+    }).fillna({'sampled_loads': 0}).astype({'sampled_loads': 'int64'})
+
+    positions = np.flatnonzero(keep)[sampled]
+    return {'rows': df.take(positions), 'strata': strata}
+
+# ============================================================================
+# ESTIMATORS
+# ============================================================================
+
+def _inclusion(events, strata):
+    """Probability that each event row's load was sampled"""
+    iso = events.index.isocalendar()
+    rows = pd.MultiIndex.from_arrays([events['carrierName'].to_numpy(),
+                                      iso['year'].to_numpy(dtype=np.int64),
+                                      iso['week'].to_numpy(dtype=np.int64)])
+    stratum = strata.index.get_indexer(rows)
+    return np.where(stratum >= 0, strata['fraction'].to_numpy()[stratum], 1.0)
+
+def _per_load(events, strata, **values):
+    """Sum the given per-row values per sampled load, with its inclusion probability"""
+    frame = pd.DataFrame(values, index=pd.RangeIndex(len(events)))
+    frame['p'] = _inclusion(events, strata)
+    loads = [events['loadId'].to_numpy(), events['carrierName'].to_numpy()]
+    return frame.groupby(loads, dropna=False).agg({**{name: 'sum' for name in values}, 'p': 'first'})
+
+def estimate_total(events, strata, y):
+    """
+    Horvitz-Thompson estimate of the total of y over all rows, sampled or not
+
+    Returns:
+        (estimate, margin): the estimate and the half-width of its
+        confidence interval
+    """
+    loads = _per_load(events, strata, y=y)
+    total = (loads['y'] / loads['p']).sum()
+    variance = ((1 - loads['p']) / loads['p'] ** 2 * loads['y'] ** 2).sum()
+    return total, CONFIDENCE_Z * np.sqrt(variance)
+
+def estimate_ratio(events, strata, y, x):
+    """
+    Ratio estimate of sum(y) / sum(x) over all rows, sampled or not
+
+    Returns:
+        (estimate, margin), or (None, None) if no row has x
+    """
+    loads = _per_load(events, strata, y=y, x=x)
+    total_x = (loads['x'] / loads['p']).sum()
+    if total_x == 0:
+        return None, None
+    ratio = (loads['y'] / loads['p']).sum() / total_x
+    residuals = loads['y'] - ratio * loads['x']
+    variance = ((1 - loads['p']) / loads['p'] ** 2 * residuals ** 2).sum() / total_x ** 2
+    return ratio, CONFIDENCE_Z * np.sqrt(variance)
+
+def _pct(estimate):
+    ratio, margin = estimate
+    return (None, None) if ratio is None else (ratio * 100, margin * 100)
+
+# ============================================================================
+# APPROXIMATE REPORT SECTIONS
+# ============================================================================
+
+def estimate_performance_metrics(data, strata, carrier_name, weeks=None, start_date=None, end_date=None):
+    """
+    Estimate the performance metrics table from a processed sample
+
+    Args:
+        data: Event tables (or processed DataFrame) of the sampled rows
+        strata: 'strata' returned by stratified_sample
+        carrier_name, weeks, start_date, end_date: As for
+            report_generator.calculate_performance_metrics
+
+    Returns:
+        (metrics, margins): two DataFrames shaped like
+        calculate_performance_metrics output, with the estimates and the
+        half-widths of their confidence intervals
+    """
+    from report_generator import build_metrics_frame
+
+    events = as_event_tables(data)
+    estimates = {'Carrier': carrier_name}
+    margins = {'Carrier': carrier_name}
+    labels = []
+
+    slices = zip(period_slices(events['pickup'], weeks, start_date, end_date),
+                 period_slices(events['delivery'], weeks, start_date, end_date),
+                 period_slices(events['routes'], weeks, start_date, end_date))
+
+    for (period, pickups), (_, deliveries), (_, completed) in slices:
+        week = period_label(period)
+        labels.append(week)
+        routes = completed.drop_duplicates('loadId')
+
+        otp_known = pickups['OTP'].notna().to_numpy()
+        otd_known = deliveries['OTD'].notna().to_numpy()
+        tracking_known = pickups['isTracking'].notna().to_numpy()
+
+        section = {
+            'Shipments': estimate_total(deliveries, strata, np.ones(len(deliveries))),
+            'Routes': estimate_total(routes, strata, np.ones(len(routes))),
+            'OTP': _pct(estimate_ratio(pickups, strata, (pickups['OTP'] == 'On Time').to_numpy(), otp_known)),
+            'OTD': _pct(estimate_ratio(deliveries, strata, (deliveries['OTD'] == 'On Time').to_numpy(), otd_known)),
+            'Tracking': _pct(estimate_ratio(pickups, strata, (pickups['isTracking'] == 'YES').to_numpy(),
+                                            tracking_known)),
+        }
+        for metric, (estimate, margin) in section.items():
+            if metric in ('Shipments', 'Routes'):
+                estimate = int(round(estimate))
+            estimates[f'{metric}_{week}'] = estimate
+            margins[f'{metric}_{week}'] = margin
+
+    return build_metrics_frame(estimates, labels), build_metrics_frame(margins, labels)
+
+def estimate_delay_codes(data, strata):
+    """
+    Estimate delay code counts and shares from a processed sample
+
+    Args:
+        data: Event tables (or processed DataFrame) of the sampled rows
+        strata: 'strata' returned by stratified_sample
+
+    Returns:
+        Dictionary with 'pickup_delay_counts' and 'delivery_delay_counts'
+        (code, Count, Count ±, % of Total Shipments, % ±; most frequent
+        first) and the estimated 'total_pickup_shipments' and
+        'total_delivery_shipments'
+    """
+    events = as_event_tables(data)
+    result = {}
+    for kind, table, code_col in [('pickup', events['pickup'], 'pickupDelayCode'),
+                                  ('delivery', events['delivery'], 'deliveryDelayCode')]:
+        ones = np.ones(len(table))
+        codes = table[code_col].where(has_delay_code(table, code_col))
+        rows = []
+        for code in codes.dropna().unique():
+            matches = (codes == code).to_numpy()
+            count, count_margin = estimate_total(table, strata, matches)
+            share, share_margin = _pct(estimate_ratio(table, strata, matches, ones))
+            rows.append((code, int(round(count)), count_margin, share, share_margin))
+
+        counts = pd.DataFrame(rows, columns=[f'{kind.title()} Delay Code', 'Count', 'Count ±',
+                                             '% of Total Shipments', '% ±'])
+        result[f'{kind}_delay_counts'] = counts.sort_values('Count', ascending=False, ignore_index=True)
+        result[f'total_{kind}_shipments'] = int(round(estimate_total(table, strata, ones)[0]))
+    return result
+
+def format_estimates(estimates, margins):
+    """Estimates with their margins as display strings ('87.3 ± 2.1')"""
+    formatted = estimates.astype(object)
+    for column in estimates.columns:
+        is_count = column[0] in ('Shipments', 'Routes')
+        for row in estimates.index:
+            value, margin = estimates.at[row, column], margins.at[row, column]
+            if value is None or pd.isna(value):
+                formatted.at[row, column] = '—'
+            elif is_count:
+                formatted.at[row, column] = f'{value:,.0f} ± {margin:,.0f}'
+            else:
+                formatted.at[row, column] = f'{value:.1f} ± {margin:.1f}'
+    return formatted
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from events import build_event_tables
+from frames import enable_copy_on_write
+from report_generator import (
+    analyze_delay_codes,
+    generate_delivery_details_csv,
+    generate_pickup_details_csv,
+    get_db_connection,
+    process_data,
+)
+
+enable_copy_on_write()
+
+# Carrier to profile and the allowed peak (traced allocations while
+# processing, as a multiple of the raw query result's memory)
+CARRIER_NAME = os.environ.get('CARRIER_NAME', 'ILLYRIAN TRANSPORT LLC')
+MAX_PEAK_RATIO = float(os.environ.get('MAX_PEAK_RATIO', '1.0'))
+
+conn = get_db_connection()
+df = pd.read_sql("""
+    SELECT *
+    FROM otp_reports
+    WHERE LOWER(carrierName) = LOWER(%(carrier_name)s)
+    AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+    ORDER BY id DESC
+""", conn, params={'carrier_name': CARRIER_NAME})
+conn.close()
+
+raw_bytes = df.memory_usage(deep=True).sum()
+
+print("=" * 80)
+print("PEAK MEMORY CHECK")
+print("=" * 80)
+print(f"\nCarrier: {CARRIER_NAME}")
+print(f"Raw rows: {len(df):,} ({raw_bytes / 1e6:.1f} MB)")
+
+# Process the rows and run every consumer of the processed frame
+tracemalloc.start()
+start = time.time()
+
+processed = process_data(df)
+events = build_event_tables(processed)
+delay_data = analyze_delay_codes(events, CARRIER_NAME, [])
+generate_pickup_details_csv(events)
+generate_delivery_details_csv(events)
+
+elapsed = time.time() - start
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+ratio = peak / raw_bytes if raw_bytes else 0
+print(f"\nProcessed frame: {len(processed):,} rows x {processed.shape[1]} columns")
+print(f"Peak traced memory: {peak / 1e6:.1f} MB ({ratio:.2f}x raw, limit {MAX_PEAK_RATIO:.2f}x)")
+print(f"Time: {elapsed:.1f}s")
+
+if ratio > MAX_PEAK_RATIO:
+    print("\n❌ Peak memory is over the limit")
+    sys.exit(1)
+print("\n✅ Peak memory is within the limit")
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pandas as pd
+
+from monitor import OTPMonitor, replay
+from periods import period_bounds, recent_periods
+from report_generator import get_db_connection, process_data
+from rollups import COUNT_COLUMNS, build_daily_rollups
+
+# Week to replay (any date in it) and the replay shape
+REPLAY_DATE = pd.Timestamp(os.environ.get('REPLAY_DATE', '2025-06-11')).date()
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', '250'))
+UPDATED_SHARE = 0.2
+
+week = recent_periods(1, REPLAY_DATE)[0]
+week_start, week_end = period_bounds(week)
+
+conn = get_db_connection()
+df = pd.read_sql("""
+    SELECT *
+    FROM otp_reports
+    WHERE STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= %(week_start)s
+    AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') < %(week_end)s
+    ORDER BY id DESC
+""", conn, params={'week_start': week_start.strftime('%Y-%m-%d'),
+                   'week_end': week_end.strftime('%Y-%m-%d')})
+conn.close()
+
+print("=" * 80)
+print("STREAMING MONITOR CHECK")
+print("=" * 80)
+print(f"\nWeek: {week_start:%Y-%m-%d} ({len(df):,} rows)")
+
+# Replay the rows in a shuffled order, with some rows first sent in an
+# earlier (stale) version and updated later
+events = df.sample(frac=1, random_state=0)
+updated = events.sample(frac=UPDATED_SHARE, random_state=1)
+stale = updated.copy()
+stale['pickTimeArrived'] = stale['pickWindowTo']
+stale['dropStatus'] = 'Pending'
+events = pd.concat([stale, events], ignore_index=True)
+
+monitor = OTPMonitor(today=REPLAY_DATE)
+alerts = replay(monitor, events, batch_size=BATCH_SIZE, today=REPLAY_DATE)
+print(f"Replayed {len(events):,} events in batches of {BATCH_SIZE} "
+      f"({len(updated):,} updated later): {len(alerts)} alerts")
+
+# Expected week-to-date counts from the batch pipeline
+daily = build_daily_rollups(process_data(df))['daily']
+expected = daily.groupby('carrierName')[COUNT_COLUMNS].sum()
+
+mismatches = []
+for carrier, row in expected.iterrows():
+    counts = monitor.counts(carrier)
+    if any(counts[col] != row[col] for col in COUNT_COLUMNS):
+        mismatches.append((carrier, counts, row.to_dict()))
+extra = set(monitor.carriers()) - set(expected.index)
+extra = [carrier for carrier in extra if any(monitor.counts(carrier).values())]
+
+print(f"Carriers: {len(expected)} expected, {len(monitor.carriers())} in monitor")
+for carrier, got, want in mismatches[:10]:
+    print(f"   {carrier}: monitor {got} != batch {want}")
+
+for alert in alerts[:10]:
+    print(f"   🚨 {alert['carrier']} {alert['metric']} {alert['value']}% < {alert['target']}%")
+
+if mismatches or extra:
+    print("\n❌ Monitor counters do not match the batch pipeline")
+    sys.exit(1)
+print("\n✅ Monitor counters match the batch pipeline")
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+import pandas as pd
+import mysql.connector
+
+from frames import enable_copy_on_write
+from preprocess import preprocess
+
+enable_copy_on_write()
+
+# Worker counts to compare (default: 1, 2, 4, ... up to the number of cores)
+cores = os.cpu_count() or 1
+WORKER_COUNTS = [int(n) for n in os.environ.get('WORKER_COUNTS', '').split(',') if n] or \
+    sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+
+# Database connection
+conn = mysql.connector.connect(
+    host=os.environ.get('DB_HOST', 'datahub-mysql.wearewarp.link'),
+    user=os.environ.get('DB_USER', 'datahub-read'),
+    password=os.environ.get('DB_PASSWORD', 'warpdbhub2'),
+    database=os.environ.get('DB_NAME', 'datahub')
+)
+
+# Query the full table, as query_otp_clean.py does
+df = pd.read_sql("""
+    SELECT *
+    FROM otp_reports
+    WHERE STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+    ORDER BY id DESC
+""", conn)
+conn.close()
+
+print("=" * 80)
+print("PARALLEL PREPROCESSING")
+print("=" * 80)
+print(f"\nRows: {len(df):,}  Cores: {cores}")
+
+# Preprocess with each worker count; every run must match the single-worker result
+baseline = None
+failed = False
+for workers in WORKER_COUNTS:
+    start = time.time()
+    result = preprocess(df, workers=workers)
+    elapsed = time.time() - start
+
+    frame = result['frame'].take(result['order'])
+    if baseline is None:
+        baseline = (frame, result['totals'], elapsed)
+    base_frame, base_totals, base_elapsed = baseline
+
+    same = (result['totals'] == base_totals and
+            frame.index.equals(base_frame.index) and
+            all(frame[col].equals(base_frame[col])
+                for col in ['OTP', 'OTD', 'keep_for_pickup', 'keep_for_delivery',
+                            'pickupDelayCode', 'deliveryDelayCode']))
+    failed |= not same
+
+    print(f"\n{workers:>3} worker(s): {elapsed:6.1f}s  speedup {base_elapsed / elapsed:4.2f}x  "
+          f"{'✅ matches' if same else '❌ differs from'} 1 worker")
+
+print(f"\nTotals: {baseline[1]}")
+if failed:
+    sys.exit(1)
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+
+import pandas as pd
+from pypdf import PdfReader
+
+from events import build_event_tables
+from pdf_pages import PDF_BACKENDS
+from periods import recent_periods
+from report_generator import (
+    analyze_delay_codes,
+    calculate_performance_metrics,
+    generate_pdf_report,
+    get_db_connection,
+    process_data,
+)
+
+# Carrier and weeks to render (a carrier with many late events gives the
+# most detail pages)
+CARRIER_NAME = os.environ.get('CARRIER_NAME', 'ILLYRIAN TRANSPORT LLC')
+N_WEEKS = int(os.environ.get('N_WEEKS', '4'))
+
+# Processes for the parallel runs (0: one per CPU core)
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '0')) or None
+
+conn = get_db_connection()
+df = pd.read_sql("""
+    SELECT *
+    FROM otp_reports
+    WHERE LOWER(carrierName) = LOWER(%(carrier_name)s)
+    AND STR_TO_DATE(pickWindowFrom, '%m/%d/%Y %H:%i:%s') >= '2025-01-01'
+    ORDER BY id DESC
+""", conn, params={'carrier_name': CARRIER_NAME})
+conn.close()
+
+weeks = recent_periods(N_WEEKS)
+events = build_event_tables(process_data(df))
+metrics_df = calculate_performance_metrics(events, CARRIER_NAME, weeks)
+delay_data = analyze_delay_codes(events, CARRIER_NAME, weeks)
+
+print("=" * 80)
+print("PDF BACKEND BENCHMARK")
+print("=" * 80)
+print(f"\nCarrier: {CARRIER_NAME} ({N_WEEKS} weeks)")
+print(f"Late events: {len(delay_data['pickup_delay_data']):,} pickups, "
+      f"{len(delay_data['delivery_delay_data']):,} deliveries")
+
+results = {}
+runs = [(backend, 1) for backend in PDF_BACKENDS] + [(backend, PDF_WORKERS) for backend in PDF_BACKENDS]
+for backend, workers in runs:
+    name = backend if workers == 1 else f'{backend}_parallel'
+    output = f'benchmark_{name}.pdf'
+
+    start = time.time()
+    # No render budget: every detail page is rendered
+    generate_pdf_report(events, CARRIER_NAME, weeks, metrics_df, delay_data, backend=backend,
+                        workers=workers, output=output, max_detail_pages=None)
+    elapsed = time.time() - start
+
+    reader = PdfReader(output)
+    pages = len(reader.pages)
+    text = [page.extract_text() for page in reader.pages[1:]]
+    results[name] = (pages, elapsed, text)
+    print(f"\n{name}: {pages} pages in {elapsed:.1f}s ({pages / elapsed:.1f} pages/sec), "
+          f"{os.path.getsize(output) / 1e6:.2f} MB -> {output}")
+
+# Every run must produce the same pages with the same text (the title page
+# shows the generation time; chart labels are images in reportlab)
+baseline = results[PDF_BACKENDS[0]]
+failed = False
+for name, (pages, elapsed, text) in list(results.items())[1:]:
+    speedup = baseline[1] / elapsed
+    print(f"\n{name} vs {PDF_BACKENDS[0]}: {speedup:.1f}x faster")
+    if pages != baseline[0]:
+        print(f"❌ Page count differs ({pages} vs {baseline[0]})")
+        failed = True
+    for page, (expected, actual) in enumerate(zip(baseline[2], text), start=2):
+        expected = ''.join(expected.split())
+        if not all(word in expected for word in actual.split()):
+            print(f"❌ Page {page} content differs")
+            failed = True
+            break
+
+if failed:
+    sys.exit(1)
+print("\n✅ All runs render the same pages")
@@ -0,0 +1,190 @@
+"""
+Rolling N-week trend engine for Carrier Performance Reports
+
+Computes rolling OTP %, OTD % and Tracking % for every carrier at once from
+weekly numerator/denominator arrays. Cumulative sums make each window a
+single subtraction, and appending a newly closed week only extends the
+cumulative arrays by one column.
+"""
+
+import numpy as np
+import pandas as pd
+
+from periods import period_label, period_of, period_range
+
+# Rolling windows shown by default (weeks)
+DEFAULT_WINDOWS = (4, 8, 13)
+
+# Metric -> (numerator, denominator) weekly count columns
+TREND_METRICS = {
+    'OTP %': ('otp_on_time', 'otp_events'),
+    'OTD %': ('otd_on_time', 'otd_events'),
+    'Tracking %': ('tracking_yes', 'tracking_events'),
+}
+
+COUNT_COLUMNS = [col for pair in TREND_METRICS.values() for col in pair]
+
+# Targets per metric (%), as color-coded in the PDF report
+METRIC_TARGETS = {'OTP %': 98.5, 'OTD %': 99.9, 'Tracking %': 100.0}
+
+# ============================================================================
+# WEEKLY COUNTS
+# ============================================================================
+
+def weekly_counts_from_daily(daily):
+    """
+    Roll daily counts (rollups 'daily' frame) up to weeks
+
+    Returns:
+        DataFrame with carrierName, period and the trend count columns
+    """
+    weekly = daily.assign(period=period_of(daily['day']))
+    return weekly.groupby(['carrierName', 'period'], as_index=False)[COUNT_COLUMNS].sum()
+
+# ============================================================================
+# TREND ENGINE
+# ============================================================================
+
+class TrendEngine:
+    """
+    Rolling-window metrics for all carriers
+
+    Counts are held as cumulative sums with shape
+    (count column, carrier, week + 1), so the rolling sum over the last N
+    weeks ending at week t is cum[..., t + 1] - cum[..., t + 1 - N].
+    """
+
+    def __init__(self, carriers, periods, cumulative):
+        self.carriers = list(carriers)
+        self.periods = list(periods)
+        self.cumulative = cumulative
+        self._carrier_pos = {name: i for i, name in enumerate(self.carriers)}
+
+    @classmethod
+    def from_weekly_counts(cls, weekly):
+        """
+        Build the engine from weekly counts (carrierName, period, counts)
+
+        Weeks with no data for a carrier count as zero events, so every
+        carrier shares one contiguous week axis.
+        """
+        if len(weekly) == 0:
+            return cls([], [], np.zeros((len(COUNT_COLUMNS), 0, 1), dtype=np.int64))
+
+        carriers = sorted(weekly['carrierName'].unique())
+        periods = period_range(min(weekly['period']), max(weekly['period']))
+
+        carrier_pos = pd.Index(carriers).get_indexer(weekly['carrierName'])
+        period_pos = pd.Index(periods).get_indexer(weekly['period'])
+
+        counts = np.zeros((len(COUNT_COLUMNS), len(carriers), len(periods)), dtype=np.int64)
+        for k, col in enumerate(COUNT_COLUMNS):
+            np.add.at(counts[k], (carrier_pos, period_pos), weekly[col].to_numpy(dtype=np.int64))
+
+        cumulative = np.zeros((len(COUNT_COLUMNS), len(carriers), len(periods) + 1), dtype=np.int64)
+        np.cumsum(counts, axis=2, out=cumulative[:, :, 1:])
+        return cls(carriers, periods, cumulative)
+
+    def append_week(self, period, weekly):
+        """
+        Add a newly closed week
+
+        Args:
+            period: (iso_year, iso_week) of the closed week; must directly
+                follow the last week already held
+            weekly: Counts for that week, indexed by carrierName (carriers
+                missing from it had no events)
+        """
+        if self.periods and period_range(self.periods[-1], period)[1:] != [period]:
+            raise ValueError(f"{period_label(period)} does not follow {period_label(self.periods[-1])}")
+
+        # New carriers start with an all-zero history
+        new_carriers = [name for name in weekly.index if name not in self._carrier_pos]
+        if new_carriers:
+            padding = np.zeros((len(COUNT_COLUMNS), len(new_carriers), self.cumulative.shape[2]), dtype=np.int64)
+            self.cumulative = np.concatenate([self.cumulative, padding], axis=1)
+            for name in new_carriers:
+                self._carrier_pos[name] = len(self.carriers)
+                self.carriers.append(name)
+
+        week_counts = np.zeros((len(COUNT_COLUMNS), len(self.carriers)), dtype=np.int64)
+        positions = [self._carrier_pos[name] for name in weekly.index]
+        for k, col in enumerate(COUNT_COLUMNS):
+            week_counts[k, positions] = weekly[col].to_numpy(dtype=np.int64)
+
+        last = self.cumulative[:, :, -1]
+        self.cumulative = np.concatenate([self.cumulative, (last + week_counts)[:, :, None]], axis=2)
+        self.periods.append(period)
+
+    def rolling(self, window):
+        """
+        Rolling window sums for every carrier and week
+
+        Early weeks (fewer than `window` weeks of history) use the weeks
+        available so far.
+
+        Returns:
+            Array of shape (count column, carrier, week)
+        """
+        n_weeks = len(self.periods)
+        end = np.arange(1, n_weeks + 1)
+        start = np.maximum(end - window, 0)
+        return self.cumulative[:, :, end] - self.cumulative[:, :, start]
+
+    def to_frame(self, windows=DEFAULT_WINDOWS, carriers=None):
+        """
+        Long-format trend table for charts and reports
+
+        Returns:
+            DataFrame with carrierName, period, period_label, window and one
+            column per metric (NaN where the window had no events)
+        """
+        rows = []
+        selected = [self._carrier_pos[name] for name in carriers] if carriers else slice(None)
+        names = np.array(self.carriers, dtype=object)[selected]
+        for window in windows:
+            sums = self.rolling(window)[:, selected, :]
+            frame = pd.DataFrame({
+                'carrierName': np.repeat(names, len(self.periods)),
+                'period': self.periods * len(names),
+                'window': window,
+            })
+            for metric, (num_col, den_col) in TREND_METRICS.items():
+                num = sums[COUNT_COLUMNS.index(num_col)].ravel()
+                den = sums[COUNT_COLUMNS.index(den_col)].ravel()
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    frame[metric] = np.where(den > 0, num / den * 100, np.nan)
+            rows.append(frame)
+        result = pd.concat(rows, ignore_index=True)
+        result.insert(2, 'period_label', result['period'].map(period_label))
+        return result
+
+# ============================================================================
+# RENDERING
+# ============================================================================
+
+def plot_trends(ax, trend_df, metric, target=None):
+    """
+    Draw one rolling metric (one line per window) for a single carrier
+
+    Args:
+        ax: Matplotlib axes
+        trend_df: TrendEngine.to_frame output filtered to one carrier
+        metric: 'OTP %', 'OTD %' or 'Tracking %'
+        target: Optional target line (e.g. 98.5)
+    """
+    for window, data in trend_df.groupby('window'):
+        ax.plot(data['period_label'], data[metric], marker='o', markersize=3,
+                linewidth=1.5, label=f'{window}-week')
+    if target is not None:
+        ax.axhline(target, color='#E15759', linestyle='--', linewidth=1, label=f'Target {target}%')
+    ax.set_title(f'Rolling {metric}', fontsize=11, fontweight='bold')
+    ax.tick_params(axis='x', labelrotation=60, labelsize=6)
+    ax.tick_params(axis='y', labelsize=8)
+    ax.grid(alpha=0.3)
+    ax.legend(fontsize=7)
+
+def chart_data(trend_df, metric):
+    """Wide table (period label x window) for st.line_chart"""
+    return trend_df.pivot(index='period_label', columns='window', values=metric).rename(
+        columns=lambda window: f'{window}-week')